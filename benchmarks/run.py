@@ -0,0 +1,240 @@
+"""
+Offline benchmarks of the clip pipeline on synthetic sources.
+
+    python -m benchmarks.run                                  # default matrix
+    python -m benchmarks.run --resolutions 1080p --lengths 120 --stages analyze,render_filters
+    python -m benchmarks.run --output new.json --baseline base.json   # flag regressions
+    python -m benchmarks.run --compare base.json new.json
+
+Sources are made with ffmpeg lavfi (testsrc2 + sine), so no network or
+sample media is needed. Every stage runs in a fresh process and reports
+wall time, x-realtime (media seconds per wall second), CPU seconds and peak
+RSS of the stage process and of its subprocesses (ffmpeg, workers).
+Transcription needs faster-whisper with the model in the local cache; the
+dubbing render needs the dubbing dependencies but stubs out translation and
+TTS. Stages whose dependencies are missing are reported as skipped.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import sources
+
+STAGE_ORDER = ["analyze", "transcribe", "rank", "render_plain", "render_filters", "render_subs", "render_dub", "render_music"]
+# Results a stage needs from earlier ones; missing ones are run first, unrecorded
+NEEDS = {"rank": ["analyze"]}
+NEEDS.update({name: ["rank"] for name in STAGE_ORDER if name.startswith("render_")})
+# Compared between runs; lower is better for all of them
+METRICS = ["wall_s", "cpu_s", "peak_rss_mb", "peak_child_rss_mb"]
+# Differences below these are noise whatever the ratio
+ABS_FLOOR = {"wall_s": 0.1, "cpu_s": 0.1, "peak_rss_mb": 10.0, "peak_child_rss_mb": 10.0}
+
+
+def _rss_mb(usage):
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return usage.ru_maxrss / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+
+def _cpu(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+def _worker(name, ctx, queue):
+    # Optional dependencies are imported before the clock starts
+    from benchmarks import stages
+    try:
+        if name in stages.REQUIRES:
+            importlib.import_module(stages.REQUIRES[name])
+    except ImportError as e:
+        queue.put({"status": "skipped", "reason": str(e)})
+        return
+
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    try:
+        media_s, outputs = stages.STAGES[name](ctx)
+    except Exception as e:
+        queue.put({"status": "error", "reason": f"{type(e).__name__}: {e}"})
+        return
+    wall = time.perf_counter() - start
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    queue.put({
+        "status": "ok",
+        "wall_s": round(wall, 3),
+        "media_s": round(media_s, 3),
+        "x_realtime": round(media_s / wall, 3) if wall > 0 else None,
+        "cpu_s": round(_cpu(self_after) - _cpu(self_before) + _cpu(children_after) - _cpu(children_before), 3),
+        "peak_rss_mb": round(_rss_mb(self_after), 1),
+        "peak_child_rss_mb": round(_rss_mb(children_after), 1),
+        "outputs": outputs,
+    })
+
+
+def measure(name, ctx, work_dir):
+    """Runs one stage in a fresh process (so peak RSS is its own) and returns its record."""
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    mp = multiprocessing.get_context("spawn")
+    queue = mp.Queue()
+    proc = mp.Process(target=_worker, args=(name, dict(ctx, work_dir=work_dir), queue))
+    proc.start()
+    try:
+        # Read before joining, a large result would block the child otherwise
+        result = queue.get()
+    finally:
+        proc.join()
+    return result
+
+
+def run_source(resolution, seconds, stage_names, args):
+    src_path = sources.synthesize(os.path.join(args.work_dir, "sources"), resolution, seconds)
+    label = f"{resolution}_{seconds}s"
+    ctx = {
+        "src_path": src_path,
+        "duration": float(seconds),
+        "whisper_model": args.whisper_model,
+        "transcript": sources.transcript(seconds),
+        "music_path": sources.music(os.path.join(args.work_dir, "sources")),
+    }
+
+    records = []
+    done = set()
+
+    def run(name, recorded):
+        for need in NEEDS.get(name, []):
+            if need not in done:
+                run(need, False)
+        best = None
+        for _ in range(args.repeat if recorded else 1):
+            result = measure(name, ctx, os.path.join(args.work_dir, label, name))
+            if result["status"] != "ok":
+                best = result
+                break
+            if best is None or result["wall_s"] < best["wall_s"]:
+                best = result
+        ctx.update(best.pop("outputs", None) or {})
+        done.add(name)
+        if recorded:
+            records.append(dict(best, source=label, stage=name))
+            _print_record(records[-1])
+
+    # Prerequisites come earlier in STAGE_ORDER, so a selected stage never
+    # ran unrecorded before its turn
+    for name in stage_names:
+        run(name, True)
+    return records
+
+
+def _print_record(r):
+    if r["status"] != "ok":
+        print(f"{r['source']:>12}  {r['stage']:<15} {r['status']}: {r['reason']}")
+        return
+    print(f"{r['source']:>12}  {r['stage']:<15} {r['wall_s']:8.2f} s  {r['x_realtime']:7.2f}x rt  "
+          f"cpu {r['cpu_s']:8.2f} s  rss {r['peak_rss_mb']:7.1f} MB  children {r['peak_child_rss_mb']:7.1f} MB")
+
+
+def environment():
+    try:
+        ffmpeg = subprocess.check_output(["ffmpeg", "-version"]).decode().splitlines()[0]
+    except Exception:
+        ffmpeg = None
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg,
+        "env": {k: v for k, v in os.environ.items() if k.startswith("CLIPCUT_")},
+    }
+
+
+def compare(baseline, current, threshold):
+    """Prints the change of every metric and returns the regressions."""
+    base = {(r["source"], r["stage"]): r for r in baseline["results"] if r["status"] == "ok"}
+    regressions = []
+    for r in current["results"]:
+        old = base.get((r["source"], r["stage"]))
+        if r["status"] != "ok" or old is None:
+            continue
+        changes = []
+        for metric in METRICS:
+            before, after = old.get(metric), r.get(metric)
+            if not before or after is None:
+                continue
+            ratio = after / before - 1.0
+            flagged = ratio > threshold and after - before > ABS_FLOOR[metric]
+            changes.append(f"{metric} {ratio:+.0%}{' REGRESSION' if flagged else ''}")
+            if flagged:
+                regressions.append({"source": r["source"], "stage": r["stage"], "metric": metric, "before": before, "after": after})
+        print(f"{r['source']:>12}  {r['stage']:<15} " + ", ".join(changes))
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {threshold:.0%}")
+    else:
+        print(f"No regressions over {threshold:.0%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline clip pipeline benchmarks")
+    parser.add_argument("--resolutions", default="360p,1080p", help=f"comma separated, from {', '.join(sources.RESOLUTIONS)}")
+    parser.add_argument("--lengths", default="60", help="source lengths in seconds, comma separated")
+    parser.add_argument("--stages", default=",".join(STAGE_ORDER), help="comma separated stages to time")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage, the fastest is kept")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "clipcut_bench"))
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="saved results to check this run against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="relative slowdown/growth counted as a regression")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="only compare two saved results")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        return 1 if compare(baseline, current, args.threshold) else 0
+
+    stage_names = [s for s in args.stages.split(",") if s]
+    unknown = set(stage_names) - set(STAGE_ORDER)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    stage_names.sort(key=STAGE_ORDER.index)
+
+    results = []
+    for resolution in args.resolutions.split(","):
+        if resolution not in sources.RESOLUTIONS:
+            parser.error(f"unknown resolution: {resolution}")
+        for seconds in [int(s) for s in args.lengths.split(",")]:
+            results.extend(run_source(resolution, seconds, stage_names, args))
+
+    report = {"environment": environment(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if compare(baseline, report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
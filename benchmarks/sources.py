@@ -0,0 +1,68 @@
+import os
+import random
+import subprocess
+
+RESOLUTIONS = {
+    "360p": (640, 360),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "2160p": (3840, 2160),
+}
+FPS = 30
+# The hue jumps every SHOT_SECONDS, which scene detection sees as a cut
+SHOT_SECONDS = 8
+# Synthetic transcript: one sentence every SENTENCE_SECONDS
+SENTENCE_SECONDS = 3.0
+WORDS = ("the", "clip", "frame", "today", "really", "quick", "look", "at", "this",
+         "video", "moment", "watch", "what", "happens", "next", "again", "now")
+
+
+def synthesize(out_dir, resolution, seconds):
+    """
+    testsrc2 video with a sine beep track, encoded like a typical upload.
+    Built once per resolution and length and reused by later runs.
+    """
+    width, height = RESOLUTIONS[resolution]
+    path = os.path.join(out_dir, f"src_{resolution}_{seconds}s.mp4")
+    if os.path.exists(path):
+        return path
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = path + ".tmp.mp4"
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={FPS}:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:beep_factor=4:sample_rate=48000:duration={seconds}",
+        "-vf", f"hue=h=floor(t/{SHOT_SECONDS})*70",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", str(FPS * 2), "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", tmp_path,
+    ]
+    subprocess.run(cmd, check=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def music(out_dir, seconds=30):
+    """A short background track; the renders loop it."""
+    path = os.path.join(out_dir, f"music_{seconds}s.mp3")
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+        subprocess.run([
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=44100:duration={seconds}",
+            "-c:a", "libmp3lame", path + ".tmp.mp3",
+        ], check=True)
+        os.replace(path + ".tmp.mp3", path)
+    return path
+
+
+def transcript(seconds, seed=0):
+    """Deterministic transcript segments covering the whole source."""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    while t + 1.0 < seconds:
+        end = min(seconds, t + SENTENCE_SECONDS - 0.2)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 9))).capitalize() + "."
+        segments.append({"start": round(t, 2), "end": round(end, 2), "text": text})
+        t += SENTENCE_SECONDS
+    return segments
@@ -0,0 +1,98 @@
+import asyncio
+import os
+from functools import partial
+from clipcut.analysis import Analyzer
+from clipcut.audio_envelope import AudioEnvelope
+from clipcut.editor import Editor
+from clipcut.lut import LutCompiler
+from clipcut.presets import PlatformPresets
+from clipcut.progress import ProgressTracker
+from clipcut.scoring import Scoring
+
+# Stages whose modules need optional packages (faster-whisper, edge-tts,
+# deep-translator); they are reported as skipped when those are missing
+REQUIRES = {
+    "transcribe": "clipcut.subtitles",
+    "render_dub": "clipcut.dubbing",
+}
+CLIP_DURATION = 15
+NUM_CLIPS = 3
+
+# Editor.render_clips options of every render stage
+RENDERS = {
+    "render_plain": {},
+    "render_filters": {"filters": {"preset": "golden", "vignette": 0.5, "sharpness": 0.3, "highlights": 0.3}},
+    "render_subs": {"burn_subs": True},
+    "render_dub": {"dub": True},
+    "render_music": {"music": True},
+}
+
+
+def analyze(ctx):
+    """Scene detection plus the audio envelope, as clip mode runs them."""
+    work_dir = ctx["work_dir"]
+    analysis = Analyzer(ProgressTracker()).run(ctx["src_path"], store_dir=os.path.join(work_dir, "frames"))
+    envelope_path = os.path.join(work_dir, "audio_envelope.npz")
+    AudioEnvelope().compute(ctx["src_path"], envelope_path)
+    analysis["audio_envelope"] = envelope_path
+    return ctx["duration"], {"analysis": analysis}
+
+
+def transcribe(ctx):
+    from clipcut.subtitles import SubtitleEngine
+    engine = SubtitleEngine(ProgressTracker())
+    engine.model_size = ctx["whisper_model"]
+    transcript = engine.transcribe(ctx["src_path"])
+    return ctx["duration"], {"segments_transcribed": len(transcript)}
+
+
+def rank(ctx):
+    segments = Scoring().rank_segments(ctx["analysis"], ctx["transcript"], CLIP_DURATION, NUM_CLIPS)
+    return ctx["duration"], {"segments": segments}
+
+
+def render(ctx, name):
+    options = RENDERS[name]
+    work_dir = ctx["work_dir"]
+    # Clips are written next to the source, keep each stage's output apart
+    src_path = os.path.join(work_dir, os.path.basename(ctx["src_path"]))
+    if not os.path.exists(src_path):
+        os.symlink(ctx["src_path"], src_path)
+
+    editor = Editor(ProgressTracker(), PlatformPresets(), LutCompiler(os.path.join(work_dir, "luts")))
+    dubbing_engine = None
+    if options.get("dub"):
+        from clipcut.dubbing import DubbingEngine
+        # Offline: identity translation and a tone per line instead of edge-tts
+        dubbing_engine = DubbingEngine(ProgressTracker(), translator=lambda texts, lang: list(texts), tts=_tone_tts)
+
+    segments = ctx["segments"]
+    outputs = editor.render_clips(
+        src_path, segments, "shorts", False, options.get("burn_subs", False), ctx["transcript"], ctx["analysis"],
+        dubbing_engine=dubbing_engine, target_language="en",
+        filters=options.get("filters"),
+        bg_music_path=ctx["music_path"] if options.get("music") else None,
+    )
+    if len(outputs) != len(segments):
+        raise Exception(f"Rendered {len(outputs)} of {len(segments)} clips")
+    return sum(s["end"] - s["start"] for s in segments), {}
+
+
+async def _tone_tts(text, voice, output_path):
+    # Roughly speech-length audio, so the dub track assembly has real work
+    seconds = max(0.5, 0.06 * len(text))
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+        "-i", f"sine=frequency=330:sample_rate=24000:duration={seconds:.2f}",
+        "-c:a", "libmp3lame", output_path,
+    )
+    if await proc.wait() != 0:
+        raise Exception("Tone synthesis failed")
+
+
+STAGES = {
+    "analyze": analyze,
+    "transcribe": transcribe,
+    "rank": rank,
+}
+STAGES.update({name: partial(render, name=name) for name in RENDERS})
@@ -1,29 +1,147 @@
+import os
+import tempfile
 import cv2
 import numpy as np
+from clipcut.frame_store import FrameStore
+
+# Histogram bins per RGB channel
+HIST_BINS = 32
+# Frames scored per NumPy batch
+BLOCK_FRAMES = 256
+
 
 class Analyzer:
-    def __init__(self, progress):
+    def __init__(self, progress, stride=None, chunk_seconds=120.0, workers=None, threshold=0.35, min_scene=1.0):
         self.progress = progress
+        # Analyse every stride-th frame
+        self.stride = stride or int(os.environ.get("CLIPCUT_SCENE_STRIDE", "3"))
+        self.chunk_seconds = chunk_seconds
+        self.workers = workers or int(os.environ.get("CLIPCUT_ANALYSIS_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+        # Cut score needed for a boundary, and how far it must stand out locally
+        self.threshold = threshold
+        self.min_scene = min_scene
 
-    def run(self, src_path):
-        # A simple dummy analyzer that returns basic video info
-        # Real implementation would do scene detection, face detection, etc.
+    def run(self, src_path, decode_path=None, store_dir=None):
+        """
+        Metadata comes from the source; frames are decoded from decode_path
+        (a low-resolution proxy with the same timestamps) when given. The
+        sampled frames are kept in a FrameStore in store_dir, which the
+        caller removes when done, or in a temporary directory without one.
+        """
         cap = cv2.VideoCapture(src_path)
         if not cap.isOpened():
             raise Exception("Could not open video")
-            
+
         fps = cap.get(cv2.CAP_PROP_FPS)
         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         duration = frame_count / fps if fps > 0 else 0
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
+
         cap.release()
-        
+
+        scenes = []
+        motion = {"time": [], "value": []}
+        if duration > 0:
+            try:
+                if store_dir:
+                    times, scores, diffs = self._scores(self.frames(decode_path or src_path, store_dir, duration, fps))
+                else:
+                    with tempfile.TemporaryDirectory(prefix="clipcut_frames_") as tmp_dir:
+                        times, scores, diffs = self._scores(self.frames(decode_path or src_path, tmp_dir, duration, fps))
+                scenes = self._scenes(times, scores, duration)
+                motion = {"time": np.round(times, 3).tolist(), "value": np.round(diffs, 4).tolist()}
+            except Exception as e:
+                print(f"Scene detection failed: {e}")
+                scenes = [{"start": 0.0, "end": duration, "confidence": 0.0}]
+
         return {
             "duration": duration,
             "fps": fps,
             "width": width,
             "height": height,
-            "scenes": [] # Dummy scenes
+            "scenes": scenes,
+            # Frame-to-frame change per sample, a cheap activity signal
+            "motion": motion,
         }
+
+    def frames(self, src_path, store_dir, duration, fps):
+        """The job's FrameStore at the analysis sample rate, decoded on first use."""
+        sample_fps = (fps if fps > 0 else 30.0) / self.stride
+        store = FrameStore.open(store_dir)
+        if store is None or abs(store.fps - sample_fps) > 1e-6:
+            store = FrameStore.build(src_path, store_dir, sample_fps, duration,
+                                     workers=self.workers, chunk_seconds=self.chunk_seconds)
+        return store
+
+    def _scores(self, store):
+        frames = store.frames
+        n_pixels = store.width * store.height * 3
+        hist_d, diff_d = [], []
+        prev_hist = prev_luma = None
+        # Read-only views of the mapped file, a block at a time
+        for i in range(0, len(frames), BLOCK_FRAMES):
+            block = frames[i:i + BLOCK_FRAMES]
+            n = len(block)
+
+            # Per-frame RGB histograms in one bincount: offset every frame and
+            # channel into its own range of bins
+            bins = (block >> 3).astype(np.int32)
+            bins += np.arange(3, dtype=np.int32) * HIST_BINS
+            bins += (np.arange(n, dtype=np.int32) * 3 * HIST_BINS)[:, None, None, None]
+            hists = np.bincount(bins.ravel(), minlength=n * 3 * HIST_BINS).reshape(n, 3 * HIST_BINS)
+            hists = hists.astype(np.float32) / n_pixels
+
+            rgb = block.astype(np.float32)
+            luma = 0.299 * rgb[..., 0] + 0.587 * rgb[..., 1] + 0.114 * rgb[..., 2]
+
+            if prev_hist is not None:
+                hists = np.concatenate([prev_hist[None], hists])
+                luma = np.concatenate([prev_luma[None], luma])
+            # Total variation distance between consecutive histograms (0..1)
+            hist_d.append(0.5 * np.abs(np.diff(hists, axis=0)).sum(axis=1))
+            # Mean absolute luma change (0..1)
+            diff_d.append(np.abs(np.diff(luma, axis=0)).mean(axis=(1, 2)) / 255.0)
+            prev_hist, prev_luma = hists[-1], luma[-1]
+
+        hist_d = np.concatenate(hist_d) if hist_d else np.zeros(0, dtype=np.float32)
+        diff_d = np.concatenate(diff_d) if diff_d else np.zeros(0, dtype=np.float32)
+        # The k-th difference ends on sample k+1
+        times = np.asarray(store.times[1:len(hist_d) + 1])
+        # Histograms catch cuts between similar-looking shots poorly, pixel
+        # differences fire on fast motion; requiring both is more robust
+        scores = np.sqrt(hist_d * np.minimum(1.0, diff_d * 4.0))
+        return times, scores, diff_d
+
+    def _scenes(self, times, scores, duration):
+        if len(scores) == 0:
+            return [{"start": 0.0, "end": duration, "confidence": 0.0}]
+
+        # A cut must beat the threshold and clearly stand out from the
+        # surrounding second or so (handles continuous fast motion)
+        window = 15
+        padded = np.pad(scores, window, mode="edge")
+        local = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1)
+        baseline = np.median(local, axis=1)
+        candidates = np.flatnonzero((scores > self.threshold) & (scores > 2.0 * baseline))
+
+        cuts = []
+        for k in candidates:
+            t = float(times[k])
+            confidence = float(min(1.0, (scores[k] - baseline[k]) / max(1e-6, 1.0 - baseline[k])))
+            if cuts and t - cuts[-1][0] < self.min_scene:
+                # Too close to the previous cut: keep the stronger one
+                if confidence > cuts[-1][1]:
+                    cuts[-1] = (t, confidence)
+                continue
+            if t < self.min_scene or duration - t < self.min_scene:
+                continue
+            cuts.append((t, confidence))
+
+        scenes = []
+        start, confidence = 0.0, 1.0
+        for t, c in cuts:
+            scenes.append({"start": round(start, 3), "end": round(t, 3), "confidence": round(confidence, 3)})
+            start, confidence = t, c
+        scenes.append({"start": round(start, 3), "end": round(duration, 3), "confidence": round(confidence, 3)})
+        return scenes
@@ -0,0 +1,107 @@
+import subprocess
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Envelope resolution
+HOP_SECONDS = 0.1
+# EBU R128 short-term loudness window
+SHORT_TERM_SECONDS = 3.0
+# Floor for the dB values, also what silence is stored as
+FLOOR_DB = -100.0
+
+
+class AudioEnvelope:
+    """
+    Streams the source audio through ffmpeg and reduces it to one value per
+    100 ms window: RMS and peak level (dBFS) and EBU R128 short-term loudness
+    (LUFS, 3 s window of K-weighted audio). Audio is read in fixed-size
+    chunks so memory stays flat however long the source is. The result is
+    saved as float16 arrays in an .npz file.
+    """
+
+    def __init__(self, chunk_seconds=60.0):
+        self.hop = int(SAMPLE_RATE * HOP_SECONDS)
+        self.chunk_windows = int(chunk_seconds / HOP_SECONDS)
+        self.short_term = int(SHORT_TERM_SECONDS / HOP_SECONDS)
+
+    def compute(self, src_path, out_path=None):
+        """Returns {"hop", "rms", "peak", "loudness"}, or None if the source has no audio."""
+        # Channel 0: plain mono, channel 1: the same audio K-weighted (BS.1770
+        # pre-filter + RLB high-pass), interleaved into one stream
+        graph = (
+            f"[0:a:0]aformat=sample_fmts=flt:channel_layouts=mono,aresample={SAMPLE_RATE},asplit[raw][k];"
+            "[k]highshelf=f=1681.97:g=4:t=q:w=0.7072,highpass=f=38.13:t=q:w=0.5003,"
+            "aformat=sample_fmts=flt:channel_layouts=mono[kw];"
+            "[raw][kw]join=inputs=2:channel_layout=stereo[out]"
+        )
+        cmd = [
+            "ffmpeg", "-v", "error", "-i", src_path,
+            "-filter_complex", graph, "-map", "[out]",
+            "-f", "f32le", "-"
+        ]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        chunk_bytes = self.chunk_windows * self.hop * 2 * 4
+        rms, peak, k_power = [], [], []
+        pending = b""
+        try:
+            while True:
+                data = proc.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                data = pending + data
+                usable = len(data) // (self.hop * 8) * (self.hop * 8)
+                pending = data[usable:]
+                if usable:
+                    self._windows(np.frombuffer(data[:usable], dtype=np.float32), rms, peak, k_power)
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+        if pending:
+            # Last partial window, zero padded
+            tail = np.zeros(self.hop * 2, dtype=np.float32)
+            samples = np.frombuffer(pending[:len(pending) // 4 * 4], dtype=np.float32)
+            tail[:len(samples)] = samples
+            self._windows(tail, rms, peak, k_power)
+
+        if not rms:
+            return None
+
+        k_power = np.concatenate(k_power)
+        envelope = {
+            "hop": HOP_SECONDS,
+            "rms": np.concatenate(rms).astype(np.float16),
+            "peak": np.concatenate(peak).astype(np.float16),
+            "loudness": self._short_term_loudness(k_power).astype(np.float16),
+        }
+        if out_path:
+            np.savez(out_path, **envelope)
+        return envelope
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as data:
+            return {k: data[k] if k != "hop" else float(data[k]) for k in data.files}
+
+    def _windows(self, interleaved, rms, peak, k_power):
+        frames = interleaved.reshape(-1, self.hop, 2)
+        raw = frames[:, :, 0]
+        kw = frames[:, :, 1]
+        raw_power = np.mean(raw * raw, axis=1)
+        rms.append(self._db(raw_power, 10.0))
+        peak.append(self._db(np.max(np.abs(raw), axis=1), 20.0))
+        k_power.append(np.mean(kw * kw, axis=1))
+
+    def _short_term_loudness(self, k_power):
+        # Mean power over the trailing 3 s window via a cumulative sum, then
+        # LUFS = -0.691 + 10 log10(power) (mono, channel weight 1)
+        csum = np.concatenate([[0.0], np.cumsum(k_power, dtype=np.float64)])
+        idx = np.arange(1, len(k_power) + 1)
+        lo = np.maximum(0, idx - self.short_term)
+        mean_power = (csum[idx] - csum[lo]) / (idx - lo)
+        return np.maximum(FLOOR_DB, -0.691 + self._db(mean_power, 10.0))
+
+    @staticmethod
+    def _db(values, factor):
+        return np.maximum(FLOOR_DB, factor * np.log10(np.maximum(values, 1e-12)))
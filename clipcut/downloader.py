@@ -2,8 +2,10 @@ import os
 import yt_dlp
 
 class YouTubeDownloader:
-    def __init__(self, progress):
+    def __init__(self, progress, cache=None):
         self.progress = progress
+        # Optional MediaCache shared by all jobs
+        self.cache = cache
 
     def list_formats(self, url):
         ydl_opts = {'quiet': True}
@@ -29,11 +31,8 @@ class YouTubeDownloader:
         # This is a simplified selection logic
         target_height = int(quality.replace('p', ''))
         
-        filename_tmpl = os.path.join(output_dir, "%(title)s.%(ext)s")
-        
         ydl_opts = {
             'format': f'bestvideo[height<={target_height}]+bestaudio/best[height<={target_height}]',
-            'outtmpl': filename_tmpl,
             'merge_output_format': 'mp4',
             'quiet': True,
             'retries': 10,
@@ -41,12 +40,29 @@ class YouTubeDownloader:
             'socket_timeout': 30,
         }
         
+        if not self.cache:
+            return self._fetch(url, ydl_opts, None, output_dir)
+
+        # Resolve the video id and the format that would be picked, without downloading
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+            info = ydl.extract_info(url, download=False)
+        key = f"{info.get('extractor_key', 'media')}_{info['id']}_{info.get('format_id', quality)}"
+        return self.cache.get_or_fetch(key, lambda target_dir: self._fetch(url, ydl_opts, info, target_dir), output_dir)
+
+    def _fetch(self, url, ydl_opts, info, output_dir):
+        opts = dict(ydl_opts)
+        opts['outtmpl'] = os.path.join(output_dir, "%(title)s.%(ext)s")
+        
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            if info:
+                # Reuse the already resolved info instead of extracting again
+                info = ydl.process_ie_result(info, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
             filename = ydl.prepare_filename(info)
             # If merge_output_format is used, the actual file might have different extension
-            if 'merge_output_format' in ydl_opts:
+            if 'merge_output_format' in opts:
                 base, _ = os.path.splitext(filename)
-                filename = f"{base}.{ydl_opts['merge_output_format']}"
+                filename = f"{base}.{opts['merge_output_format']}"
                 
         return filename
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+class DubCache:
+    """
+    Two-level cache for dubbing: an in-memory LRU in front of an SQLite store.
+    Translations are keyed on (normalized text, source, target language) and
+    synthesized audio on (translated text, voice); audio is stored as the
+    compressed bytes the TTS backend produced. The LRU is bounded by item
+    count and by bytes. Hit/miss counts are kept per level, for the process
+    in stats and per job in the session() a job uses.
+    """
+
+    def __init__(self, base_dir, memory_items=2048, memory_bytes=None, max_audio_bytes=None):
+        self.path = os.path.join(base_dir, "dub_cache.sqlite3")
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes or int(os.environ.get("CLIPCUT_DUB_CACHE_MEMORY_MB", "64")) * 1024 * 1024
+        self.max_audio_bytes = max_audio_bytes or int(os.environ.get("CLIPCUT_DUB_CACHE_MB", "512")) * 1024 * 1024
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.stats = _new_stats()
+        os.makedirs(base_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS audio (key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, used_at REAL NOT NULL)")
+        self._db.commit()
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def _key(self, *parts):
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def session(self):
+        """A view of the cache with its own hit/miss counts, one per job."""
+        return DubCacheSession(self)
+
+    def get_translation(self, text, source, target, stats=None):
+        key = "t:" + self._key(self.normalize(text), source, target)
+        return self._get("translation", key, "SELECT text FROM translations WHERE key = ?", stats)
+
+    def put_translation(self, text, source, target, translated):
+        key = "t:" + self._key(self.normalize(text), source, target)
+        with self._lock:
+            self._remember(key, translated)
+            self._db.execute("INSERT OR REPLACE INTO translations (key, text) VALUES (?, ?)", (key, translated))
+            self._db.commit()
+
+    def get_audio(self, text, voice, stats=None):
+        key = "a:" + self._key(self.normalize(text), voice)
+        return self._get("audio", key, "SELECT data FROM audio WHERE key = ?", stats)
+
+    def put_audio(self, text, voice, data):
+        key = "a:" + self._key(self.normalize(text), voice)
+        with self._lock:
+            self._remember(key, data)
+            self._db.execute(
+                "INSERT OR REPLACE INTO audio (key, data, size, used_at) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), len(data), time.time())
+            )
+            self._db.commit()
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._prune_audio()
+
+    def _get(self, kind, key, query, stats=None):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count(kind, "memory_hits", stats)
+                return self._memory[key]
+            row = self._db.execute(query, (key,)).fetchone()
+            if row is None:
+                self._count(kind, "misses", stats)
+                return None
+            value = row[0]
+            if kind == "audio":
+                value = bytes(value)
+                # Memory hits don't reach the disk, so only these bump the LRU time
+                self._db.execute("UPDATE audio SET used_at = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+            self._remember(key, value)
+            self._count(kind, "disk_hits", stats)
+            return value
+
+    def _count(self, kind, field, stats):
+        # Caller holds the lock
+        self.stats[kind][field] += 1
+        if stats is not None:
+            stats[kind][field] += 1
+
+    def _remember(self, key, value):
+        # Caller holds the lock
+        self._forget(key)
+        size = _size(value)
+        if size > self.memory_bytes:
+            # Would push out everything else, leave it on disk only
+            return
+        self._memory[key] = value
+        self._memory_size += size
+        while len(self._memory) > self.memory_items or self._memory_size > self.memory_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= _size(old)
+
+    def _forget(self, key):
+        # Caller holds the lock
+        if key in self._memory:
+            self._memory_size -= _size(self._memory.pop(key))
+
+    def _prune_audio(self):
+        # Caller holds the lock. Drop least recently used clips past the size budget.
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM audio").fetchone()[0]
+        if total <= self.max_audio_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM audio ORDER BY used_at").fetchall():
+            if total <= self.max_audio_bytes:
+                break
+            self._db.execute("DELETE FROM audio WHERE key = ?", (key,))
+            self._forget(key)
+            total -= size
+        self._db.commit()
+
+
+class DubCacheSession:
+    """DubCache front with its own stats, so a job reports only its own hits."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.stats = _new_stats()
+
+    def get_translation(self, text, source, target):
+        return self.cache.get_translation(text, source, target, self.stats)
+
+    def put_translation(self, text, source, target, translated):
+        self.cache.put_translation(text, source, target, translated)
+
+    def get_audio(self, text, voice):
+        return self.cache.get_audio(text, voice, self.stats)
+
+    def put_audio(self, text, voice, data):
+        self.cache.put_audio(text, voice, data)
+
+
+def _new_stats():
+    return {
+        "translation": {"memory_hits": 0, "disk_hits": 0, "misses": 0},
+        "audio": {"memory_hits": 0, "disk_hits": 0, "misses": 0},
+    }
+
+
+def _size(value):
+    # Audio is bytes, translations are text
+    return len(value) if isinstance(value, bytes) else len(value.encode("utf-8"))
@@ -0,0 +1,108 @@
+import subprocess
+import wave
+import numpy as np
+
+
+class DubTrackAssembler:
+    """
+    Builds a clip's dub track in memory.
+    TTS outputs are decoded to mono float PCM, time-stretched with WSOLA to
+    the slot of the transcript segment they replace and added onto a
+    preallocated clip-length timeline, which is written as a single WAV.
+    """
+
+    def __init__(self, sample_rate=24000, frame_size=1024):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.hop = frame_size // 2
+        self.tolerance = frame_size // 4
+        self.window = np.hanning(frame_size).astype(np.float32)
+
+    def decode(self, path):
+        """Decodes any audio file ffmpeg can read to a mono float32 array."""
+        cmd = [
+            "ffmpeg", "-v", "error", "-i", path,
+            "-f", "f32le", "-ac", "1", "-ar", str(self.sample_rate), "-"
+        ]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
+        except subprocess.TimeoutExpired:
+            print(f"DEBUG: Decode timed out for {path}")
+            return None
+        if result.returncode != 0:
+            print(f"DEBUG: Decode failed for {path}: {result.stderr.decode()}")
+            return None
+        return np.frombuffer(result.stdout, dtype=np.float32)
+
+    def stretch(self, samples, target_len):
+        """Time-stretches samples to exactly target_len samples without changing pitch."""
+        n = len(samples)
+        if target_len <= 0:
+            return np.zeros(0, dtype=np.float32)
+        if n == 0:
+            return np.zeros(target_len, dtype=np.float32)
+
+        speed = n / target_len
+        if abs(speed - 1.0) < 0.01 or n < self.frame_size:
+            # Close enough (or too short to overlap-add): just pad or trim
+            out = np.zeros(target_len, dtype=np.float32)
+            out[:min(n, target_len)] = samples[:target_len]
+            return out
+
+        frame, hop, tol = self.frame_size, self.hop, self.tolerance
+        num_frames = int(np.ceil(target_len / hop)) + 1
+
+        # Pad so every analysis window including the search tolerance is in bounds
+        padded = np.concatenate([
+            np.zeros(tol, dtype=np.float32),
+            samples.astype(np.float32, copy=False),
+            np.zeros(frame + 2 * tol + int(np.ceil(hop * speed)) + 1, dtype=np.float32),
+        ])
+        max_pos = len(padded) - frame - 2 * tol - 1
+
+        out = np.zeros(num_frames * hop + frame, dtype=np.float32)
+        norm = np.zeros_like(out)
+        prev_pos = 0
+        for k in range(num_frames):
+            nominal = min(int(k * hop * speed), max_pos)
+            if k == 0:
+                pos = nominal
+            else:
+                # Pick the analysis frame around the nominal position that best
+                # continues the waveform of the previous one (WSOLA)
+                natural = min(prev_pos + hop, max_pos)
+                target = padded[natural + tol:natural + tol + frame]
+                region = padded[nominal:nominal + frame + 2 * tol]
+                corr = np.correlate(region, target, mode="valid")
+                pos = nominal + int(np.argmax(corr)) - tol
+            out[k * hop:k * hop + frame] += padded[pos + tol:pos + tol + frame] * self.window
+            norm[k * hop:k * hop + frame] += self.window
+            prev_pos = pos
+
+        out /= np.maximum(norm, 1e-3)
+        return out[:target_len]
+
+    def assemble(self, parts, duration, output_path):
+        """
+        parts: list of (samples, rel_start, rel_end) in clip-relative seconds.
+        Writes a 16-bit mono WAV of exactly `duration` seconds.
+        """
+        total = int(round(duration * self.sample_rate))
+        if total <= 0:
+            return False
+        timeline = np.zeros(total, dtype=np.float32)
+
+        for samples, rel_start, rel_end in parts:
+            a = max(0, int(round(rel_start * self.sample_rate)))
+            b = min(total, int(round(rel_end * self.sample_rate)))
+            if b <= a or samples is None or len(samples) == 0:
+                continue
+            timeline[a:b] += self.stretch(samples, b - a)
+
+        pcm = (np.clip(timeline, -1.0, 1.0) * 32767).astype("<i2")
+        with wave.open(output_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm.tobytes())
+        return True
@@ -1,55 +1,150 @@
 import asyncio
 import os
-import shutil
 from deep_translator import GoogleTranslator
 import edge_tts
-import nest_asyncio
 
-# Apply nest_asyncio to allow nested event loops (useful for threaded Flask apps)
-nest_asyncio.apply()
+# Google Translate rejects requests longer than this
+MAX_BATCH_CHARS = 4500
+# Each TTS request gets this many tries of TTS_TIMEOUT seconds, TTS_RETRY_DELAY apart
+TTS_ATTEMPTS = 3
+TTS_TIMEOUT = 60
+TTS_RETRY_DELAY = 1
 
 class DubbingEngine:
-    def __init__(self, progress):
+    def __init__(self, progress, translator=None, tts=None, concurrency=4, cache=None):
         self.progress = progress
+        # Optional DubCache for translations and synthesized audio
+        self.cache = cache
+        # translator(texts, target_lang) -> list of translated texts
+        self.translator = translator or self._google_translate_batch
+        # async tts(text, voice, output_path), writes one audio file
+        self.tts = tts or self._edge_tts_save
+        # Max TTS requests in flight at once
+        self.concurrency = concurrency
 
     def _translate_text(self, text, target_lang):
+        return self.translate_batch([text], target_lang)[0]
+
+    def translate_batch(self, texts, target_lang):
+        """Translates a list of texts, falling back to the original text on errors."""
+        results = [None] * len(texts)
+        if self.cache:
+            for k, text in enumerate(texts):
+                results[k] = self.cache.get_translation(text, "auto", target_lang)
+        missing = [k for k, r in enumerate(results) if r is None]
+
+        if missing:
+            try:
+                translated = self.translator([texts[k] for k in missing], target_lang)
+                if len(translated) != len(missing):
+                    raise Exception(f"Got {len(translated)} translations for {len(missing)} texts")
+                for k, t in zip(missing, translated):
+                    results[k] = t
+                    # Failed items come back empty and are not cached
+                    if t and self.cache:
+                        self.cache.put_translation(texts[k], "auto", target_lang, t)
+            except Exception as e:
+                print(f"Translation error: {e}")
+
+        return [r if r else orig for r, orig in zip(results, texts)]
+
+    def _google_translate_batch(self, texts, target_lang):
+        # Pack as many lines as fit into one request; Google keeps line breaks,
+        # so one request translates a whole batch of segments.
+        translator = GoogleTranslator(source='auto', target=target_lang)
+        results = []
+        batch = []
+        batch_chars = 0
+        for text in texts:
+            line = " ".join(text.split())
+            if batch and batch_chars + len(line) + 1 > MAX_BATCH_CHARS:
+                results.extend(self._translate_lines(translator, batch))
+                batch, batch_chars = [], 0
+            batch.append(line)
+            batch_chars += len(line) + 1
+        if batch:
+            results.extend(self._translate_lines(translator, batch))
+        return results
+
+    def _translate_lines(self, translator, lines):
+        print(f"Translating {len(lines)} lines to {translator.target}...")
         try:
-            print(f"Translating text to {target_lang}: {text[:50]}...")
-            # Use Google Translator via deep_translator
-            # deep-translator uses requests, which can hang.
-            # We wrap it or just hope it works? 
-            # Unfortunately deep_translator doesn't expose timeout easily.
-            # We can rely on system socket timeout or just assume it works.
-            # For now, let's just log it.
-            translated = GoogleTranslator(source='auto', target=target_lang).translate(text)
-            print(f"Translation result: {translated[:50]}...")
-            return translated
+            translated = translator.translate("\n".join(lines)) or ""
+            parts = translated.split("\n")
+            if len(parts) == len(lines):
+                return parts
+            print(f"Batch translation returned {len(parts)} lines for {len(lines)}, retrying per line")
+        except Exception as e:
+            print(f"Batch translation failed: {e}, retrying per line")
+        return [self._translate_line(translator, line) for line in lines]
+
+    def _translate_line(self, translator, line):
+        try:
+            return translator.translate(line) if line else line
         except Exception as e:
             print(f"Translation error: {e}")
-            return text
+            return None
+
+    async def _edge_tts_save(self, text, voice, output_path):
+        communicate = edge_tts.Communicate(text, voice)
+        await communicate.save(output_path)
 
     async def _generate_audio_async(self, text, voice, output_path):
+        if self.cache:
+            cached = self.cache.get_audio(text, voice)
+            if cached:
+                with open(output_path, "wb") as f:
+                    f.write(cached)
+                return
+
         print(f"Generating TTS for: {text[:50]}... (Voice: {voice})")
-        for attempt in range(3):
+        for attempt in range(TTS_ATTEMPTS):
             try:
-                communicate = edge_tts.Communicate(text, voice)
-                await asyncio.wait_for(communicate.save(output_path), timeout=60)
+                await asyncio.wait_for(self.tts(text, voice, output_path), timeout=TTS_TIMEOUT)
                 print(f"TTS saved to {output_path}")
+                if self.cache and os.path.exists(output_path):
+                    with open(output_path, "rb") as f:
+                        self.cache.put_audio(text, voice, f.read())
                 return
             except Exception as e:
                 print(f"TTS Attempt {attempt+1} failed: {e}")
-                if attempt == 2: raise e
-                await asyncio.sleep(1)
+                if attempt == TTS_ATTEMPTS - 1: raise e
+                await asyncio.sleep(TTS_RETRY_DELAY)
+
+    async def dub_segments_async(self, texts, target_lang, voice, output_paths):
+        """
+        Translates all texts in batched requests, then synthesizes them with
+        bounded concurrency. Returns [(audio_path or None, translated_text)].
+        """
+        try:
+            # deep_translator has no request timeout of its own
+            translated = await asyncio.wait_for(asyncio.to_thread(self.translate_batch, texts, target_lang), timeout=120)
+        except asyncio.TimeoutError:
+            print("Translation timed out, using original text")
+            translated = list(texts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def synthesize(text, path):
+            async with semaphore:
+                try:
+                    await self._generate_audio_async(text, voice, path)
+                    return path
+                except Exception as e:
+                    print(f"TTS Segment Error: {e}")
+                    return None
+
+        paths = await asyncio.gather(*[synthesize(t, p) for t, p in zip(translated, output_paths)])
+        return list(zip(paths, translated))
+
+    def generate_dub_segments(self, texts, target_lang, voice, output_paths):
+        # One event loop for the whole batch
+        if not texts:
+            return []
+        return asyncio.run(self.dub_segments_async(texts, target_lang, voice, output_paths))
 
     def generate_dub_segment(self, text, target_lang, voice, output_path):
         # Translate and generate TTS without handling duration (used for segments)
-        translated_text = self._translate_text(text, target_lang)
-        try:
-            asyncio.run(self._generate_audio_async(translated_text, voice, output_path))
-            return output_path, translated_text
-        except Exception as e:
-            print(f"TTS Segment Error: {e}")
-            return None, translated_text
+        return self.generate_dub_segments([text], target_lang, voice, [output_path])[0]
 
     def generate_dub(self, text, target_lang, voice, output_path):
         # 1. Translate
@@ -60,8 +155,6 @@ class DubbingEngine:
         try:
             asyncio.run(self._generate_audio_async(translated_text, voice, output_path))
         except Exception as e:
-             # Fallback for nested loops if necessary, or just basic run
-             # In main thread this usually works fine.
              print(f"TTS Error: {e}")
              return None, translated_text
              
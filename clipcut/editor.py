@@ -1,13 +1,32 @@
 import os
 import subprocess
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from clipcut.presets import PlatformPresets
 from clipcut.filters import VideoFilters
+from clipcut.smartcut import SmartCutter
+from clipcut.dub_mixer import DubTrackAssembler
+from clipcut.ffmpeg_runner import run_ffmpeg
+from clipcut.transcript import Transcript
+from clipcut.thumbnails import ClipThumbnails
+from clipcut.graph_planner import FilterGraphPlanner
+from clipcut.probe import MediaProbe
 
 class Editor:
-    def __init__(self, progress, presets):
+    def __init__(self, progress, presets, lut_compiler=None):
         self.progress = progress
         self.presets = presets
+        # Collapses color grading filters into a single lut3d when set
+        self.lut_compiler = lut_compiler
+        # Puts crop and downscale ahead of the per-pixel filters
+        self.planner = FilterGraphPlanner(presets)
+        # Poster and scrubbing sprite per clip, taken from the render graph
+        self.thumbnails = os.environ.get("CLIPCUT_THUMBNAILS", "1") != "0"
+        self._progress_lock = threading.Lock()
+        self._clip_states = {}
+        # Live encoder stats per clip (out_time, fps, speed, percent, eta)
+        self._clip_render = {}
 
     def format_time(self, seconds):
         hours = int(seconds // 3600)
@@ -20,46 +39,45 @@ class Editor:
         lines = []
         counter = 1
         
-        for t in transcript:
-            # Check overlap
-            if t["end"] > start_time and t["start"] < end_time:
-                # Clip times to segment boundaries
-                s = max(t["start"], start_time) - start_time
-                e = min(t["end"], end_time) - start_time
-                
-                if e <= s: continue
+        transcript = Transcript.from_segments(transcript)
+        for seg_start, seg_end, seg_text in transcript.overlapping(start_time, end_time).rows():
+            # Clip times to segment boundaries
+            s = max(seg_start, start_time) - start_time
+            e = min(seg_end, end_time) - start_time
+            
+            if e <= s: continue
 
-                text = t["text"].strip()
-                if not text: continue
+            text = seg_text.strip()
+            if not text: continue
+            
+            words = text.split()
+            if len(words) <= max_words:
+                lines.append(f"{counter}")
+                lines.append(f"{self.format_time(s)} --> {self.format_time(e)}")
+                lines.append(text)
+                lines.append("")
+                counter += 1
+            else:
+                # Split into chunks
+                chunks = []
+                for k in range(0, len(words), max_words):
+                    chunks.append(words[k:k+max_words])
+                
+                total_duration = e - s
+                total_chars = len(text)
+                current_s = s
                 
-                words = text.split()
-                if len(words) <= max_words:
+                for chunk in chunks:
+                    chunk_text = " ".join(chunk)
+                    chunk_duration = total_duration * (len(chunk_text) / total_chars)
+                    current_e = current_s + chunk_duration
+                    
                     lines.append(f"{counter}")
-                    lines.append(f"{self.format_time(s)} --> {self.format_time(e)}")
-                    lines.append(text)
+                    lines.append(f"{self.format_time(current_s)} --> {self.format_time(current_e)}")
+                    lines.append(chunk_text)
                     lines.append("")
                     counter += 1
-                else:
-                    # Split into chunks
-                    chunks = []
-                    for k in range(0, len(words), max_words):
-                        chunks.append(words[k:k+max_words])
-                    
-                    total_duration = e - s
-                    total_chars = len(text)
-                    current_s = s
-                    
-                    for chunk in chunks:
-                        chunk_text = " ".join(chunk)
-                        chunk_duration = total_duration * (len(chunk_text) / total_chars)
-                        current_e = current_s + chunk_duration
-                        
-                        lines.append(f"{counter}")
-                        lines.append(f"{self.format_time(current_s)} --> {self.format_time(current_e)}")
-                        lines.append(chunk_text)
-                        lines.append("")
-                        counter += 1
-                        current_s = current_e
+                    current_s = current_e
         
         with open(srt_path, "w", encoding="utf-8") as f:
             f.write("\n".join(lines))
@@ -90,106 +108,36 @@ Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour,
             s = seconds % 60
             return f"{h}:{m:02d}:{s:05.2f}"
 
-        for t in transcript:
-            # Check overlap
-            if t["end"] > start_time and t["start"] < end_time:
-                # Clip times to segment boundaries
-                s = max(t["start"], start_time) - start_time
-                e = min(t["end"], end_time) - start_time
-                
-                if e <= s: continue
+        transcript = Transcript.from_segments(transcript)
+        for seg_start, seg_end, seg_text in transcript.overlapping(start_time, end_time).rows():
+            # Clip times to segment boundaries
+            s = max(seg_start, start_time) - start_time
+            e = min(seg_end, end_time) - start_time
+            
+            if e <= s: continue
 
-                text = t["text"].strip()
-                if not text: continue
-                
-                start_str = fmt_time(s)
-                end_str = fmt_time(e)
-                
-                # Apply Animation
-                text_content = text
-                if animation == "Fade":
-                    text_content = "{\\fad(200,200)}" + text
-                elif animation == "Pop":
-                    # Simple pop effect? Scale transform?
-                    # {\t(0,200,\fscx110\fscy110)}{\t(200,400,\fscx100\fscy100)}
-                    text_content = "{\\t(0,100,\\fscx110\\fscy110)\\t(100,200,\\fscx100\\fscy100)}" + text
-                
-                line = f"Dialogue: 0,{start_str},{end_str},Default,,0,0,0,,{text_content}"
-                content.append(line)
+            text = seg_text.strip()
+            if not text: continue
+            
+            start_str = fmt_time(s)
+            end_str = fmt_time(e)
+            
+            # Apply Animation
+            text_content = text
+            if animation == "Fade":
+                text_content = "{\\fad(200,200)}" + text
+            elif animation == "Pop":
+                # Simple pop effect? Scale transform?
+                # {\t(0,200,\fscx110\fscy110)}{\t(200,400,\fscx100\fscy100)}
+                text_content = "{\\t(0,100,\\fscx110\\fscy110)\\t(100,200,\\fscx100\\fscy100)}" + text
+            
+            line = f"Dialogue: 0,{start_str},{end_str},Default,,0,0,0,,{text_content}"
+            content.append(line)
         
         with open(ass_path, "w", encoding="utf-8") as f:
             f.write("\n".join(content))
 
-    def _stretch_audio(self, input_path, target_duration, output_path):
-        """Stretches audio to match target duration using atempo filter."""
-        print(f"DEBUG: Starting _stretch_audio for {input_path} -> {target_duration}s")
-        # Get actual duration
-        probe_cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", input_path]
-        try:
-            duration_str = subprocess.check_output(probe_cmd).decode().strip()
-            current_duration = float(duration_str)
-            print(f"DEBUG: Current audio duration: {current_duration}s")
-        except Exception as e:
-            print(f"DEBUG: Probe failed: {e}")
-            return False
-
-        if current_duration <= 0 or target_duration <= 0: 
-            print("DEBUG: Invalid duration")
-            return False
-
-        # Calculate speed factor (current / target)
-        speed_factor = current_duration / target_duration
-        print(f"DEBUG: Speed factor: {speed_factor}")
-        
-        # Clamp speed factor to reasonable limits (0.5x to 4.0x) to avoid artifacts
-        # If it needs more than 4x speed up, we just do 4x.
-        
-        filters = []
-        remaining = speed_factor
-        
-        # Limit the number of chained filters to avoid FFmpeg complexity explosion
-        max_chain = 10 
-        chain_count = 0
-        
-        while remaining > 2.0 and chain_count < max_chain:
-            filters.append("atempo=2.0")
-            remaining /= 2.0
-            chain_count += 1
-        
-        while remaining < 0.5 and chain_count < max_chain:
-            filters.append("atempo=0.5")
-            remaining /= 0.5
-            chain_count += 1
-            
-        filters.append(f"atempo={remaining}")
-        filter_complex = ",".join(filters)
-        print(f"DEBUG: Filter complex: {filter_complex}")
-        
-        cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-filter:a", filter_complex,
-            "-vn", output_path
-        ]
-        
-        print(f"DEBUG: Running FFmpeg stretch command: {' '.join(cmd)}")
-        try:
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120) # Add timeout
-            if result.returncode != 0:
-                print(f"DEBUG: Stretch failed stderr: {result.stderr.decode()}")
-            else:
-                print("DEBUG: Stretch success")
-        except subprocess.TimeoutExpired:
-            print("DEBUG: FFmpeg stretch timed out")
-            return False
-        except Exception as e:
-            print(f"DEBUG: FFmpeg stretch exception: {e}")
-            return False
-            
-        return os.path.exists(output_path)
-
-    def render_clips(self, src_path, segments, platform, auto_edit, burn_subs, transcript, analysis, job_id=None, dubbing_engine=None, target_language=None, voice_gender="Male", subtitle_font="Arial", subtitle_words=5, subtitle_animation="None", filters=None, trim_start=0, trim_end=0, transition_type="none", bg_music_path=None, bg_volume=0.2):
-        outputs = []
-        
+    def render_clips(self, src_path, segments, platform, auto_edit, burn_subs, transcript, analysis, job_id=None, dubbing_engine=None, target_language=None, voice_gender="Male", subtitle_font="Arial", subtitle_words=5, subtitle_animation="None", filters=None, trim_start=0, trim_end=0, transition_type="none", bg_music_path=None, bg_volume=0.2, max_workers=None, render_mode="per_clip"):
         # Override segments if manual trim
         if trim_end > trim_start:
              segments = [{"start": trim_start, "end": trim_end}]
@@ -200,294 +148,561 @@ Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour,
         base_dir = os.path.dirname(src_path)
         filename = os.path.basename(src_path)
         name, ext = os.path.splitext(filename)
+
+        # Clips are independent, so render them on a bounded pool and split
+        # the ffmpeg thread budget between the workers.
+        workers = self._pool_size(len(segments), max_workers)
+        threads_per_clip = max(1, (os.cpu_count() or 1) // workers)
+
+        opts = {
+            "src_path": src_path,
+            "platform": platform,
+            "burn_subs": burn_subs,
+            "transcript": Transcript.from_segments(transcript),
+            "job_id": job_id,
+            "dubbing_engine": dubbing_engine,
+            "target_language": target_language,
+            "voice_gender": voice_gender,
+            "subtitle_font": subtitle_font,
+            "subtitle_words": subtitle_words,
+            "subtitle_animation": subtitle_animation,
+            "filters": filters,
+            "transition_type": transition_type,
+            "bg_music_path": bg_music_path,
+            "bg_volume": bg_volume,
+            "base_dir": base_dir,
+            "name": name,
+            "ext": ext,
+            "threads": threads_per_clip,
+            "source_size": self._source_size(src_path, analysis),
+        }
+
+        self._clip_states = {}
+        self._clip_render = {}
+        for i in range(len(segments)):
+            self._set_clip_state(job_id, i, "queued")
+
+        if render_mode == "single_pass" and len(segments) > 1:
+            return self._render_single_pass(segments, opts, workers)
+
+        print(f"DEBUG: Rendering {len(segments)} clips with {workers} workers, {threads_per_clip} ffmpeg threads each")
+        results = [None] * len(segments)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self._render_clip_safe, i, seg, opts): i for i, seg in enumerate(segments)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                self._set_clip_state(job_id, i, "done" if results[i] else "failed")
+
+        # Keep the ranked order regardless of which clip finished first
+        return [r for r in results if r]
+
+    def _render_single_pass(self, segments, opts, workers):
+        """
+        Renders every clip from one ffmpeg process that decodes the source once.
+        Dubbing and subtitle files are still prepared per clip (in parallel),
+        then a single filter graph selects the frames that belong to any clip,
+        applies the shared color/crop work once and splits into one
+        trim + setpts branch per output.
+        """
+        job_id = opts["job_id"]
+        clips = [None] * len(segments)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self._prepare_clip, i, seg, opts): i for i, seg in enumerate(segments)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    clips[i] = future.result()
+                except Exception as e:
+                    print(f"Clip preparation failed for clip {i+1}: {e}")
+                    self._set_clip_state(job_id, i, "failed")
+        clips = [c for c in clips if c]
+        if not clips:
+            return []
+
+        cmd = self._single_pass_command(clips, opts)
+        for clip in clips:
+            self._set_clip_state(job_id, clip["index"], "rendering")
+
+        print(f"DEBUG: Running single pass render command: {' '.join(cmd)}")
+        try:
+            timeout = 600 * len(clips)
+            # The outputs are written side by side, progress follows the longest one
+            on_progress = self._clip_progress(job_id, [c["index"] for c in clips])
+            result = run_ffmpeg(cmd, on_progress=on_progress, duration=max(c["duration"] for c in clips), timeout=timeout)
+            if result.returncode != 0:
+                 print("FFmpeg single pass render failed")
+                 print(f"Error: {result.stderr.decode()}")
+        except subprocess.TimeoutExpired:
+             print("FFmpeg single pass render timed out")
+        except Exception as e:
+             print(f"FFmpeg error: {e}")
+
+        outputs = []
+        for clip in clips:
+            ok = os.path.exists(clip["out_path"])
+            self._set_clip_state(job_id, clip["index"], "done" if ok else "failed")
+            if ok:
+                outputs.append(self._output_entry(clip))
+        return outputs
+
+    def _single_pass_command(self, clips, opts):
+        # Only decode the span that covers all clips. After input seeking the
+        # timestamps start at 0 at span_start, so clip bounds are made relative.
+        span_start = min(c["start"] for c in clips)
+        span_end = max(c["end"] for c in clips)
+
+        cmd = ["ffmpeg", "-y"]
+        # -t is an input option here: after -i it would bound the next
+        # input (dub or music) or the first output instead of the source
+        cmd.extend(["-ss", str(span_start)])
+        cmd.extend(["-t", str(span_end - span_start)])
+        cmd.extend(["-i", opts["src_path"]])
+
+        # Extra inputs: per-clip dub tracks and one looped music input per clip
+        next_input = 1
+        dub_inputs = {}
+        bg_inputs = {}
+        for clip in clips:
+            if clip["dub_audio_path"]:
+                cmd.extend(["-i", clip["dub_audio_path"]])
+                dub_inputs[clip["index"]] = next_input
+                next_input += 1
+            if opts["bg_music_path"]:
+                cmd.extend(["-stream_loop", "-1", "-i", opts["bg_music_path"]])
+                bg_inputs[clip["index"]] = next_input
+                next_input += 1
+
+        graph = []
+
+        # Shared video work: drop frames outside every clip, then grade and crop once
+        ranges = [(c["start"] - span_start, c["end"] - span_start) for c in clips]
+        select_expr = "+".join(f"between(t,{a},{b})" for a, b in ranges)
+        shared = [f"select='{select_expr}'"] + self._shared_video_chain(opts)
+        split_labels = "".join(f"[vs{k}]" for k in range(len(clips)))
+        graph.append(f"[0:v]{','.join(shared)},split={len(clips)}{split_labels}")
+
+        # Original audio is only split for the clips that are not dubbed
+        orig_audio = [c for c in clips if c["index"] not in dub_inputs]
+        if orig_audio:
+            asplit_labels = "".join(f"[as{c['index']}]" for c in orig_audio)
+            graph.append(f"[0:a]asplit={len(orig_audio)}{asplit_labels}")
+
+        for k, clip in enumerate(clips):
+            idx = clip["index"]
+            a, b = ranges[k]
+            vf_chain = [f"trim=start={a}:end={b}", "setpts=PTS-STARTPTS"] + self._clip_video_chain(clip, opts)
+            if clip["thumbs"]:
+                graph.append(f"[vs{k}]{','.join(vf_chain)},split=2[v{idx}][vt{idx}]")
+                graph.extend(clip["thumbs"].graph(f"vt{idx}", idx))
+            else:
+                graph.append(f"[vs{k}]{','.join(vf_chain)}[v{idx}]")
+
+            if idx in dub_inputs:
+                main_audio = f"[{dub_inputs[idx]}:a]anull[am{idx}]"
+            else:
+                main_audio = f"[as{idx}]atrim=start={a}:end={b},asetpts=PTS-STARTPTS[am{idx}]"
+            graph.append(main_audio)
+
+            af_chain = self._clip_audio_chain(clip, opts)
+            if idx in bg_inputs:
+                graph.append(f"[{bg_inputs[idx]}:a]volume={opts['bg_volume']}[bg{idx}]")
+                mix = ["amix=inputs=2:duration=first:dropout_transition=0", "volume=2"] + af_chain
+                graph.append(f"[am{idx}][bg{idx}]{','.join(mix)}[a{idx}]")
+            else:
+                graph.append(f"[am{idx}]{','.join(af_chain or ['anull'])}[a{idx}]")
+
+        cmd.extend(["-filter_complex", ";".join(graph)])
+
+        # select leaves the graph without a frame rate and the muxer would
+        # fall back to 25 fps, dropping frames; keep the source's rate
+        frame_rate = self._frame_rate(opts["src_path"])
+        for clip in clips:
+            idx = clip["index"]
+            cmd.extend(["-map", f"[v{idx}]", "-map", f"[a{idx}]"])
+            if frame_rate:
+                cmd.extend(["-r", frame_rate])
+            cmd.extend(["-c:v", "libx264", "-pix_fmt", "yuv420p"])
+            cmd.extend(["-threads", str(opts["threads"])])
+            cmd.extend(["-c:a", "aac"])
+            cmd.extend(["-t", str(clip["duration"])])
+            cmd.append(clip["out_path"])
+            if clip["thumbs"]:
+                cmd.extend(clip["thumbs"].output_args(idx))
+        return cmd
+
+    def _pool_size(self, num_clips, max_workers=None):
+        if num_clips <= 0:
+            return 1
+        if max_workers is None:
+            max_workers = int(os.environ.get("CLIPCUT_RENDER_WORKERS", "0")) or None
+        if max_workers is None:
+            # x264 scales well up to ~4 threads per encode, so aim for that
+            max_workers = max(1, (os.cpu_count() or 1) // 4)
+        return max(1, min(num_clips, max_workers))
+
+    def _set_clip_state(self, job_id, i, state):
+        if not job_id:
+            return
+        with self._progress_lock:
+            self._clip_states[i] = state
+            self._publish_clips(job_id)
+
+    def _clip_progress(self, job_id, indices):
+        """Returns an ffmpeg progress callback publishing the stats for the given clips."""
+        def on_progress(info):
+            if not job_id:
+                return
+            with self._progress_lock:
+                for i in indices:
+                    self._clip_render[i] = info
+                self._publish_clips(job_id)
+        return on_progress
+
+    def _publish_clips(self, job_id):
+        # Caller holds the progress lock
+        clips = []
+        for k in sorted(self._clip_states):
+            entry = {"clip": k + 1, "status": self._clip_states[k]}
+            if self._clip_states[k] == "rendering" and k in self._clip_render:
+                entry.update(self._clip_render[k])
+            clips.append(entry)
+        done = sum(1 for c in clips if c["status"] in ("done", "failed"))
+        self.progress.update(job_id, "clips", clips)
+        self.progress.update(job_id, "clips_done", done)
+
+    def _render_clip_safe(self, i, seg, opts):
+        # A failure in one clip must not take down the others in the pool
+        try:
+            return self._render_clip(i, seg, opts)
+        except Exception as e:
+            print(f"Render failed for clip {i+1}: {e}")
+            return None
+
+    def _render_clip(self, i, seg, opts):
+        clip = self._prepare_clip(i, seg, opts)
+        return self._encode_clip(clip, opts)
+
+    def _prepare_clip(self, i, seg, opts):
+        """Runs dubbing and writes the subtitle files for one clip."""
+        transcript = opts["transcript"]
+        job_id = opts["job_id"]
+        dubbing_engine = opts["dubbing_engine"]
+        target_language = opts["target_language"]
+        voice_gender = opts["voice_gender"]
+        subtitle_font = opts["subtitle_font"]
+        subtitle_words = opts["subtitle_words"]
+        subtitle_animation = opts["subtitle_animation"]
+        base_dir = opts["base_dir"]
+        name = opts["name"]
+        ext = opts["ext"]
+
+        start = seg["start"]
+        end = seg["end"]
+        duration = end - start
         
-        for i, seg in enumerate(segments):
-            start = seg["start"]
-            end = seg["end"]
-            duration = end - start
-            
-            out_name = f"{name}_clip_{i+1}{ext}"
-            out_path = os.path.join(base_dir, out_name)
-            srt_name = f"{name}_clip_{i+1}.srt"
-            srt_path = os.path.join(base_dir, srt_name)
-            ass_name = f"{name}_clip_{i+1}.ass"
-            ass_path = os.path.join(base_dir, ass_name)
-            
-            # Prepare to collect translated segments if dubbing
-            translated_segments = []
-            
-            # Handle Dubbing if enabled
-            dub_audio_path = None
-            if dubbing_engine:
-                voice = dubbing_engine.get_voice_for_lang(target_language, voice_gender)
-                dub_segments_files = []
-                
-                # Filter transcript segments relevant to this clip
-                clip_segments = []
-                full_clip_text_parts = []
-                for t in transcript:
-                    if t["end"] > start and t["start"] < end:
-                        clip_segments.append(t)
-                        full_clip_text_parts.append(t["text"])
-                
-                full_clip_text = " ".join(full_clip_text_parts)
-
-                if clip_segments:
-                    if job_id:
-                        self.progress.update(job_id, "status", f"dubbing_clip_{i+1}")
-                        
-                    # Generate audio for each segment
-                    segment_audio_parts = []
-                    last_end = 0 # Relative to clip start
+        out_name = f"{name}_clip_{i+1}{ext}"
+        out_path = os.path.join(base_dir, out_name)
+        srt_name = f"{name}_clip_{i+1}.srt"
+        srt_path = os.path.join(base_dir, srt_name)
+        ass_name = f"{name}_clip_{i+1}.ass"
+        ass_path = os.path.join(base_dir, ass_name)
+        
+        # Prepare to collect translated segments if dubbing
+        translated_segments = None
+        
+        # Handle Dubbing if enabled
+        dub_audio_path = None
+        if dubbing_engine:
+            voice = dubbing_engine.get_voice_for_lang(target_language, voice_gender)
+            # Transcript segments relevant to this clip
+            clip_segments = transcript.overlapping(start, end)
+            full_clip_text = clip_segments.text()
+
+            if len(clip_segments):
+                self._set_clip_state(job_id, i, "dubbing")
                     
-                    for idx, t in enumerate(clip_segments):
-                        # Relative times
-                        rel_start = max(0, t["start"] - start)
-                        rel_end = min(duration, t["end"] - start)
-                        seg_duration = rel_end - rel_start
-                        
-                        if seg_duration <= 0.1: continue
-
-                        # Generate TTS for this segment
-                        seg_text = t["text"]
-                        seg_filename = f"{name}_clip_{i+1}_seg_{idx}.mp3"
-                        seg_path = os.path.join(base_dir, seg_filename)
-                        
-                        generated_path, translated_text = dubbing_engine.generate_dub_segment(seg_text, target_language, voice, seg_path)
-                        
-                        # Collect translated text for subtitles
-                        if translated_text:
-                            translated_segments.append({
-                                "start": t["start"],
-                                "end": t["end"],
-                                "text": translated_text
-                            })
-                        else:
-                             translated_segments.append(t) # Fallback to original
-                        
-                        if generated_path and os.path.exists(generated_path):
-                            # Time stretch to fit duration
-                            stretched_filename = f"{name}_clip_{i+1}_seg_{idx}_stretched.mp3"
-                            stretched_path = os.path.join(base_dir, stretched_filename)
-                            
-                            if self._stretch_audio(generated_path, seg_duration, stretched_path):
-                                segment_audio_parts.append({
-                                    "path": stretched_path,
-                                    "start": rel_start,
-                                    "end": rel_end
-                                })
+                # Generate audio for each segment and lay it out on the clip timeline
+                assembler = DubTrackAssembler()
+                segment_audio_parts = []
+                
+                # Segments long enough to be voiced, with their clip-relative slots
+                slots = []
+                for idx, (seg_start, seg_end, seg_text) in enumerate(clip_segments.rows()):
+                    # Relative times
+                    rel_start = max(0, seg_start - start)
+                    rel_end = min(duration, seg_end - start)
+                    seg_duration = rel_end - rel_start
                     
-                    # Construct full audio track by mixing segments onto a silent base
-                    # 1. Create silent base
-                    silent_base_path = os.path.join(base_dir, f"{name}_clip_{i+1}_silence.mp3")
-                    subprocess.run([
-                        "ffmpeg", "-y", "-f", "lavfi", "-i", f"anullsrc=r=24000:cl=mono:d={duration}",
-                        "-q:a", "9", silent_base_path
-                    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    if seg_duration <= 0.1: continue
+
+                    seg_filename = f"{name}_clip_{i+1}_seg_{idx}.mp3"
+                    slots.append((idx, rel_start, rel_end, os.path.join(base_dir, seg_filename)))
+
+                # Translate and voice all segments of the clip in one batch
+                generated = dubbing_engine.generate_dub_segments(
+                    [clip_segments.texts[slot[0]] for slot in slots], target_language, voice, [slot[3] for slot in slots]
+                )
+
+                # Subtitles use the translated text, the original where translation failed
+                translated_texts = list(clip_segments.texts)
+                for (idx, rel_start, rel_end, seg_path), (generated_path, translated_text) in zip(slots, generated):
+                    if translated_text:
+                        translated_texts[idx] = translated_text
                     
-                    # 2. Mix segments
-                    # Complex filter to delay and mix
-                    if segment_audio_parts:
-                        mix_cmd = ["ffmpeg", "-y", "-i", silent_base_path]
-                        filter_complex = "[0:a]" # Start with silent base
-                        inputs = 1
-                        
-                        for part in segment_audio_parts:
-                            mix_cmd.extend(["-i", part["path"]])
-                            # Delay audio
-                            delay_ms = int(part["start"] * 1000)
-                            filter_complex += f"[{inputs}:a]adelay={delay_ms}|{delay_ms}[a{inputs}];"
-                            inputs += 1
-                        
-                        # Mix all delayed streams with base
-                        # [0:a][a1][a2]...amix=inputs=N:duration=first
-                        mix_inputs = "".join([f"[a{k}]" for k in range(1, inputs)])
-                        filter_complex += f"[0:a]{mix_inputs}amix=inputs={inputs}:duration=first:dropout_transition=0[outa]"
-                        
-                        final_dub_path = os.path.join(base_dir, f"{name}_clip_{i+1}_dub_final.mp3")
-                        mix_cmd.extend(["-filter_complex", filter_complex, "-map", "[outa]", final_dub_path])
-                        
-                        subprocess.run(mix_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                        
-                        if os.path.exists(final_dub_path):
-                            dub_audio_path = final_dub_path
+                    if generated_path and os.path.exists(generated_path):
+                        # Decoded once; stretching to the segment slot happens in memory
+                        samples = assembler.decode(generated_path)
+                        if samples is not None and len(samples):
+                            segment_audio_parts.append((samples, rel_start, rel_end))
+                
+                voiced = [slot[0] for slot in slots]
+                translated_segments = Transcript(
+                    clip_segments.starts[voiced], clip_segments.ends[voiced],
+                    [translated_texts[idx] for idx in voiced], presorted=True
+                )
+
+                if segment_audio_parts:
+                    final_dub_path = os.path.join(base_dir, f"{name}_clip_{i+1}_dub_final.wav")
+                    if assembler.assemble(segment_audio_parts, duration, final_dub_path):
+                        dub_audio_path = final_dub_path
+            
+            # Fallback Dubbing (if segment assembly failed OR just use as retry? No, if segments exist we used them)
+            # But if dub_audio_path is still None (e.g. all segments failed), try fallback
+            if not dub_audio_path and full_clip_text:
+                self._set_clip_state(job_id, i, "dubbing_fallback")
+                fallback_dub_path = os.path.join(base_dir, f"{name}_clip_{i+1}_dub_fallback.mp3")
                 
-                # Fallback Dubbing (if segment assembly failed OR just use as retry? No, if segments exist we used them)
-                # But if dub_audio_path is still None (e.g. all segments failed), try fallback
-                if not dub_audio_path and full_clip_text:
-                    if job_id:
-                        self.progress.update(job_id, "status", f"dubbing_fallback_{i+1}")
-                    fallback_dub_path = os.path.join(base_dir, f"{name}_clip_{i+1}_dub_fallback.mp3")
+                try:
+                    gen_path, translated_text = dubbing_engine.generate_dub(full_clip_text, target_language, voice, fallback_dub_path)
                     
+                    if gen_path and os.path.exists(gen_path):
+                        # STRETCH FALLBACK AUDIO TO MATCH CLIP DURATION EXACTLY
+                        assembler = DubTrackAssembler()
+                        samples = assembler.decode(gen_path)
+                        fallback_wav_path = os.path.join(base_dir, f"{name}_clip_{i+1}_dub_fallback.wav")
+                        if samples is not None and len(samples) and assembler.assemble([(samples, 0, duration)], duration, fallback_wav_path):
+                            dub_audio_path = fallback_wav_path
+                        else:
+                            dub_audio_path = gen_path
+                except Exception as e:
+                    print(f"Fallback Dubbing Failed: {e}")
+                    # Don't fail the whole clip, just proceed without dubbing
+                    pass
+
+        # Determine transcript for subtitles
+        # If dubbing was active and we have translated segments, use them.
+        final_transcript = translated_segments if (dubbing_engine and translated_segments) else transcript
+        
+        # Generate Subtitles (SRT and ASS)
+        # We create both. SRT for download, ASS for burning (better styling).
+        self.create_srt(final_transcript, start, end, srt_path, max_words=subtitle_words)
+        self.create_ass(final_transcript, start, end, ass_path, font=subtitle_font, animation=subtitle_animation)
+
+        return {
+            "index": i,
+            "start": start,
+            "end": end,
+            "duration": duration,
+            "out_path": out_path,
+            "srt_path": srt_path,
+            "ass_path": ass_path,
+            "dub_audio_path": dub_audio_path,
+            "thumbs": ClipThumbnails(os.path.join(base_dir, f"{name}_clip_{i+1}"), duration) if self.thumbnails else None,
+        }
+
+    def _encode_clip(self, clip, opts):
+        src_path = opts["src_path"]
+        job_id = opts["job_id"]
+        bg_music_path = opts["bg_music_path"]
+        bg_volume = opts["bg_volume"]
+
+        i = clip["index"]
+        start = clip["start"]
+        end = clip["end"]
+        duration = clip["duration"]
+        out_path = clip["out_path"]
+        dub_audio_path = clip["dub_audio_path"]
+
+        # Pure cuts only need the partial GOPs at the edges re-encoded
+        if self._is_pure_cut(clip, opts):
+            self._set_clip_state(job_id, i, "rendering")
+            if SmartCutter().cut(src_path, start, end, out_path, threads=opts["threads"], on_progress=self._clip_progress(job_id, [i])):
+                print(f"DEBUG: Smart cut success for clip {i+1}")
+                if clip["thumbs"]:
+                    # Nothing was decoded, so thumbnails need a pass over the short clip
                     try:
-                        gen_path, translated_text = dubbing_engine.generate_dub(full_clip_text, target_language, voice, fallback_dub_path)
-                        
-                        if gen_path and os.path.exists(gen_path):
-                            # STRETCH FALLBACK AUDIO TO MATCH CLIP DURATION EXACTLY
-                            stretched_fallback_path = os.path.join(base_dir, f"{name}_clip_{i+1}_dub_fallback_stretched.mp3")
-                            if self._stretch_audio(gen_path, duration, stretched_fallback_path):
-                                dub_audio_path = stretched_fallback_path
-                            else:
-                                dub_audio_path = gen_path
-                    except Exception as e:
-                        print(f"Fallback Dubbing Failed: {e}")
-                        # Don't fail the whole clip, just proceed without dubbing
-                        pass
-
-            # Determine transcript for subtitles
-            # If dubbing was active and we have translated segments, use them.
-            final_transcript = translated_segments if (dubbing_engine and translated_segments) else transcript
-            
-            # Generate Subtitles (SRT and ASS)
-            # We create both. SRT for download, ASS for burning (better styling).
-            self.create_srt(final_transcript, start, end, srt_path, max_words=subtitle_words)
-            self.create_ass(final_transcript, start, end, ass_path, font=subtitle_font, animation=subtitle_animation)
+                        subprocess.run(clip["thumbs"].command(out_path), capture_output=True, timeout=120)
+                    except subprocess.TimeoutExpired:
+                        print(f"Thumbnails timed out for clip {i+1}")
+                return self._output_entry(clip)
+            print(f"DEBUG: Smart cut not possible for clip {i+1}, re-encoding")
 
-            # Construct FFmpeg command
-            cmd = ["ffmpeg", "-y"]
-            
-            # Input video (0)
-            cmd.extend(["-ss", str(start)])
-            cmd.extend(["-i", src_path])
-            cmd.extend(["-t", str(duration)])
-            
-            # Input dub audio if exists (1)
-            if dub_audio_path:
-                cmd.extend(["-i", dub_audio_path])
-            
-            # Input BG Music if exists (1 or 2)
-            if bg_music_path:
-                cmd.extend(["-stream_loop", "-1"])
-                cmd.extend(["-i", bg_music_path])
-            
-            # Video Codec
-            cmd.extend(["-c:v", "libx264"])
-            
-            # Audio Handling (Mixing logic)
-            filter_complex_parts = []
-            audio_map = None
-            
-            # Determine indices
-            main_audio_idx = 1 if dub_audio_path else 0
-            bg_music_idx = -1
-            
-            if bg_music_path:
-                bg_music_idx = 2 if dub_audio_path else 1
+        # Construct FFmpeg command
+        cmd = ["ffmpeg", "-y"]
+        
+        # Input video (0). The duration is an input option so every branch
+        # of the graph (clip and thumbnails) ends with the clip
+        cmd.extend(["-ss", str(start)])
+        cmd.extend(["-t", str(duration)])
+        cmd.extend(["-i", src_path])
+        
+        # Input dub audio if exists (1)
+        if dub_audio_path:
+            cmd.extend(["-i", dub_audio_path])
+        
+        # Input BG Music if exists (1 or 2)
+        if bg_music_path:
+            cmd.extend(["-stream_loop", "-1"])
+            cmd.extend(["-i", bg_music_path])
+        
+        # Video and audio both go through one filter graph; -vf/-af can't
+        # be combined with streams coming out of -filter_complex
+        graph = []
+
+        # Video Filters (Color + Crop + Subtitles + Transitions)
+        vf_chain = self._shared_video_chain(opts) + self._clip_video_chain(clip, opts)
+        thumbs = clip["thumbs"]
+        if thumbs:
+            graph.append(f"[0:v]{','.join(vf_chain + ['split=2'])}[outv][vt]")
+            graph.extend(thumbs.graph("vt", ""))
+        else:
+            graph.append(f"[0:v]{','.join(vf_chain or ['null'])}[outv]")
+
+        # Audio Handling (Mixing logic)
+        main_audio_idx = 1 if dub_audio_path else 0
+        af_chain = self._clip_audio_chain(clip, opts)
+        if bg_music_path:
+            bg_music_idx = 2 if dub_audio_path else 1
+            # Mix BG Music with Main Audio
+            # 1. Adjust BG volume
+            graph.append(f"[{bg_music_idx}:a]volume={bg_volume}[bg]")
             
-            if bg_music_path:
-                # Mix BG Music with Main Audio
-                # 1. Adjust BG volume
-                filter_complex_parts.append(f"[{bg_music_idx}:a]volume={bg_volume}[bg]")
-                
-                # 2. Mix with Main Audio
-                # Using amix with 2 inputs. Default behavior normalizes (divides by 2).
-                # To restore Main Audio level (assuming it was good), we multiply result by 2.
-                # [main][bg]amix...
-                filter_complex_parts.append(f"[{main_audio_idx}:a][bg]amix=inputs=2:duration=first:dropout_transition=0,volume=2[outa]")
-                
-                audio_map = "[outa]"
+            # 2. Mix with Main Audio
+            # Using amix with 2 inputs. Default behavior normalizes (divides by 2).
+            # To restore Main Audio level (assuming it was good), we multiply result by 2.
+            mix = ["amix=inputs=2:duration=first:dropout_transition=0", "volume=2"] + af_chain
+            graph.append(f"[{main_audio_idx}:a][bg]{','.join(mix)}[outa]")
+        else:
+            graph.append(f"[{main_audio_idx}:a]{','.join(af_chain or ['anull'])}[outa]")
+
+        cmd.extend(["-filter_complex", ";".join(graph)])
+        cmd.extend(["-map", "[outv]", "-map", "[outa]"])
+        
+        # Video Codec. 4:2:0 whatever the graph ends in: after an RGB filter
+        # (lut3d, colorbalance) x264 would pick 4:4:4, which most players reject
+        cmd.extend(["-c:v", "libx264", "-pix_fmt", "yuv420p"])
+        cmd.extend(["-threads", str(opts["threads"])])
+        
+        cmd.extend(["-c:a", "aac"])
+        cmd.extend(["-strict", "experimental"])
+        
+        # FORCE OUTPUT DURATION
+        # This ensures that even if audio is slightly longer due to processing, the clip is cut at the exact duration
+        cmd.extend(["-t", str(duration)])
+        
+        cmd.append(out_path)
+        if thumbs:
+            cmd.extend(thumbs.output_args(""))
+        
+        # Run FFmpeg
+        self._set_clip_state(job_id, i, "rendering")
+        print(f"DEBUG: Running final render command: {' '.join(cmd)}")
+        try:
+            result = run_ffmpeg(cmd, on_progress=self._clip_progress(job_id, [i]), duration=duration, timeout=600) # 10 min timeout
+            if result.returncode != 0:
+                 print(f"FFmpeg failed for clip {i+1}")
+                 print(f"Command: {' '.join(cmd)}")
+                 print(f"Error: {result.stderr.decode()}")
             else:
-                # No BG Music
-                if dub_audio_path:
-                    audio_map = "1:a"
-                else:
-                    audio_map = "0:a"
-            
-            # Add Filter Complex if needed for Audio
-            if filter_complex_parts:
-                # If we have filter_complex for audio, we need to be careful if we also use -vf for video
-                # FFmpeg allows -filter_complex for complex graphs and -vf for simple video filters
-                # BUT if we use -filter_complex, it's often better to put everything there.
-                # However, for simplicity, we'll try to keep them separate if possible, or combine.
-                # Actually, mixing -vf and -filter_complex can be tricky.
-                # Safe bet: pass audio mixing in -filter_complex and video filters in -vf.
-                # As long as they don't share streams, it should be fine.
-                cmd.extend(["-filter_complex", ";".join(filter_complex_parts)])
-            
-            # Map Video
-            cmd.extend(["-map", "0:v"])
-            
-            # Map Audio
-            cmd.extend(["-map", audio_map])
-            
-            cmd.extend(["-c:a", "aac"])
-            cmd.extend(["-strict", "experimental"])
-            
-            # Video Filters (Crop + Subtitles)
-            vf_chain = []
-            
-            # Apply Color Filters (via VideoFilters)
-            if filters:
-                vf_chain.extend(VideoFilters.get_filter_chain(filters))
-                
-                # Manual Slider Application (Editor side logic for simpler sliders, if not handled in VideoFilters)
-                # Actually, let's move ALL logic to VideoFilters to keep Editor clean.
-                # But Editor.py was doing EQ construction before.
-                # Let's remove the inline EQ construction here and rely on VideoFilters completely?
-                # The previous code for EQ was removed in my mind, but let's check if it's there.
-                # Wait, I see "eq=" in the Read output previously?
-                # Ah, in previous turns I added eq construction in Editor.py.
-                # I should replace that block to avoid duplication if I move logic to VideoFilters.
-                # OR I just append here.
-                
-                # Let's handle the "Legacy" sliders here if they are not in VideoFilters yet?
-                # No, better to move everything to VideoFilters class.
-                pass 
-
-            # Cropping
-            if platform in ["shorts", "reels_instagram", "reels_facebook", "tiktok"]:
-                 vf_chain.append("crop=ih*(9/16):ih:(iw-ow)/2:0")
-            elif platform == "square":
-                 vf_chain.append("crop=ih:ih:(iw-ow)/2:0")
-            # landscape needs no crop if source is landscape. If source is different, we might need logic, but assume landscape source for now.
-            
-            # Burning Subtitles
-            if burn_subs:
-                 escaped_ass = ass_path.replace("\\", "/").replace(":", "\\:")
-                 vf_chain.append(f"subtitles='{escaped_ass}'")
-            
-            # Transitions
-            af_chain = []
-            if transition_type == "fade" and duration > 1.0:
-                 vf_chain.append(f"fade=t=in:st=0:d=0.5")
-                 vf_chain.append(f"fade=t=out:st={duration-0.5}:d=0.5")
-                 af_chain.append(f"afade=t=in:st=0:d=0.5")
-                 af_chain.append(f"afade=t=out:st={duration-0.5}:d=0.5")
-
-            if vf_chain:
-                cmd.extend(["-vf", ",".join(vf_chain)])
-            
-            if af_chain:
-                cmd.extend(["-af", ",".join(af_chain)])
-            
-            # FORCE OUTPUT DURATION
-            # This ensures that even if audio is slightly longer due to processing, the clip is cut at the exact duration
-            cmd.extend(["-t", str(duration)])
-            
-            cmd.append(out_path)
+                 print(f"DEBUG: Render success for clip {i+1}")
+        except subprocess.TimeoutExpired:
+             print(f"FFmpeg timed out for clip {i+1}")
+        except Exception as e:
+             print(f"FFmpeg error: {e}")
             
-            # Run FFmpeg
-            print(f"DEBUG: Running final render command: {' '.join(cmd)}")
+        if os.path.exists(out_path):
+            return self._output_entry(clip)
+        return None
+
+    def _output_entry(self, clip):
+        entry = {
+            "video_path": clip["out_path"],
+            "srt_path": clip["srt_path"],
+            "ass_path": clip["ass_path"],
+            "start": clip["start"],
+            "end": clip["end"]
+        }
+        if clip["thumbs"]:
+            clip["thumbs"].write_vtt()
+            entry.update(clip["thumbs"].paths())
+        return entry
+
+    def _is_pure_cut(self, clip, opts):
+        """True when the clip is a plain trim that doesn't need any re-encoding of pixels or audio mixing."""
+        if opts["filters"] and VideoFilters.get_filter_chain(opts["filters"]):
+            return False
+        if opts["burn_subs"] or clip["dub_audio_path"] or opts["bg_music_path"]:
+            return False
+        # Cropped for anything but landscape, downscaled when larger than the preset
+        if self._shared_video_chain(opts):
+            return False
+        if self._clip_audio_chain(clip, opts):
+            return False
+        return True
+
+    def _shared_video_chain(self, opts):
+        """Filters that are identical for every clip of a job (crop, downscale and color grading)."""
+        # Apply Color Filters (via VideoFilters)
+        chain = VideoFilters.get_filter_chain(opts["filters"]) if opts["filters"] else []
+
+        # Cropping and scaling to the platform size, ahead of the color work
+        vf_chain = self.planner.plan(chain, opts["platform"], opts.get("source_size"))
+
+        if chain and self.lut_compiler:
             try:
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=600) # 10 min timeout
-                if result.returncode != 0:
-                     print(f"FFmpeg failed for clip {i+1}")
-                     print(f"Command: {' '.join(cmd)}")
-                     print(f"Error: {result.stderr.decode()}")
-                else:
-                     print(f"DEBUG: Render success for clip {i+1}")
-            except subprocess.TimeoutExpired:
-                 print(f"FFmpeg timed out for clip {i+1}")
+                vf_chain = self.lut_compiler.compile_chain(vf_chain)
             except Exception as e:
-                 print(f"FFmpeg error: {e}")
-                
-            if os.path.exists(out_path):
-                outputs.append({
-                    "video_path": out_path,
-                    "srt_path": srt_path,
-                    "ass_path": ass_path,
-                    "start": start,
-                    "end": end
-                })
+                print(f"LUT compile failed, using the plain filter chain: {e}")
+        return vf_chain
+
+    def _source_size(self, src_path, analysis):
+        """(width, height) of the source, or None if it can't be read."""
+        if isinstance(analysis, dict) and analysis.get("width") and analysis.get("height"):
+            return (analysis["width"], analysis["height"])
+        stream = MediaProbe.video_stream(src_path)
+        if stream and stream.get("width") and stream.get("height"):
+            return (int(stream["width"]), int(stream["height"]))
+        return None
+
+    def _frame_rate(self, src_path):
+        """The source's r_frame_rate as ffmpeg writes it (e.g. "30000/1001"), or None."""
+        stream = MediaProbe.video_stream(src_path)
+        rate = stream.get("r_frame_rate") if stream else None
+        if not rate or rate.startswith("0"):
+            return None
+        return rate
+
+    def _clip_video_chain(self, clip, opts):
+        """Filters that depend on the clip itself (burned subtitles and fades)."""
+        vf_chain = []
         
-        return outputs
+        # Burning Subtitles
+        if opts["burn_subs"]:
+             escaped_ass = clip["ass_path"].replace("\\", "/").replace(":", "\\:")
+             vf_chain.append(f"subtitles='{escaped_ass}'")
+        
+        # Transitions
+        duration = clip["duration"]
+        if opts["transition_type"] == "fade" and duration > 1.0:
+             vf_chain.append("fade=t=in:st=0:d=0.5")
+             vf_chain.append(f"fade=t=out:st={duration-0.5}:d=0.5")
+        return vf_chain
+
+    def _clip_audio_chain(self, clip, opts):
+        af_chain = []
+        duration = clip["duration"]
+        if opts["transition_type"] == "fade" and duration > 1.0:
+             af_chain.append("afade=t=in:st=0:d=0.5")
+             af_chain.append(f"afade=t=out:st={duration-0.5}:d=0.5")
+        return af_chain
@@ -0,0 +1,94 @@
+import subprocess
+import threading
+import time
+from collections import deque
+
+# Minimum seconds between two progress callbacks for one process
+REPORT_INTERVAL = 0.5
+
+
+def run_ffmpeg(cmd, on_progress=None, duration=None, offset=0.0, timeout=600):
+    """
+    Runs an ffmpeg command with machine readable progress on stdout
+    (-progress pipe:1) and returns a CompletedProcess like subprocess.run.
+    on_progress receives a dict with out_time, fps, speed (x realtime) and,
+    when the expected output duration is known, percent and eta in seconds.
+    offset is added to out_time, for commands producing one piece of a
+    longer output. stderr is drained on a separate thread so a chatty
+    encoder can never stall on a full pipe. Raises subprocess.TimeoutExpired.
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # Only the tail of stderr is kept, it's what explains a failure
+    stderr_lines = deque(maxlen=400)
+    stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(proc.stderr), daemon=True)
+    stderr_thread.start()
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.daemon = True
+    timer.start()
+
+    started = time.time()
+    last_report = 0.0
+    out_time = 0.0
+    block = {}
+    try:
+        for raw in proc.stdout:
+            key, _, value = raw.decode("utf-8", "replace").strip().partition("=")
+            if key != "progress":
+                block[key] = value
+                continue
+            # One block of key=value lines ends with progress=continue|end.
+            # out_time can be N/A or negative around flushes, keep the last good one.
+            out_time = max(out_time, _to_float(block.get("out_time_us"), 0.0) / 1e6)
+            now = time.time()
+            if on_progress and (value == "end" or now - last_report >= REPORT_INTERVAL):
+                last_report = now
+                try:
+                    on_progress(_progress_info(block, out_time + offset, duration, offset, now - started, value == "end"))
+                except Exception as e:
+                    print(f"Progress callback failed: {e}")
+            block = {}
+        proc.wait()
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        stderr_thread.join(timeout=5)
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return subprocess.CompletedProcess(cmd, proc.returncode, b"", b"".join(stderr_lines))
+
+
+def _progress_info(block, out_time, duration, offset, elapsed, finished):
+    fps = _to_float(block.get("fps"))
+    speed = _to_float(block.get("speed", "").rstrip("x"))
+    if not speed and elapsed > 0:
+        speed = (out_time - offset) / elapsed
+
+    info = {
+        "out_time": round(out_time, 2),
+        "fps": round(fps, 1) if fps is not None else None,
+        "speed": round(speed, 2) if speed else None,
+    }
+    if duration:
+        info["percent"] = 100.0 if finished else round(min(99.9, 100.0 * out_time / duration), 1)
+        remaining = max(0.0, duration - out_time)
+        info["eta"] = 0.0 if finished else (round(remaining / speed, 1) if speed else None)
+    return info
+
+
+def _to_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
@@ -1,5 +1,30 @@
+import ast
+import math
+import operator
 from clipcut.filter_library import FILTER_LIBRARY
 
+# Positional option names of the filters in our chains, for VideoFilters.parse
+POSITIONAL_OPTIONS = {
+    "eq": ["contrast", "brightness", "saturation", "gamma"],
+    "vignette": ["angle", "x0", "y0"],
+    "unsharp": ["lx", "ly", "la", "cx", "cy", "ca"],
+    "colorchannelmixer": ["rr", "rg", "rb", "ra", "gr", "gg", "gb", "ga", "br", "bg", "bb", "ba"],
+    "boxblur": ["luma_radius", "luma_power"],
+    "scale": ["w", "h"],
+}
+
+# What option expressions may use: ffmpeg's arithmetic ('^' is its power
+# operator) and the functions that show up in our chains. Anything else is
+# rejected, the values come from user input.
+_BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.Mod: operator.mod, ast.BitXor: operator.pow,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_FUNCTIONS = {"trunc": math.trunc, "floor": math.floor, "ceil": math.ceil, "abs": abs, "min": min, "max": max}
+_CONSTANTS = {"PI": math.pi, "E": math.e}
+_MAX_EXPR_LENGTH = 100
+
 class VideoFilters:
     @staticmethod
     def get_filter_chain(filters):
@@ -117,8 +142,8 @@ class VideoFilters:
             chain.append("noise=alls=20:allf=t+u")
         elif effect == "pixelate":
             # Scale down then up
-            chain.append("scale=iw/10:ih/10:flags=nearest")
-            chain.append("scale=iw*10:ih*10:flags=nearest")
+            chain.append("scale=iw/10:ih/10:flags=neighbor")
+            chain.append("scale=iw*10:ih*10:flags=neighbor")
         elif effect == "noise":
             chain.append("noise=alls=40:allf=t+u")
         elif effect == "blur":
@@ -135,6 +160,77 @@ class VideoFilters:
              
         return chain
 
+    @staticmethod
+    def parse(entry):
+        """Splits a filter string like "eq=1.2:brightness=0.1" into (name, {option: value})."""
+        name, _, args = entry.partition("=")
+        opts = {}
+        positional = POSITIONAL_OPTIONS.get(name, [])
+        # Quoted values (curves points) may contain ':'
+        parts, current, quoted = [], "", False
+        for ch in args:
+            if ch == "'":
+                quoted = not quoted
+            elif ch == ":" and not quoted:
+                parts.append(current)
+                current = ""
+            else:
+                current += ch
+        if current:
+            parts.append(current)
+        for k, part in enumerate(parts):
+            if "=" in part:
+                key, value = part.split("=", 1)
+                opts[key] = value
+            elif k < len(positional):
+                opts[positional[k]] = part
+        return name, opts
+
+    @staticmethod
+    def number(value, default=0.0):
+        """Numeric value of a parsed option, default when it is missing."""
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            # Simple expressions like PI/4
+            return VideoFilters.evaluate(value)
+
+    @staticmethod
+    def evaluate(expr, names=None):
+        """
+        Value of an arithmetic option like "PI/4" or "iw/10". Raises ValueError
+        for anything but numbers, PI, E, the given names and the operators and
+        functions in the tables at the top of this module.
+        """
+        if len(expr) > _MAX_EXPR_LENGTH:
+            raise ValueError(f"Expression too long: {expr[:20]}...")
+        variables = dict(_CONSTANTS, **(names or {}))
+
+        def value(node):
+            if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+                # Floats, so '^' can't build huge integers
+                return float(node.value)
+            if isinstance(node, ast.Name) and node.id in variables:
+                return float(variables[node.id])
+            if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+                return _BINARY_OPS[type(node.op)](value(node.left), value(node.right))
+            if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+                return _UNARY_OPS[type(node.op)](value(node.operand))
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS
+                    and node.args and not node.keywords):
+                return float(_FUNCTIONS[node.func.id](*[value(a) for a in node.args]))
+            raise ValueError(f"Unsupported expression: {expr}")
+
+        try:
+            result = value(ast.parse(expr.strip(), mode="eval").body)
+        except (SyntaxError, ArithmeticError, TypeError) as e:
+            raise ValueError(f"Invalid expression {expr}: {e}")
+        if isinstance(result, complex) or not math.isfinite(result):
+            raise ValueError(f"Invalid expression: {expr}")
+        return result
+
     @staticmethod
     def apply_filters_to_image(image_path, filters, output_path):
         """
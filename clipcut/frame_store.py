@@ -0,0 +1,139 @@
+import json
+import math
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Default sample size; shot changes are obvious even on thumbnails
+FRAME_WIDTH = 128
+FRAME_HEIGHT = 72
+# Seconds of video decoded per worker task
+CHUNK_SECONDS = 120.0
+
+
+def _decode_chunk(src_path, frames_path, first, count, sample_fps, width, height):
+    """
+    Worker: decodes count samples starting at sample index first and writes
+    them straight into the shared frames file. Returns how many were written
+    (fewer than count only at the end of the video).
+    """
+    frames = np.load(frames_path, mmap_mode="r+")
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-threads", "2", "-skip_loop_filter", "all",
+        "-ss", str(first / sample_fps), "-i", src_path,
+        "-an", "-sn",
+        "-vf", f"fps={sample_fps},scale={width}:{height}:flags=fast_bilinear",
+        "-frames:v", str(count),
+        "-pix_fmt", "rgb24", "-f", "rawvideo", "-"
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    # ffmpeg writes into the mapped pages directly, nothing is copied
+    target = memoryview(frames[first:first + count]).cast("B")
+    filled = 0
+    try:
+        while filled < len(target):
+            n = proc.stdout.readinto(target[filled:])
+            if not n:
+                break
+            filled += n
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    frames.flush()
+    return filled // (width * height * 3)
+
+
+class FrameStore:
+    """
+    Sampled, downscaled RGB frames of a video, decoded once per job into a
+    memory-mapped frames.npy (frames x H x W x 3, uint8) with a times.npy
+    index, so analysis stages share one decode. Views are read-only and
+    backed by the page cache. Pickling a store only sends its directory, so
+    worker processes reopen the same files instead of receiving frames.
+    """
+
+    def __init__(self, path, frames, times, meta):
+        self.path = path
+        self._frames = frames
+        self.times = times
+        self.fps = meta["fps"]
+        self.width = meta["width"]
+        self.height = meta["height"]
+
+    def __reduce__(self):
+        return (FrameStore.open, (self.path,))
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def frames(self):
+        """Read-only view of all frames."""
+        return self._frames[:len(self.times)]
+
+    def window(self, start, end):
+        """Read-only view of the frames sampled in [start, end)."""
+        lo, hi = np.searchsorted(self.times, [start, end], side="left")
+        return self._frames[lo:hi]
+
+    def nearest(self, t):
+        """The frame sampled closest to t."""
+        k = int(np.clip(np.searchsorted(self.times, t), 1, len(self.times) - 1))
+        if t - self.times[k - 1] < self.times[k] - t:
+            k -= 1
+        return self._frames[k]
+
+    @classmethod
+    def open(cls, path):
+        """The store in path, or None if it doesn't exist or was never finished."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        frames = np.load(os.path.join(path, "frames.npy"), mmap_mode="r")
+        times = np.load(os.path.join(path, "times.npy"))
+        return cls(path, frames, times, meta)
+
+    @classmethod
+    def build(cls, src_path, path, sample_fps, duration, width=FRAME_WIDTH, height=FRAME_HEIGHT, workers=1, chunk_seconds=CHUNK_SECONDS):
+        """Decodes src_path at sample_fps into path and returns the store."""
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        # Chunks hold a whole number of samples so every chunk knows its
+        # slot range up front and the workers fill the file in place
+        per_chunk = max(1, int(round(chunk_seconds * sample_fps)))
+        capacity = int(math.ceil(duration * sample_fps)) + 1
+        frames_path = os.path.join(path, "frames.npy")
+        frames = np.lib.format.open_memmap(frames_path, mode="w+", dtype=np.uint8, shape=(capacity, height, width, 3))
+        del frames
+
+        tasks = [(src_path, frames_path, first, min(per_chunk, capacity - first), sample_fps, width, height)
+                 for first in range(0, capacity, per_chunk)]
+        if len(tasks) == 1 or workers <= 1:
+            counts = [_decode_chunk(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                counts = list(pool.map(_decode_chunk, *zip(*tasks)))
+
+        # Everything up to the first short chunk is contiguous
+        count = 0
+        for task, n in zip(tasks, counts):
+            count += n
+            if n < task[3]:
+                break
+        times = np.arange(count) / sample_fps
+        np.save(os.path.join(path, "times.npy"), times)
+
+        meta = {"src": src_path, "fps": sample_fps, "width": width, "height": height, "count": count}
+        # Written last: a store without meta.json is incomplete
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+        return cls.open(path)
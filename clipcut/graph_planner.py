@@ -0,0 +1,132 @@
+import math
+from clipcut.filters import VideoFilters
+
+# Platforms that are cropped to a narrower aspect, centered horizontally
+CROP_ASPECTS = {
+    "shorts": 9 / 16,
+    "reels_instagram": 9 / 16,
+    "reels_facebook": 9 / 16,
+    "tiktok": 9 / 16,
+    "square": 1.0,
+}
+CROPS = {
+    9 / 16: "crop=ih*(9/16):ih:(iw-ow)/2:0",
+    1.0: "crop=ih:ih:(iw-ow)/2:0",
+}
+
+# Filters that only look at the pixel itself, so they give the same result
+# before or after a crop and (up to interpolation) before or after a scale
+PER_PIXEL = {"eq", "colorbalance", "curves", "hue", "colorchannelmixer", "negate", "lut3d", "format", "noise", "hflip"}
+# Filters with sizes in pixels or that depend on the frame geometry; they
+# can move too, with their options rewritten for the smaller frame
+REWRITTEN = {"vignette", "unsharp", "boxblur", "chromashift"}
+
+
+class FilterGraphPlanner:
+    """
+    Orders a job's shared video chain so the geometric work comes first:
+    the platform crop and a downscale to the preset resolution run before
+    the per-pixel filters, instead of grading the full (often 4K, 16:9)
+    frame and then throwing most of it away. Geometry goes right after the
+    last filter that can't be moved (relative scales of effects, anything
+    unknown), so the output looks the same as grading first.
+    """
+
+    def __init__(self, presets):
+        self.presets = presets
+
+    def classify(self, entry):
+        """'per_pixel', 'rewritten' (movable with adjusted options) or 'fixed'."""
+        name = entry.partition("=")[0]
+        if name in PER_PIXEL:
+            return "per_pixel"
+        if name in REWRITTEN:
+            return "rewritten"
+        return "fixed"
+
+    def geometry(self, platform, source_size):
+        """
+        (crop and scale filters, crop factor, scale factor) for a source of
+        source_size. The factors are 1.0 for a missing crop or scale.
+        """
+        aspect = CROP_ASPECTS.get(platform)
+        filters = [CROPS[aspect]] if aspect else []
+        if not source_size:
+            return filters, 1.0, 1.0
+        src_w, src_h = source_size
+        crop_w, crop_h = src_w, src_h
+        if aspect:
+            crop_w = min(src_w, int(src_h * aspect) // 2 * 2)
+        crop = math.hypot(crop_w, crop_h) / math.hypot(src_w, src_h)
+
+        # Fit inside the preset size in either orientation; never upscale
+        preset = self.presets.get(platform)
+        long_side, short_side = max(preset["width"], preset["height"]), min(preset["width"], preset["height"])
+        scale = min(1.0, long_side / max(crop_w, crop_h), short_side / min(crop_w, crop_h))
+        if scale < 1.0:
+            # Relative to the actual frame, so the aspect is kept even if
+            # source_size is off (e.g. rotation metadata)
+            filters.append(f"scale=trunc(iw*{scale:.6f}/2)*2:trunc(ih*{scale:.6f}/2)*2")
+        return filters, crop, scale
+
+    def plan(self, chain, platform, source_size=None):
+        """The shared chain with crop and downscale placed as early as possible."""
+        geometry, crop, scale = self.geometry(platform, source_size)
+        if not chain:
+            # Same output size with or without filters; the editor only
+            # stream-copies when there is no geometry either
+            return geometry
+        if not source_size:
+            # Without the frame size the rewrites can't be computed
+            return chain + geometry
+
+        # Filters up to the last fixed one keep running on the full frame
+        split = 0
+        for k, entry in enumerate(chain):
+            if self.classify(entry) == "fixed":
+                split = k + 1
+        planned = list(chain[:split]) + geometry
+        for entry in chain[split:]:
+            entry = self._rewrite(entry, crop, scale)
+            if entry is None:
+                # Couldn't be adapted, keep today's order
+                return chain + geometry
+            planned.append(entry)
+        return planned
+
+    def _rewrite(self, entry, crop, scale):
+        name, opts = VideoFilters.parse(entry)
+        if name not in REWRITTEN:
+            return entry
+        try:
+            if name == "vignette":
+                # The falloff is relative to the half diagonal of the frame,
+                # which the crop shortens; scaling cancels out
+                if set(opts) - {"angle", "a"}:
+                    return None
+                angle = VideoFilters.number(opts.get("angle", opts.get("a")), math.pi / 5)
+                return f"vignette={angle * crop:.6f}"
+            if scale == 1.0:
+                return entry
+            if name == "unsharp":
+                if set(opts) - {"lx", "ly", "la", "cx", "cy", "ca"}:
+                    return None
+                sizes = [_odd(VideoFilters.number(opts.get(k), 5) * scale) for k in ("lx", "ly", "cx", "cy")]
+                return "unsharp={}:{}:{}:{}:{}:{}".format(
+                    sizes[0], sizes[1], opts.get("la", "1.0"), sizes[2], sizes[3], opts.get("ca", "0.0"))
+            if name == "boxblur":
+                if set(opts) - {"luma_radius", "luma_power"}:
+                    return None
+                radius = max(1, int(round(VideoFilters.number(opts.get("luma_radius"), 2) * scale)))
+                return f"boxblur={radius}:{opts.get('luma_power', '2')}"
+            if name == "chromashift":
+                return "chromashift=" + ":".join(
+                    f"{k}={int(round(VideoFilters.number(v) * scale))}" for k, v in opts.items())
+        except (ValueError, TypeError):
+            return None
+        return None
+
+
+def _odd(size):
+    # unsharp matrix sizes are odd, 3 to 23
+    return int(min(23, max(3, 2 * round((size - 1) / 2) + 1)))
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from clipcut.filters import VideoFilters
+from clipcut.preview import PreviewRenderer, _RGB_FILTERS
+
+# Lattice points per axis. 52 puts every point on an exact 8-bit level
+# (multiples of 5), so the lattice is evaluated without input rounding.
+LUT_SIZE = 52
+# Bump when the filter emulation changes so stale LUTs aren't reused
+LUT_VERSION = 1
+# Filters that map each pixel's color on its own, independent of position
+# and neighbours; consecutive runs of them collapse into one 3D LUT
+COLOR_FILTERS = {"eq", "colorbalance", "curves", "hue", "colorchannelmixer", "negate"}
+# Shorter spans are left alone: a lone filter is cheaper than lut3d
+MIN_RUN = 2
+# Slider values of preview requests are snapped to this step (the finest
+# slider in the UI), so near-identical grades share one LUT file
+SLIDER_STEP = 0.05
+# .cube entries for every 8-bit level; the lattice outputs are 8-bit
+_LEVELS = [f"{v / 255.0:.6f}" for v in range(256)]
+
+
+class LutCompiler:
+    """
+    Compiles the color grading part of a VideoFilters chain (preset plus
+    sliders) into .cube 3D LUTs, so ffmpeg does one lookup per pixel instead
+    of a pass per filter. The lattice is evaluated with PreviewRenderer, so
+    it follows the same filter math as the previews. LUT files are cached
+    by a hash of the filters they replace, and the directory is kept under
+    max_bytes by evicting the least recently used ones (mtime is bumped on
+    every hit).
+    """
+
+    def __init__(self, cache_dir, size=LUT_SIZE, min_run=MIN_RUN, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.min_run = min_run
+        # A 52-point LUT is about 3.8 MB
+        self.max_bytes = max_bytes or int(os.environ.get("CLIPCUT_LUT_CACHE_MB", "256")) * 1024 * 1024
+        self.renderer = PreviewRenderer()
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def compile_chain(self, chain):
+        """Returns chain with the RGB part of every run of color filters replaced by a lut3d filter."""
+        out, run = [], []
+        for entry in chain + [None]:
+            if entry is not None and entry.partition("=")[0] in COLOR_FILTERS:
+                run.append(entry)
+                continue
+            out.extend(self._compile_run(run))
+            run = []
+            if entry is not None:
+                out.append(entry)
+        return out
+
+    def _compile_run(self, run):
+        # Only the span from the first to the last RGB filter goes into the
+        # LUT. The YUV filters (eq, hue) around it stay as they are: they are
+        # exact and cheap on the source's YUV, while inside the LUT they'd
+        # see colors already clipped to RGB and full resolution chroma.
+        rgb = [k for k, entry in enumerate(run) if entry.partition("=")[0] in _RGB_FILTERS]
+        if not rgb or rgb[-1] - rgb[0] + 1 < self.min_run:
+            return run
+        first, last = rgb[0], rgb[-1] + 1
+        return run[:first] + [self.lut3d_filter(self.compile(run[first:last]))] + run[last:]
+
+    def compile_filters(self, filters):
+        """LUT of all color filters of a filter dict, or None if it has none (used for previews)."""
+        filters = {k: _snap(v) for k, v in filters.items()}
+        run = [e for e in VideoFilters.get_filter_chain(filters) if e.partition("=")[0] in COLOR_FILTERS]
+        return self.compile(run) if run else None
+
+    def compile(self, run):
+        """Path of the .cube LUT for a list of color filter strings, built on first use."""
+        key = hashlib.sha1(json.dumps([LUT_VERSION, self.size, run]).encode("utf-8")).hexdigest()
+        path = os.path.join(self.cache_dir, f"{key}.cube")
+        try:
+            os.utime(path, None)
+            return path
+        except OSError:
+            pass
+
+        table = self._evaluate(run)
+        # Written under a temporary name and renamed, so concurrent renders
+        # never read a half-written file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(f"# clipcut: {' , '.join(run)}\n")
+            f.write(f"LUT_3D_SIZE {self.size}\n")
+            f.write("\n".join(f"{_LEVELS[r]} {_LEVELS[g]} {_LEVELS[b]}" for r, g, b in table.tolist()))
+            f.write("\n")
+        os.replace(tmp_path, path)
+        print(f"Compiled {len(run)} color filters into {path}")
+        self._evict()
+        return path
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".cube"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    @staticmethod
+    def lut3d_filter(path):
+        escaped = path.replace("\\", "/").replace(":", "\\:")
+        return f"lut3d=file='{escaped}':interp=tetrahedral"
+
+    def _evaluate(self, run):
+        # Every lattice color as one image, red varying fastest as .cube
+        # expects; the filters are per-pixel so the layout doesn't matter
+        levels = np.round(np.linspace(0, 255, self.size)).astype(np.uint8)
+        b, g, r = np.meshgrid(levels, levels, levels, indexing="ij")
+        bgr = np.stack([b.ravel(), g.ravel(), r.ravel()], axis=1).reshape(-1, self.size, 3)
+        out = self.renderer.apply_chain(bgr, run).reshape(-1, 3)
+        # 8-bit RGB rows
+        return out[:, ::-1]
+
+
+def _snap(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    return round(round(value / SLIDER_STEP) * SLIDER_STEP, 2)
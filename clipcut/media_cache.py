@@ -0,0 +1,181 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no cross-process locking or reflinks, threads are still deduplicated
+    fcntl = None
+
+# ioctl number for FICLONE (reflink a whole file) on Linux
+FICLONE = 0x40049409
+
+
+class MediaCache:
+    """
+    Shared cache of downloaded source media.
+    Entries are keyed by the caller (video id + resolved format) and handed
+    to jobs as hardlinks (or reflinks, or copies as a last resort), so a
+    popular URL is only downloaded once. Concurrent requests for the same key
+    wait for the in-flight download instead of starting another one. Entries
+    expire after ttl seconds and the least recently used ones are evicted once
+    the cache grows past max_bytes.
+    """
+
+    def __init__(self, base_dir, max_bytes=None, ttl=None):
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes or int(os.environ.get("CLIPCUT_MEDIA_CACHE_MB", "20480")) * 1024 * 1024
+        self.ttl = ttl or int(os.environ.get("CLIPCUT_MEDIA_CACHE_TTL", str(24 * 3600)))
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def get_or_fetch(self, key, fetch, dest_dir):
+        """
+        Returns the path of the cached file linked into dest_dir.
+        fetch(target_dir) must download into target_dir and return the file path.
+        """
+        key = self._safe_key(key)
+        while True:
+            with self._lock:
+                cached = self._lookup(key)
+                if cached:
+                    return self._link(cached, dest_dir)
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = threading.Event()
+                    self._inflight[key] = event
+
+            if not leader:
+                event.wait()
+                continue
+
+            try:
+                path = self._fetch_locked(key, fetch)
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                event.set()
+            dst = self._link(path, dest_dir)
+            self._evict()
+            return dst
+
+    def _fetch_locked(self, key, fetch):
+        # Other worker processes may be fetching the same key, serialize on a lock file
+        lock_path = os.path.join(self.base_dir, f"{key}.lock")
+        lock_file = self._acquire(lock_path)
+        try:
+            cached = self._lookup(key)
+            if cached:
+                return cached
+
+            entry_dir = os.path.join(self.base_dir, key)
+            tmp_dir = os.path.join(self.base_dir, f".tmp-{key}-{uuid.uuid4().hex[:8]}")
+            os.makedirs(tmp_dir)
+            try:
+                fetched = fetch(tmp_dir)
+                if not fetched or not os.path.exists(fetched):
+                    raise Exception("Download did not produce a file")
+                # Marker whose mtime is the fetch time, used for the TTL
+                open(os.path.join(tmp_dir, ".fetched"), "w").close()
+                if os.path.exists(entry_dir):
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                os.rename(tmp_dir, entry_dir)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            return os.path.join(entry_dir, os.path.basename(fetched))
+        finally:
+            # Removed while still held; waiters see it's gone and lock a fresh one
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _acquire(self, lock_path):
+        """Opens and locks lock_path, retrying if the holder removed it meanwhile."""
+        while True:
+            lock_file = open(lock_path, "a")
+            if not fcntl:
+                return lock_file
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    return lock_file
+            except OSError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _lookup(self, key):
+        entry_dir = os.path.join(self.base_dir, key)
+        if not os.path.isdir(entry_dir):
+            return None
+        files = [f for f in os.listdir(entry_dir) if not f.startswith(".")]
+        if not files:
+            return None
+        path = os.path.join(entry_dir, files[0])
+        if self._expired(entry_dir):
+            # Expired: the next fetch replaces it
+            return None
+        # Directory mtime tracks last use for LRU eviction
+        os.utime(entry_dir, None)
+        return path
+
+    def _link(self, src, dest_dir):
+        dst = os.path.join(dest_dir, os.path.basename(src))
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+            return dst
+        except OSError:
+            pass
+        if fcntl:
+            try:
+                with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return dst
+            except OSError:
+                pass
+        shutil.copyfile(src, dst)
+        return dst
+
+    def _expired(self, entry_dir):
+        try:
+            fetched_at = os.path.getmtime(os.path.join(entry_dir, ".fetched"))
+        except OSError:
+            return True
+        return time.time() - fetched_at > self.ttl
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.base_dir):
+                entry_dir = os.path.join(self.base_dir, name)
+                if name.startswith(".") or not os.path.isdir(entry_dir) or name in self._inflight:
+                    continue
+                if self._expired(entry_dir):
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+                entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+                total += size
+
+            for mtime, size, entry_dir in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                # Jobs keep their own hardlinks, so removing the entry is safe
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+
+    def _safe_key(self, key):
+        return "".join(c if c.isalnum() or c in "-_+" else "_" for c in key)
@@ -4,6 +4,9 @@ class PlatformPresets:
             "shorts": {"width": 1080, "height": 1920, "aspect": 9/16},
             "reels_instagram": {"width": 1080, "height": 1920, "aspect": 9/16},
             "reels_facebook": {"width": 1080, "height": 1920, "aspect": 9/16},
+            "tiktok": {"width": 1080, "height": 1920, "aspect": 9/16},
+            "square": {"width": 1080, "height": 1080, "aspect": 1.0},
+            "landscape": {"width": 1920, "height": 1080, "aspect": 16/9},
         }
 
     def get(self, platform):
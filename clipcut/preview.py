@@ -0,0 +1,299 @@
+import math
+import cv2
+import numpy as np
+from clipcut.filters import POSITIONAL_OPTIONS, VideoFilters
+
+# BT.601 RGB -> YCbCr in limited (TV) range, which is what ffmpeg converts
+# RGB frames to when a filter only accepts YUV
+_RGB2YUV = np.array([
+    [0.299, 0.587, 0.114],
+    [-0.168736, -0.331264, 0.5],
+    [0.5, -0.418688, -0.081312],
+], dtype=np.float32) * np.array([[219.0 / 255.0], [224.0 / 255.0], [224.0 / 255.0]], dtype=np.float32)
+_YUV2RGB = np.linalg.inv(_RGB2YUV).astype(np.float32)
+_YUV_OFFSET = np.array([16.0, 128.0, 128.0], dtype=np.float32)
+# Same conversions as 3x4 affine matrices for cv2.transform, which is several
+# times faster than a NumPy matmul on an HxWx3 array
+_RGB2YUV_AFFINE = np.hstack([_RGB2YUV, _YUV_OFFSET[:, None]])
+_YUV2RGB_AFFINE = np.hstack([_YUV2RGB, (-_YUV2RGB @ _YUV_OFFSET)[:, None]])
+_CHROMA_CENTER = np.array([0.0, 127.0, 127.0], dtype=np.float32)
+
+# Filters ffmpeg can only run on YUV or only on RGB frames. The others take
+# whatever the previous filter produced, so a run of filters stays in one
+# color space and is only converted (and rounded) where ffmpeg would insert
+# a scaler.
+_YUV_FILTERS = {"eq", "unsharp", "hue", "chromashift"}
+_RGB_FILTERS = {"colorbalance", "curves", "colorchannelmixer"}
+
+
+class PreviewRenderer:
+    """
+    Renders still previews in-process with NumPy/OpenCV instead of an ffmpeg
+    process per request. It runs the exact chain VideoFilters.get_filter_chain
+    produces, re-implementing each filter with ffmpeg's math (integer eq
+    tables, colorbalance, natural-spline curves, cos^4 vignette, binomial
+    unsharp, ...) on 8-bit frames in the color space ffmpeg would pick, so
+    the preview matches the render to within a few code values.
+    Randomized filters (noise) can only match statistically.
+    """
+
+    def __init__(self):
+        # Vignette masks only depend on frame size and angle; slider
+        # previews of the same video hit the cache every time
+        self._vignette_masks = {}
+        self._ops = {
+            "eq": self._eq,
+            "colorbalance": self._colorbalance,
+            "curves": self._curves,
+            "vignette": self._vignette,
+            "unsharp": self._unsharp,
+            "hue": self._hue,
+            "colorchannelmixer": self._colorchannelmixer,
+            "chromashift": self._chromashift,
+            "noise": self._noise,
+            "scale": self._scale,
+            "boxblur": self._boxblur,
+            "negate": lambda img, opts, yuv: cv2.bitwise_not(img),
+            "edgedetect": self._edgedetect,
+            "hflip": lambda img, opts, yuv: img[:, ::-1],
+        }
+
+    def render_bytes(self, data, filters, quality=90):
+        """Decodes an encoded image, applies the filters and returns JPEG bytes."""
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+        ok, encoded = cv2.imencode(".jpg", self.render(image, filters), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("Could not encode preview")
+        return encoded.tobytes()
+
+    def render(self, image, filters):
+        """BGR uint8 image in, BGR uint8 image out."""
+        return self.apply_chain(image, VideoFilters.get_filter_chain(filters))
+
+    def apply_chain(self, image, chain):
+        # Filters get 8-bit frames and may compute in float; the result is
+        # rounded back to 8 bits like between ffmpeg filters, since
+        # threshold-based ones (colorbalance ranges, curves) are sensitive to it
+        img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        yuv = False
+        for entry in chain:
+            name, opts = VideoFilters.parse(entry)
+            op = self._ops.get(name)
+            if op is None:
+                print(f"Preview: filter '{name}' not supported, skipped")
+                continue
+            if name in _YUV_FILTERS and not yuv:
+                img, yuv = self._convert(img, _RGB2YUV_AFFINE), True
+            elif name in _RGB_FILTERS and yuv:
+                img, yuv = self._convert(img, _YUV2RGB_AFFINE), False
+            img = op(img, opts, yuv)
+            if img.dtype != np.uint8:
+                img = self._to_8bit(img)
+        if yuv:
+            img = self._convert(img, _YUV2RGB_AFFINE)
+        return cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGB2BGR)
+
+    def _clip(self, img):
+        # In place, cheaper than np.clip on large frames
+        np.maximum(img, 0.0, out=img)
+        return np.minimum(img, 255.0, out=img)
+
+    def _to_8bit(self, img):
+        # Rounds and saturates in one pass; the max keeps negative values
+        # from being mirrored by the abs
+        return cv2.convertScaleAbs(cv2.max(img, 0.0))
+
+    def _convert(self, img, matrix):
+        # In float: cv2.transform's 8-bit path rounds noticeably worse than
+        # swscale
+        return self._to_8bit(cv2.transform(img.astype(np.float32), matrix))
+
+    def _eq(self, yuv, opts, _):
+        contrast = VideoFilters.number(opts.get("contrast"), 1.0)
+        brightness = VideoFilters.number(opts.get("brightness"), 0.0)
+        saturation = VideoFilters.number(opts.get("saturation"), 1.0)
+        gamma = VideoFilters.number(opts.get("gamma"), 1.0)
+        # vf_eq works on 8-bit planes through per-plane integer maps, so
+        # build the same maps as 256-entry tables and apply them in one LUT
+        lut = np.empty((256, 1, 3), dtype=np.uint8)
+        lut[:, 0, 0] = self._eq_lut(contrast, brightness, gamma)
+        lut[:, 0, 1] = lut[:, 0, 2] = self._eq_lut(saturation, 0.0, 1.0)
+        return cv2.LUT(yuv, lut)
+
+    def _eq_lut(self, contrast, brightness, gamma):
+        # The filter stores its parameters as floats (av_clipf), which
+        # matters for the integer truncation below
+        contrast, brightness, gamma = (float(np.float32(x)) for x in (contrast, brightness, gamma))
+        levels = np.arange(256, dtype=np.int64)
+        if contrast == 1.0 and brightness == 0.0 and gamma == 1.0:
+            # The filter leaves the plane untouched
+            return levels
+        if gamma == 1.0 and abs(contrast) < 7.9:
+            c = int(contrast * 256 * 16)
+            b = int((int(100.0 * brightness + 100.0) * 511) / 200) - 128 - int(c / 32)
+            return np.clip(((levels * c) >> 12) + b, 0, 255)
+        v = contrast * (levels / 255.0 - 0.5) + 0.5 + brightness
+        v = np.where(v <= 0, 0.0, np.power(np.maximum(v, 0.0), 1.0 / gamma))
+        return np.where(v >= 1.0, 255, (256.0 * v).astype(np.int64))
+
+    def _colorbalance(self, img, opts, _):
+        # The shift of every channel only depends on the pixel's lightness
+        # (max + min of its channels, 511 possible values), so it is
+        # tabulated once and gathered per pixel
+        lightness = np.arange(511, dtype=np.float32)[:, None] / 255.0
+        a, b, scale = 4.0, 0.333, 0.7
+        w_s = np.clip((b - lightness) * a + 0.5, 0, 1) * scale
+        w_m = np.clip((lightness - b) * a + 0.5, 0, 1) * np.clip((1.0 - lightness - b) * a + 0.5, 0, 1) * scale
+        w_h = np.clip((lightness + b - 1) * a + 0.5, 0, 1) * scale
+        shift = lambda c: np.array([VideoFilters.number(opts.get(p + c)) for p in "rgb"], dtype=np.float32)
+        delta = (w_s * shift("s") + w_m * shift("m") + w_h * shift("h")) * 255.0
+        r, g, b = cv2.split(img)
+        index = cv2.add(cv2.max(cv2.max(r, g), b), cv2.min(cv2.min(r, g), b), dtype=cv2.CV_16U)
+        return cv2.add(img, np.take(delta, index, axis=0), dtype=cv2.CV_32F)
+
+    def _curves(self, img, opts, _):
+        master = opts.get("master") or opts.get("m")
+        if not master:
+            return img
+        points = sorted(tuple(float(x) for x in p.split("/")) for p in master.split())
+        return cv2.LUT(img, self._natural_spline_lut(points))
+
+    def _natural_spline_lut(self, points):
+        xs = np.array([p[0] for p in points], dtype=np.float64)
+        ys = np.array([p[1] for p in points], dtype=np.float64)
+        n = len(xs)
+        x = np.arange(256) / 255.0
+        if n < 2:
+            return np.arange(256, dtype=np.uint8)
+        # Second derivatives with zero curvature at both ends
+        h = np.diff(xs)
+        m = np.zeros(n)
+        if n > 2:
+            A = np.zeros((n - 2, n - 2))
+            r = np.zeros(n - 2)
+            for i in range(1, n - 1):
+                A[i - 1, i - 1] = 2 * (h[i - 1] + h[i])
+                if i > 1:
+                    A[i - 1, i - 2] = h[i - 1]
+                if i < n - 2:
+                    A[i - 1, i] = h[i]
+                r[i - 1] = 6 * ((ys[i + 1] - ys[i]) / h[i] - (ys[i] - ys[i - 1]) / h[i - 1])
+            m[1:-1] = np.linalg.solve(A, r)
+        k = np.clip(np.searchsorted(xs, x, side="right") - 1, 0, n - 2)
+        t0 = x - xs[k]
+        t1 = xs[k + 1] - x
+        hk = h[k]
+        y = (m[k] * t1 ** 3 + m[k + 1] * t0 ** 3) / (6 * hk) \
+            + (ys[k] / hk - m[k] * hk / 6) * t1 + (ys[k + 1] / hk - m[k + 1] * hk / 6) * t0
+        # Outside the first/last point the curve is flat
+        y = np.where(x < xs[0], ys[0], np.where(x > xs[-1], ys[-1], y))
+        return np.round(np.clip(y, 0, 1) * 255.0).astype(np.uint8)
+
+    def _vignette(self, img, opts, yuv):
+        angle = VideoFilters.number(opts.get("angle", opts.get("a")), math.pi / 5)
+        h, w = img.shape[:2]
+        key = (h, w, angle)
+        if key not in self._vignette_masks:
+            if len(self._vignette_masks) >= 8:
+                self._vignette_masks.clear()
+            mask = self._vignette_mask(h, w, angle)
+            # On YUV frames luma is scaled and chroma pulled towards neutral:
+            # (c - 127) * f + 127 = c * f + 127 * (1 - f)
+            self._vignette_masks[key] = (mask, (1.0 - mask) * _CHROMA_CENTER)
+        mask, chroma_offset = self._vignette_masks[key]
+        if not yuv:
+            return cv2.multiply(img, mask, dtype=cv2.CV_8U)
+        return cv2.add(cv2.multiply(img, mask, dtype=cv2.CV_32F), chroma_offset, dtype=cv2.CV_8U)
+
+    def _vignette_mask(self, h, w, angle):
+        x0, y0 = w / 2.0, h / 2.0
+        dmax = math.hypot(x0, y0)
+        xs = np.trunc(np.arange(w) - x0)
+        ys = np.trunc(np.arange(h) - y0)
+        dnorm = np.hypot(xs[None, :], ys[:, None]) / dmax
+        c = np.cos(angle * np.minimum(dnorm, 1.0))
+        factor = np.where(dnorm > 1, 0.0, (c * c) * (c * c)).astype(np.float32)
+        return cv2.merge([factor, factor, factor])
+
+    def _unsharp(self, yuv, opts, _):
+        size_x = int(VideoFilters.number(opts.get("lx", opts.get("luma_msize_x")), 5))
+        size_y = int(VideoFilters.number(opts.get("ly", opts.get("luma_msize_y")), 5))
+        amount = VideoFilters.number(opts.get("la", opts.get("luma_amount")), 1.0)
+        if amount == 0:
+            return yuv
+        yuv = yuv.astype(np.float32)
+        y = yuv[..., 0]
+        # vf_unsharp sums repeated [1 2 1] passes, i.e. a binomial kernel
+        blur = cv2.sepFilter2D(y, -1, self._binomial(size_x), self._binomial(size_y), borderType=cv2.BORDER_REPLICATE)
+        yuv[..., 0] = self._clip(y + (y - blur) * amount)
+        return yuv
+
+    def _binomial(self, size):
+        kernel = np.array([math.comb(size - 1, k) for k in range(size)], dtype=np.float32)
+        return kernel / kernel.sum()
+
+    def _hue(self, yuv, opts, _):
+        saturation = VideoFilters.number(opts.get("s"), 1.0)
+        return cv2.transform(yuv, np.array([
+            [1, 0, 0, 0],
+            [0, saturation, 0, 128.0 * (1.0 - saturation)],
+            [0, 0, saturation, 128.0 * (1.0 - saturation)],
+        ], dtype=np.float32))
+
+    def _colorchannelmixer(self, img, opts, _):
+        names = POSITIONAL_OPTIONS["colorchannelmixer"]
+        defaults = {"rr": 1.0, "gg": 1.0, "bb": 1.0}
+        coef = {k: VideoFilters.number(opts.get(k), defaults.get(k, 0.0)) for k in names}
+        matrix = np.array([
+            [coef["rr"], coef["rg"], coef["rb"]],
+            [coef["gr"], coef["gg"], coef["gb"]],
+            [coef["br"], coef["bg"], coef["bb"]],
+        ], dtype=np.float32)
+        return cv2.transform(img, matrix)
+
+    def _chromashift(self, yuv, opts, _):
+        h, w = yuv.shape[:2]
+        for plane, prefix in ((1, "cb"), (2, "cr")):
+            dx = int(VideoFilters.number(opts.get(prefix + "h")))
+            dy = int(VideoFilters.number(opts.get(prefix + "v")))
+            # Edge pixels are repeated, like the filter's default mode
+            rows = np.clip(np.arange(h) - dy, 0, h - 1)
+            cols = np.clip(np.arange(w) - dx, 0, w - 1)
+            yuv[..., plane] = yuv[rows][:, cols][..., plane]
+        return yuv
+
+    def _noise(self, img, opts, _):
+        strength = VideoFilters.number(opts.get("alls"), 0.0)
+        if strength <= 0:
+            return img
+        # Independent noise per plane, as the filter does with alls
+        return img + np.random.default_rng().uniform(-strength, strength, img.shape).astype(np.float32)
+
+    def _scale(self, img, opts, _):
+        h, w = img.shape[:2]
+        names = {"iw": w, "ih": h}
+        new_w = max(1, int(VideoFilters.evaluate(opts.get("w", "iw"), names)))
+        new_h = max(1, int(VideoFilters.evaluate(opts.get("h", "ih"), names)))
+        interp = cv2.INTER_NEAREST_EXACT if opts.get("flags") == "neighbor" else cv2.INTER_LINEAR
+        return cv2.resize(img, (new_w, new_h), interpolation=interp)
+
+    def _boxblur(self, img, opts, _):
+        radius = int(VideoFilters.number(opts.get("luma_radius"), 2))
+        power = int(VideoFilters.number(opts.get("luma_power"), 2))
+        size = 2 * radius + 1
+        for _ in range(max(1, power)):
+            img = cv2.blur(img, (size, size), borderType=cv2.BORDER_REFLECT)
+        return img
+
+    def _edgedetect(self, img, opts, _):
+        low = VideoFilters.number(opts.get("low"), 20 / 255.0)
+        high = VideoFilters.number(opts.get("high"), 50 / 255.0)
+        planes = []
+        for plane in cv2.split(img):
+            # Canny on the 5x5 gaussian the filter uses, thresholds on the gradient scale
+            plane = cv2.GaussianBlur(plane, (5, 5), 1.4)
+            planes.append(cv2.Canny(plane, low * 255 * 4, high * 255 * 4))
+        return cv2.merge(planes)
+
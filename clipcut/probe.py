@@ -0,0 +1,61 @@
+import json
+import subprocess
+
+
+class MediaProbe:
+    @staticmethod
+    def duration(path):
+        cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", path]
+        try:
+            return float(subprocess.check_output(cmd).decode().strip())
+        except Exception:
+            return 0.0
+
+    @staticmethod
+    def video_stream(path):
+        """
+        Returns the first video stream's properties as a dict
+        (codec_name, profile, pix_fmt, width, height, ...) or None.
+        """
+        cmd = [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=codec_name,profile,pix_fmt,width,height,r_frame_rate,has_b_frames",
+            "-of", "json", path
+        ]
+        try:
+            data = json.loads(subprocess.check_output(cmd).decode())
+        except Exception:
+            return None
+        streams = data.get("streams") or []
+        return streams[0] if streams else None
+
+    @staticmethod
+    def keyframes(path, start, end):
+        """
+        Returns the sorted keyframe timestamps of the first video stream
+        between start and end. Only packet flags are read, nothing is decoded.
+        """
+        cmd = [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-read_intervals", f"{max(0, start - 1)}%{end + 1}",
+            "-show_entries", "packet=pts_time,dts_time,flags",
+            "-of", "csv=p=0", path
+        ]
+        try:
+            out = subprocess.check_output(cmd, timeout=120).decode()
+        except Exception:
+            return []
+
+        times = []
+        for line in out.splitlines():
+            parts = line.strip().split(",")
+            if len(parts) < 3 or "K" not in parts[2]:
+                continue
+            ts = parts[0] if parts[0] not in ("", "N/A") else parts[1]
+            try:
+                t = float(ts)
+            except ValueError:
+                continue
+            if start <= t <= end:
+                times.append(t)
+        return sorted(times)
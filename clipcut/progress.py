@@ -1,19 +1,212 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
 import time
 
-class ProgressTracker:
+# Jobs in these states no longer change and can be evicted after the TTL
+FINISHED_STATES = ("completed", "error")
+
+
+def _apply(job, key, value):
+    # Every change gets a per-job sequence number so streaming clients can ask
+    # for "everything after event N" and receive only the fields that changed
+    seq = job.get("_seq", 0) + 1
+    job[key] = value
+    job["updated_at"] = time.time()
+    job["_seq"] = seq
+    job.setdefault("_versions", {})[key] = seq
+
+
+class MemoryProgressBackend:
+    """Per-process job state. Only usable with a single server process."""
+
     def __init__(self):
         self._jobs = {}
+        self._lock = threading.Lock()
+
+    def init(self, job_id, state):
+        with self._lock:
+            self._jobs[job_id] = state
+
+    def update(self, job_id, key, value):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                _apply(job, key, value)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else {}
+
+    def evict(self, cutoff):
+        with self._lock:
+            for job_id in [k for k, j in self._jobs.items() if j.get("status") in FINISHED_STATES and j.get("updated_at", 0) < cutoff]:
+                del self._jobs[job_id]
+
+
+class SQLiteProgressBackend:
+    """
+    Job state in an SQLite database (WAL mode) so every server process sees
+    every job. Updates are applied to a local copy and written in batches
+    every flush_interval seconds; status changes to a finished state are
+    written immediately so pollers never miss the end of a job.
+    """
+
+    def __init__(self, path, flush_interval=0.25):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._local = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+            "status TEXT, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        threading.Thread(target=self._flusher, daemon=True).start()
+        atexit.register(self.flush)
+
+    def init(self, job_id, state):
+        with self._lock:
+            self._local[job_id] = state
+            self._dirty.add(job_id)
+        self.flush()
+
+    def update(self, job_id, key, value):
+        with self._lock:
+            job = self._local.get(job_id)
+            if job is None:
+                # Job created by another process, pick up its current state
+                job = self._read(job_id)
+                if not job:
+                    return
+                self._local[job_id] = job
+            _apply(job, key, value)
+            self._dirty.add(job_id)
+        if key == "status" and value in FINISHED_STATES:
+            self.flush()
+
+    def get(self, job_id):
+        with self._lock:
+            if job_id in self._dirty:
+                return dict(self._local[job_id])
+        return self._read(job_id)
+
+    def flush(self):
+        with self._lock:
+            rows = [
+                (job_id, json.dumps(self._local[job_id]), self._local[job_id].get("status"), self._local[job_id].get("updated_at", time.time()))
+                for job_id in self._dirty
+            ]
+            self._dirty.clear()
+            # Finished jobs are only read from the database from now on
+            for job_id, _, status, _ in rows:
+                if status in FINISHED_STATES:
+                    self._local.pop(job_id, None)
+        if not rows:
+            return
+        with self._db_lock:
+            self._db.executemany("INSERT OR REPLACE INTO jobs (job_id, data, status, updated_at) VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def evict(self, cutoff):
+        # Local copies of jobs that stopped changing (finished, or crashed or
+        # killed mid-run) go too, before the flusher can write them back
+        with self._lock:
+            for job_id in [k for k, j in self._local.items() if j.get("updated_at", 0) < cutoff]:
+                del self._local[job_id]
+                self._dirty.discard(job_id)
+        with self._db_lock:
+            self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED_STATES))}) AND updated_at < ?",
+                (*FINISHED_STATES, cutoff)
+            )
+            self._db.commit()
+
+    def _read(self, job_id):
+        with self._db_lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Progress flush failed: {e}")
+
+
+def make_progress_backend(base_dir):
+    """Backend selected by CLIPCUT_PROGRESS_BACKEND: "memory" (default) or "sqlite"."""
+    kind = os.environ.get("CLIPCUT_PROGRESS_BACKEND", "memory")
+    if kind == "sqlite":
+        path = os.environ.get("CLIPCUT_PROGRESS_DB") or os.path.join(base_dir, "progress.sqlite3")
+        return SQLiteProgressBackend(path)
+    return MemoryProgressBackend()
+
+
+class ProgressTracker:
+    def __init__(self, backend=None, ttl=None, poll_interval=0.5):
+        self.backend = backend or MemoryProgressBackend()
+        # Finished jobs are dropped after ttl seconds, same as the job directories
+        self.ttl = ttl or int(os.environ.get("CLIPCUT_PROGRESS_TTL", str(8 * 3600)))
+        self._last_evict = 0
+        # Wakes up streaming clients on local updates. Updates made by other
+        # processes (SQLite backend) are picked up every poll_interval.
+        self.poll_interval = poll_interval
+        self._changed = threading.Condition()
 
     def init(self, job_id):
-        self._jobs[job_id] = {
+        now = time.time()
+        self.backend.init(job_id, {
             "status": "initializing",
-            "created_at": time.time(),
+            "created_at": now,
+            "updated_at": now,
             "results": []
-        }
+        })
+        if now - self._last_evict > 60:
+            self._last_evict = now
+            self.backend.evict(now - self.ttl)
 
     def update(self, job_id, key, value):
-        if job_id in self._jobs:
-            self._jobs[job_id][key] = value
+        self.backend.update(job_id, key, value)
+        with self._changed:
+            self._changed.notify_all()
 
     def get(self, job_id):
-        return self._jobs.get(job_id, {})
+        job = self.backend.get(job_id)
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    def changes(self, job_id, since=None, timeout=15):
+        """
+        Waits up to timeout seconds for updates newer than event id since
+        (since=None returns the full state right away). Returns
+        (changed fields, latest event id), ({}, since) on timeout or
+        (None, since) if the job doesn't exist.
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.backend.get(job_id)
+            if not job:
+                return None, since
+            seq = job.get("_seq", 0)
+            if since is None:
+                # New client: full snapshot
+                return {k: v for k, v in job.items() if not k.startswith("_")}, seq
+            if seq > since:
+                versions = job.get("_versions", {})
+                return {k: job[k] for k, v in versions.items() if v > since}, seq
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return {}, since
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import wave
+import numpy as np
+from clipcut.ffmpeg_runner import run_ffmpeg
+
+# Proxy video height; analysis works on thumbnails and previews are small
+PROXY_HEIGHT = 360
+# Keyframe interval of the proxy, 1 = all-intra so any frame decodes on its own
+PROXY_GOP = 1
+# Whisper and the audio envelope both want 16 kHz mono
+SAMPLE_RATE = 16000
+
+
+class Proxy:
+    """
+    The low-resolution stand-ins of a job's source. video_path and
+    audio_path fall back to the source itself when no proxy was made, so
+    consumers can always read from them.
+    """
+
+    def __init__(self, src_path, video_path=None, audio_path=None, duration=0.0):
+        self.src_path = src_path
+        self.video_path = video_path or src_path
+        self.audio_path = audio_path or src_path
+        self.duration = duration
+
+    @property
+    def has_audio_extract(self):
+        return self.audio_path != self.src_path
+
+    def read_audio(self, start=0.0, end=None):
+        """
+        Float32 samples of [start, end) from the 16 kHz extract, or None
+        without one. Reads only the requested range.
+        """
+        if not self.has_audio_extract:
+            return None
+        with wave.open(self.audio_path, "rb") as wav:
+            total = wav.getnframes()
+            first = min(total, max(0, int(round(start * SAMPLE_RATE))))
+            last = total if end is None else min(total, max(first, int(round(end * SAMPLE_RATE))))
+            wav.setpos(first)
+            data = wav.readframes(last - first)
+        return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+class ProxyBuilder:
+    """
+    Makes the proxy of a source in a single ffmpeg pass: a small all-intra
+    H.264 video for analysis and scrubbing, and a 16 kHz mono WAV for
+    transcription and loudness. The source is decoded once here instead of
+    by every stage. Only the final render reads the original again.
+    """
+
+    def __init__(self, progress=None, height=None):
+        self.progress = progress
+        self.height = height or int(os.environ.get("CLIPCUT_PROXY_HEIGHT", str(PROXY_HEIGHT)))
+
+    def build(self, src_path, out_dir, job_id=None, video=True, audio=True):
+        info = self._probe(src_path)
+        if info is None:
+            return Proxy(src_path)
+
+        video_path = os.path.join(out_dir, "proxy.mp4")
+        audio_path = os.path.join(out_dir, "proxy.wav")
+        # A source that is already small is its own proxy
+        video = video and info["height"] > self.height
+        audio = audio and info["has_audio"]
+        if not video and not audio:
+            return Proxy(src_path, duration=info["duration"])
+
+        cmd = ["ffmpeg", "-y", "-v", "error", "-i", src_path]
+        if video:
+            cmd.extend([
+                "-map", "0:v:0", "-an", "-sn",
+                "-vf", f"scale=-2:{self.height}:flags=fast_bilinear",
+                "-c:v", "libx264", "-preset", "ultrafast", "-tune", "fastdecode",
+                "-g", str(PROXY_GOP), "-crf", "28", "-pix_fmt", "yuv420p",
+                # Keep the source timestamps so analysis times match it
+                "-fps_mode", "passthrough",
+                video_path,
+            ])
+        if audio:
+            cmd.extend([
+                "-map", "0:a:0", "-vn", "-sn",
+                "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "pcm_s16le",
+                audio_path,
+            ])
+
+        on_progress = None
+        if self.progress and job_id:
+            on_progress = lambda p: self.progress.update(job_id, "proxy", p)
+        try:
+            result = run_ffmpeg(cmd, on_progress=on_progress, duration=info["duration"], timeout=3600)
+        except subprocess.TimeoutExpired:
+            print(f"Proxy generation timed out for {src_path}")
+            return Proxy(src_path, duration=info["duration"])
+        if result.returncode != 0:
+            print(f"Proxy generation failed for {src_path}: {result.stderr.decode(errors='replace')[-500:]}")
+            return Proxy(src_path, duration=info["duration"])
+
+        return Proxy(
+            src_path,
+            video_path=video_path if video else None,
+            audio_path=audio_path if audio else None,
+            duration=info["duration"],
+        )
+
+    def _probe(self, src_path):
+        cmd = [
+            "ffprobe", "-v", "error",
+            "-show_entries", "stream=codec_type,height:format=duration",
+            "-of", "json", src_path
+        ]
+        try:
+            data = json.loads(subprocess.check_output(cmd, timeout=60))
+        except Exception as e:
+            print(f"Proxy probe failed for {src_path}: {e}")
+            return None
+        streams = data.get("streams", [])
+        heights = [s.get("height") or 0 for s in streams if s.get("codec_type") == "video"]
+        return {
+            "height": heights[0] if heights else 0,
+            "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+            "duration": float(data.get("format", {}).get("duration") or 0.0),
+        }
@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Default concurrency per resource class. Whisper and x264 already use every
+# core on their own, so running many of them at once only adds contention.
+STAGE_LIMITS = {
+    "download": 4,
+    "proxy": 2,
+    "transcribe": 1,
+    "render": 2,
+}
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """
+    Runs jobs on a fixed number of worker threads instead of one thread per
+    request. Waiting jobs are kept in a priority queue (lower value first,
+    FIFO within a priority) and their position is published to progress as
+    queue_position. Heavy stages are additionally limited per resource class
+    through stage(), so e.g. only one Whisper transcription runs at a time
+    even when several jobs are active. submit() raises QueueFull once
+    max_queue jobs are waiting.
+    """
+
+    def __init__(self, progress, workers=None, max_queue=None, stage_limits=None):
+        self.progress = progress
+        self.workers = workers or int(os.environ.get("CLIPCUT_JOB_WORKERS", "0")) or self._default_workers()
+        self.max_queue = max_queue or int(os.environ.get("CLIPCUT_JOB_QUEUE", "32"))
+        limits = dict(STAGE_LIMITS)
+        for name in limits:
+            env = os.environ.get(f"CLIPCUT_{name.upper()}_SLOTS")
+            if env:
+                limits[name] = int(env)
+        limits.update(stage_limits or {})
+        self._stages = {name: threading.BoundedSemaphore(max(1, n)) for name, n in limits.items()}
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = 0
+        # Moving average of job run time, used for Retry-After
+        self._avg_duration = 60.0
+
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True).start()
+
+    def _default_workers(self):
+        cpus = os.cpu_count() or 1
+        workers = max(1, cpus // 2)
+        try:
+            mem_gb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+            # A job peaks at roughly 2 GB (Whisper model + decoder + encoders)
+            workers = min(workers, max(1, int(mem_gb // 2)))
+        except (ValueError, OSError, AttributeError):
+            pass
+        return workers
+
+    def submit(self, job_id, fn, args=(), priority=0):
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull(self._retry_after())
+            heapq.heappush(self._queue, (priority, next(self._seq), job_id, fn, args))
+            self.progress.update(job_id, "status", "queued")
+            self._publish_positions()
+            self._cond.notify()
+
+    def is_full(self):
+        with self._cond:
+            return len(self._queue) >= self.max_queue
+
+    def retry_after(self):
+        with self._cond:
+            return self._retry_after()
+
+    def stats(self):
+        with self._cond:
+            return {"queued": len(self._queue), "running": self._running, "workers": self.workers}
+
+    @contextmanager
+    def stage(self, name):
+        """Holds a slot of the given resource class for the duration of the block."""
+        with self._stages[name]:
+            yield
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job_id, fn, args = heapq.heappop(self._queue)
+                self._running += 1
+                self.progress.update(job_id, "queue_position", 0)
+                self._publish_positions()
+
+            started = time.time()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                self.progress.update(job_id, "error", str(e))
+                self.progress.update(job_id, "status", "error")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.time() - started)
+
+    def _publish_positions(self):
+        # Caller holds the lock
+        for position, item in enumerate(sorted(self._queue), start=1):
+            self.progress.update(item[2], "queue_position", position)
+
+    def _retry_after(self):
+        # Caller holds the lock. Time until roughly one queue slot frees up.
+        return max(5, int(self._avg_duration / self.workers))
@@ -1,60 +1,188 @@
-import random
+import math
+import numpy as np
+from clipcut.audio_envelope import AudioEnvelope
+from clipcut.transcript import Transcript
+
+# Relative weight of each per-second feature in a window's score
+FEATURE_WEIGHTS = {
+    "speech": 0.5,
+    "energy": 0.3,
+    "cuts": 0.2,
+}
+# How far (fraction of the clip length, at least SNAP_MIN seconds) a clip
+# edge may move to land on a sentence boundary
+SNAP_FRACTION = 0.15
+SNAP_MIN = 2.0
+SENTENCE_END = (".", "!", "?", "…")
+
 
 class Scoring:
+    def __init__(self):
+        self._features = None
+
     def rank_segments(self, analysis, transcript, clip_duration, num_clips):
-        # Simple logic: create random segments of requested duration
-        # A real implementation would score based on transcript keywords, audio volume, etc.
-        
+        """
+        Picks the num_clips best non-overlapping windows of clip_duration.
+        Every candidate start second is scored at once from prefix sums of
+        the per-second feature score, so this is linear in the source length.
+        """
         video_duration = analysis["duration"]
+        transcript = Transcript.from_segments(transcript)
         if video_duration < clip_duration:
             return [{"start": 0, "end": video_duration}]
-            
+
+        features = self._build_features(analysis, transcript, video_duration)
+        length = int(clip_duration)
+        window_scores = self._window_scores(features["score"], length)
+        if len(window_scores) == 0:
+            return [{"start": 0, "end": video_duration}]
+
+        # Greedy non-maximum suppression: best window first, then drop every
+        # start that would overlap it
+        suppressed = np.zeros(len(window_scores), dtype=bool)
+        picked = []
+        for k in np.argsort(-window_scores, kind="stable"):
+            if suppressed[k]:
+                continue
+            picked.append(int(k))
+            if len(picked) >= num_clips:
+                break
+            suppressed[max(0, k - length + 1):k + length] = True
+
+        starts, ends = self._sentence_bounds(transcript)
         segments = []
-        # Try to find segments that align with subtitle boundaries if possible
-        # For now, just pick random start points that fit
-        
-        possible_starts = int(video_duration - clip_duration)
-        if possible_starts <= 0:
-             return [{"start": 0, "end": video_duration}]
-
-        # Generate non-overlapping segments
-        attempts = 0
-        while len(segments) < num_clips and attempts < 100:
-            start = random.randint(0, possible_starts)
-            end = start + clip_duration
-            
-            # Check overlap
-            overlap = False
-            for s in segments:
-                if not (end < s["start"] or start > s["end"]):
-                    overlap = True
-                    break
-            
-            if not overlap:
-                segments.append({"start": start, "end": end})
-            attempts += 1
-            
-        return sorted(segments, key=lambda x: x["start"])
+        for k in sorted(picked):
+            start, end = self._snap(k, k + clip_duration, starts, ends, clip_duration, video_duration)
+            # Snapping may not pull a clip into the previous one
+            if segments and start < segments[-1]["end"]:
+                start = segments[-1]["end"]
+            if end - start < clip_duration * 0.5:
+                continue
+            segments.append({"start": round(start, 2), "end": round(end, 2), "score": float(window_scores[k])})
+        return segments
 
     def clip_score(self, out, analysis, transcript):
-        # Dummy score
-        return round(random.uniform(7.0, 9.9), 1)
+        """Score on a 0-10 scale, relative to the best window of the same length."""
+        if self._features is None:
+            transcript = Transcript.from_segments(transcript)
+            duration = analysis.get("duration") if isinstance(analysis, dict) else None
+            self._features = self._build_features(analysis, transcript, duration or out["end"])
+        per_second = self._features["score"]
+        length = max(1, int(round(out["end"] - out["start"])))
+        window_scores = self._window_scores(per_second, length)
+        if len(window_scores) == 0 or window_scores.max() <= 0:
+            return 5.0
+        first = min(int(out["start"]), len(per_second) - 1)
+        last = min(len(per_second), first + length)
+        value = per_second[first:last].sum()
+        return round(min(9.9, 5.0 + 4.9 * value / window_scores.max()), 1)
 
     def generate_metadata(self, out, transcript):
         # Extract text from transcript that falls within clip time
-        text = ""
-        start = out["start"]
-        end = out["end"]
-        
-        words = []
-        for t in transcript:
-            if t["end"] > start and t["start"] < end:
-                words.append(t["text"])
-        
-        full_text = " ".join(words)
+        full_text = Transcript.from_segments(transcript).overlapping(out["start"], out["end"]).text()
         title = full_text[:50] + "..." if len(full_text) > 50 else full_text
         if not title:
             title = "Viral Video Clip"
-            
+
         hashtags = "#viral #shorts #fyp"
         return title, hashtags
+
+    def _build_features(self, analysis, transcript, duration):
+        n = max(1, int(math.ceil(duration)))
+        analysis = analysis if isinstance(analysis, dict) else {}
+        features = {
+            "speech": self._speech_density(transcript, n),
+            "energy": self._audio_energy(analysis.get("audio_envelope"), n),
+            "cuts": self._cut_density(analysis.get("scenes") or [], n),
+        }
+        score = np.zeros(n, dtype=np.float64)
+        for name, weight in FEATURE_WEIGHTS.items():
+            score += weight * self._normalize(features[name])
+        features["score"] = score
+        self._features = features
+        return features
+
+    def _window_scores(self, per_second, length):
+        # Sum of every length-second window starting at each whole second
+        if length > len(per_second):
+            return np.zeros(0)
+        prefix = np.concatenate([[0.0], np.cumsum(per_second)])
+        return prefix[length:] - prefix[:-length]
+
+    def _speech_density(self, transcript, n):
+        # Words per second. Each segment's words are spread evenly over it:
+        # the cumulative word count is piecewise linear between segment
+        # edges, so sampling it at whole seconds and differencing gives the
+        # per-second counts without looping over seconds.
+        if not len(transcript):
+            return np.zeros(n)
+        words = np.array([len(t.split()) for t in transcript.texts], dtype=np.float64)
+        # Knots at every segment start and end, kept non-decreasing where
+        # segments overlap
+        starts = np.maximum(transcript.starts, np.concatenate([[0.0], np.maximum.accumulate(transcript.ends)[:-1]]))
+        ends = np.maximum(transcript.ends, starts)
+        totals = np.concatenate([[0.0], np.cumsum(words)])
+        xs = np.concatenate([[0.0], np.column_stack([starts, ends]).ravel()])
+        ys = np.concatenate([[0.0], np.column_stack([totals[:-1], totals[1:]]).ravel()])
+        cumulative = np.interp(np.arange(n + 1), xs, ys)
+        return np.diff(cumulative)
+
+    def _audio_energy(self, envelope_path, n):
+        if not envelope_path:
+            return np.zeros(n)
+        try:
+            envelope = AudioEnvelope.load(envelope_path)
+        except Exception as e:
+            print(f"Could not load audio envelope: {e}")
+            return np.zeros(n)
+        loudness = envelope["loudness"].astype(np.float64)
+        per_second = int(round(1.0 / envelope["hop"]))
+        count = min(n, len(loudness) // per_second)
+        energy = np.zeros(n)
+        if count:
+            # Mean short-term loudness per second, relative to the quietest
+            # speech-level part of the source
+            seconds = loudness[:count * per_second].reshape(count, per_second).mean(axis=1)
+            floor = np.percentile(seconds, 10)
+            energy[:count] = np.maximum(0.0, seconds - floor)
+        return energy
+
+    def _cut_density(self, scenes, n):
+        cuts = [s["start"] for s in scenes if s.get("start", 0) > 0]
+        if not cuts:
+            return np.zeros(n)
+        idx = np.minimum(np.asarray(cuts, dtype=np.float64).astype(int), n - 1)
+        weights = [s.get("confidence", 1.0) for s in scenes if s.get("start", 0) > 0]
+        return np.bincount(idx, weights=weights, minlength=n)[:n]
+
+    def _normalize(self, values):
+        # Scale by a high percentile so one outlier doesn't flatten the rest
+        top = np.percentile(values, 95) if len(values) else 0
+        if top <= 0:
+            top = values.max() if len(values) and values.max() > 0 else 1.0
+        return np.minimum(1.0, values / top)
+
+    def _sentence_bounds(self, transcript):
+        # Segments whose text ends a sentence; fall back to every segment
+        sentence_end = np.array([t.rstrip().endswith(SENTENCE_END) for t in transcript.texts], dtype=bool)
+        ends = transcript.ends[sentence_end] if sentence_end.any() else transcript.ends
+        return transcript.starts, np.sort(ends)
+
+    def _snap(self, start, end, starts, ends, clip_duration, video_duration):
+        tolerance = max(SNAP_MIN, clip_duration * SNAP_FRACTION)
+        start = self._nearest(starts, start, tolerance)
+        end = self._nearest(ends, end, tolerance)
+        if end <= start:
+            end = start + clip_duration
+        return max(0.0, start), min(video_duration, end)
+
+    def _nearest(self, points, t, tolerance):
+        if len(points) == 0:
+            return float(t)
+        i = np.searchsorted(points, t)
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(points) and abs(points[j] - t) <= tolerance:
+                if best is None or abs(points[j] - t) < abs(best - t):
+                    best = float(points[j])
+        return best if best is not None else float(t)
@@ -0,0 +1,189 @@
+import os
+import re
+import subprocess
+from clipcut.probe import MediaProbe
+from clipcut.ffmpeg_runner import run_ffmpeg
+
+# Encoders that can produce a bitstream compatible with the copied GOPs
+ENCODERS = {
+    "h264": {"encoder": "libx264", "bsf": "h264_mp4toannexb", "format": "h264"},
+    "hevc": {"encoder": "libx265", "bsf": "hevc_mp4toannexb", "format": "hevc"},
+}
+
+# NAL unit types of coded slices and of the IDR slices among them
+SLICE_NAL_TYPES = {"h264": range(1, 6), "hevc": range(0, 32)}
+IDR_NAL_TYPES = {"h264": {5}, "hevc": {19, 20}}
+
+PROFILES = {
+    "Baseline": "baseline",
+    "Constrained Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+
+
+class SmartCutter:
+    """
+    Cuts a segment without re-encoding the whole thing.
+    The GOPs fully inside the segment are stream-copied; only the partial
+    GOPs at the start and end are re-encoded, then everything is concatenated.
+    Pieces are written as Annex B elementary streams so every piece carries its
+    own parameter sets and they can be joined byte-wise with the concat protocol.
+    Elementary streams have no timestamps, so this only works when decode
+    order is display order: sources with B-frames (has_b_frames > 0) or whose
+    first copied keyframe isn't an IDR (open GOP) fall back to a full encode.
+    """
+
+    def __init__(self, min_copy_duration=2.0):
+        # Below this the copy saving doesn't pay for the extra processes
+        self.min_copy_duration = min_copy_duration
+
+    def cut(self, src_path, start, end, out_path, threads=None, on_progress=None):
+        """
+        Returns True on success, False if the caller should fall back to a full encode.
+        on_progress gets ffmpeg progress for the whole clip across all steps.
+        """
+        stream = MediaProbe.video_stream(src_path)
+        if not stream or stream.get("codec_name") not in ENCODERS:
+            return False
+        # Reordered frames would get the wrong timestamps after the join
+        if int(stream.get("has_b_frames") or 0) > 0:
+            return False
+
+        keyframes = MediaProbe.keyframes(src_path, start, end)
+        if len(keyframes) < 2:
+            return False
+        copy_start = keyframes[0]
+        copy_end = keyframes[-1]
+        if copy_end - copy_start < self.min_copy_duration:
+            return False
+        if not self._is_idr(src_path, copy_start, stream["codec_name"]):
+            return False
+
+        codec = ENCODERS[stream["codec_name"]]
+        base, _ = os.path.splitext(out_path)
+        ext = codec["format"]
+        pieces = []
+        # Every step reports its own output time, shift it to the clip's timeline
+        progress = {"callback": on_progress, "duration": end - start, "offset": 0.0}
+
+        try:
+            # 1. Head: re-encode up to the first keyframe inside the segment
+            if copy_start - start > 0.01:
+                head_path = f"{base}_smartcut_head.{ext}"
+                if not self._encode_piece(src_path, start, copy_start - start, head_path, stream, codec, threads, progress):
+                    return False
+                pieces.append(head_path)
+
+            # 2. Middle: copy whole GOPs untouched
+            mid_path = f"{base}_smartcut_mid.{ext}"
+            mid_cmd = [
+                "ffmpeg", "-y",
+                "-ss", str(copy_start), "-i", src_path,
+                "-t", str(copy_end - copy_start),
+                "-map", "0:v:0", "-an",
+                "-c:v", "copy", "-bsf:v", codec["bsf"],
+                "-f", ext, mid_path
+            ]
+            progress["offset"] = copy_start - start
+            if not self._run(mid_cmd, mid_path, progress):
+                return False
+            pieces.append(mid_path)
+
+            # 3. Tail: re-encode from the last keyframe to the end
+            if end - copy_end > 0.01:
+                tail_path = f"{base}_smartcut_tail.{ext}"
+                progress["offset"] = copy_end - start
+                if not self._encode_piece(src_path, copy_end, end - copy_end, tail_path, stream, codec, threads, progress):
+                    return False
+                pieces.append(tail_path)
+
+            # 4. Concat the video pieces and take the audio from the source.
+            # Elementary streams carry no timestamps, so restore the source rate.
+            duration = end - start
+            concat_cmd = ["ffmpeg", "-y"]
+            if stream.get("r_frame_rate") and stream["r_frame_rate"] != "0/0":
+                concat_cmd.extend(["-r", stream["r_frame_rate"]])
+            concat_cmd.extend([
+                "-i", "concat:" + "|".join(pieces),
+                "-ss", str(start), "-i", src_path,
+                "-map", "0:v:0", "-map", "1:a:0?",
+                "-c:v", "copy",
+                "-c:a", "aac",
+                "-t", str(duration),
+                "-movflags", "+faststart",
+                out_path
+            ])
+            progress["offset"] = 0.0
+            return self._run(concat_cmd, out_path, progress)
+        finally:
+            for p in pieces:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    def _is_idr(self, src_path, t, codec_name):
+        """True if the keyframe at t is an IDR, so the copy doesn't reference earlier frames."""
+        cmd = [
+            "ffmpeg", "-v", "error",
+            "-ss", str(t), "-i", src_path,
+            "-map", "0:v:0", "-c:v", "copy", "-bsf:v", ENCODERS[codec_name]["bsf"],
+            "-frames:v", "1", "-f", ENCODERS[codec_name]["format"], "-"
+        ]
+        try:
+            data = subprocess.run(cmd, capture_output=True, timeout=60).stdout
+        except Exception:
+            return False
+        for m in re.finditer(b"\x00\x00\x01", data):
+            if m.end() >= len(data):
+                break
+            header = data[m.end()]
+            nal_type = header & 0x1F if codec_name == "h264" else (header >> 1) & 0x3F
+            # The first slice decides; parameter sets and SEI come before it
+            if nal_type in SLICE_NAL_TYPES[codec_name]:
+                return nal_type in IDR_NAL_TYPES[codec_name]
+        return False
+
+    def _encode_piece(self, src_path, start, duration, out_path, stream, codec, threads, progress=None):
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(start), "-i", src_path,
+            "-t", str(duration),
+            "-map", "0:v:0", "-an",
+            "-c:v", codec["encoder"],
+            # Like the copied GOPs, no reordering: the joined stream has no timestamps
+            "-bf", "0",
+        ]
+        # Match the source so the decoder sees one consistent stream
+        if stream.get("pix_fmt"):
+            cmd.extend(["-pix_fmt", stream["pix_fmt"]])
+        profile = PROFILES.get(stream.get("profile"))
+        if profile and codec["encoder"] == "libx264":
+            cmd.extend(["-profile:v", profile])
+        if threads:
+            cmd.extend(["-threads", str(threads)])
+        cmd.extend(["-f", codec["format"], out_path])
+        return self._run(cmd, out_path, progress)
+
+    def _run(self, cmd, out_path, progress=None):
+        print(f"DEBUG: Smart cut step: {' '.join(cmd)}")
+        progress = progress or {}
+        try:
+            result = run_ffmpeg(
+                cmd,
+                on_progress=progress.get("callback"),
+                duration=progress.get("duration"),
+                offset=progress.get("offset", 0.0),
+                timeout=600
+            )
+        except Exception as e:
+            print(f"Smart cut step failed: {e}")
+            return False
+        if result.returncode != 0:
+            print(f"Smart cut step failed: {result.stderr.decode()[-2000:]}")
+            return False
+        return os.path.exists(out_path) and os.path.getsize(out_path) > 0
@@ -23,6 +23,13 @@ class Storage:
     def job_dir(self, job_id):
         return os.path.join(self.base_dir, "jobs", job_id)
 
+    def cache_dir(self, name):
+        # Shared caches live next to the jobs and survive job cleanup
+        path = os.path.join(self.base_dir, "cache", name)
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+        return path
+
     def cleanup_older_than(self, hours=8):
         # Implementation to remove old job directories
         jobs_dir = os.path.join(self.base_dir, "jobs")
@@ -1,21 +1,109 @@
-import os
-from faster_whisper import WhisperModel
+import subprocess
+import numpy as np
+from clipcut.whisper_pool import WHISPER_POOL
+from clipcut.transcript import Transcript
+
+# Whisper works on 16 kHz mono
+SAMPLE_RATE = 16000
 
 class SubtitleEngine:
-    def __init__(self, progress):
+    def __init__(self, progress, pool=None, cache=None):
         self.progress = progress
         # Use small model for better accuracy
-        self.model_size = "small" 
+        self.model_size = "small"
+        self.beam_size = 5
+        # Models are loaded once per process and shared between jobs
+        self.pool = pool or WHISPER_POOL
+        # Extra audio decoded around each requested range so the sentences
+        # crossing the range edges are transcribed whole
+        self.range_padding = 5.0
+        # Optional TranscriptCache, resubmitting the same source skips Whisper
+        self.cache = cache
+
+    def transcribe(self, src_path, ranges=None, proxy=None):
+        """
+        Transcribes the whole source, or only the given (start, end) ranges.
+        Returns a Transcript; timestamps are always in source time.
+        Audio is read from the proxy's 16 kHz extract when there is one.
+        """
+        cache_key = None
+        if self.cache:
+            params = {
+                "beam_size": self.beam_size,
+                "ranges": [[float(s), float(e)] for s, e in ranges] if ranges else None,
+                "padding": self.range_padding if ranges else None,
+            }
+            cache_key = self.cache.key(src_path, self.model_size, params)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print(f"Transcript cache hit for {src_path}")
+                return cached
+
+        result = Transcript.from_segments(self._transcribe(src_path, ranges, proxy))
+        if self.cache:
+            self.cache.put(cache_key, result)
+        return result
+
+    def _transcribe(self, src_path, ranges, proxy=None):
+        extract = proxy is not None and proxy.has_audio_extract
+        if not ranges:
+            return self._transcribe_audio(proxy.read_audio() if extract else src_path)
 
-    def transcribe(self, src_path):
-        model = WhisperModel(self.model_size, device="cpu", compute_type="int8")
-        segments, info = model.transcribe(src_path, beam_size=5)
-        
         result = []
-        for segment in segments:
-            result.append({
-                "start": segment.start,
-                "end": segment.end,
-                "text": segment.text.strip()
-            })
+        for win_start, win_end, wanted in self._windows(ranges):
+            if extract:
+                audio = proxy.read_audio(win_start, win_end)
+            else:
+                audio = self._decode_range(src_path, win_start, win_end)
+            if audio is None or len(audio) == 0:
+                continue
+            for seg in self._transcribe_audio(audio, offset=win_start):
+                # Keep whole sentences that touch one of the requested ranges
+                if any(seg["end"] > a and seg["start"] < b for a, b in wanted):
+                    result.append(seg)
         return result
+
+    def _transcribe_audio(self, audio, offset=0.0):
+        with self.pool.lease(self.model_size) as model:
+            segments, info = model.transcribe(audio, beam_size=self.beam_size)
+
+            # segments is lazy, decoding happens while iterating
+            result = []
+            for segment in segments:
+                result.append({
+                    "start": segment.start + offset,
+                    "end": segment.end + offset,
+                    "text": segment.text.strip()
+                })
+        return result
+
+    def _windows(self, ranges):
+        # Pad every range, then merge the ones whose padded windows overlap
+        windows = []
+        for start, end in sorted((float(s), float(e)) for s, e in ranges):
+            if end <= start:
+                continue
+            win_start = max(0.0, start - self.range_padding)
+            win_end = end + self.range_padding
+            if windows and win_start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], win_end)
+                windows[-1][2].append((start, end))
+            else:
+                windows.append([win_start, win_end, [(start, end)]])
+        return windows
+
+    def _decode_range(self, src_path, start, end):
+        cmd = [
+            "ffmpeg", "-v", "error",
+            "-ss", str(start), "-t", str(end - start), "-i", src_path,
+            "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-"
+        ]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=600)
+        except subprocess.TimeoutExpired:
+            print(f"Audio decode timed out for {src_path} [{start}-{end}]")
+            return None
+        if result.returncode != 0:
+            print(f"Audio decode failed for {src_path}: {result.stderr.decode()}")
+            return None
+        return np.frombuffer(result.stdout, dtype=np.float32)
@@ -0,0 +1,87 @@
+import math
+import os
+import cv2
+
+# Poster frame size cap and position within the clip (past any fade-in)
+POSTER_WIDTH = 640
+POSTER_AT = 0.5
+# Scrubbing sprite: tile width, tiles per row and most tiles per clip
+SPRITE_WIDTH = 160
+SPRITE_COLUMNS = 10
+MAX_TILES = 100
+
+
+class ClipThumbnails:
+    """
+    Poster frame and scrubbing sprite sheet (tiled JPEG plus a WebVTT
+    index) of one rendered clip. They are produced by extra branches of the
+    filter graph that encodes the clip, so they cost no extra decode.
+    """
+
+    def __init__(self, base_path, duration):
+        self.poster_path = f"{base_path}_poster.jpg"
+        self.sprite_path = f"{base_path}_sprite.jpg"
+        self.vtt_path = f"{base_path}_sprite.vtt"
+        self.duration = duration
+        # One tile per second, spread out further on long clips
+        self.interval = max(1.0, duration / MAX_TILES)
+        self.tiles = max(1, int(math.ceil(duration / self.interval)))
+        self.columns = min(SPRITE_COLUMNS, self.tiles)
+        self.rows = int(math.ceil(self.tiles / self.columns))
+
+    def graph(self, label, tag):
+        """Filter graph entries turning [label] into the [poster<tag>] and [sprite<tag>] outputs."""
+        return [
+            f"[{label}]split=2[tp{tag}][ts{tag}]",
+            f"[tp{tag}]trim=start={self.duration * POSTER_AT:.3f},scale=w='min(iw,{POSTER_WIDTH})':h=-2[poster{tag}]",
+            f"[ts{tag}]fps=1/{self.interval:.3f},scale={SPRITE_WIDTH}:-2,tile={self.columns}x{self.rows}[sprite{tag}]",
+        ]
+
+    def output_args(self, tag):
+        return [
+            "-map", f"[poster{tag}]", "-frames:v", "1", "-q:v", "3", self.poster_path,
+            "-map", f"[sprite{tag}]", "-frames:v", "1", "-q:v", "5", self.sprite_path,
+        ]
+
+    def command(self, video_path):
+        """Standalone command for a clip that was never decoded (stream-copied cuts)."""
+        return ["ffmpeg", "-y", "-v", "error", "-i", video_path,
+                "-filter_complex", ";".join(self.graph("0:v", ""))] + self.output_args("")
+
+    def write_vtt(self):
+        """Writes the WebVTT index of the sprite; False if there is no sprite."""
+        if not os.path.exists(self.sprite_path):
+            return False
+        sprite = cv2.imread(self.sprite_path, cv2.IMREAD_UNCHANGED)
+        if sprite is None:
+            return False
+        tile_w = sprite.shape[1] // self.columns
+        tile_h = sprite.shape[0] // self.rows
+        name = os.path.basename(self.sprite_path)
+
+        lines = ["WEBVTT", ""]
+        for k in range(self.tiles):
+            start = k * self.interval
+            end = min(self.duration, start + self.interval)
+            x, y = (k % self.columns) * tile_w, (k // self.columns) * tile_h
+            lines.append(f"{_vtt_time(start)} --> {_vtt_time(end)}")
+            lines.append(f"{name}#xywh={x},{y},{tile_w},{tile_h}")
+            lines.append("")
+        with open(self.vtt_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        return True
+
+    def paths(self):
+        """The files that were produced, keyed like the clip result entries."""
+        out = {}
+        if os.path.exists(self.poster_path):
+            out["poster_path"] = self.poster_path
+        if os.path.exists(self.sprite_path) and os.path.exists(self.vtt_path):
+            out["sprite_path"] = self.sprite_path
+            out["sprite_vtt_path"] = self.vtt_path
+        return out
+
+
+def _vtt_time(seconds):
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class Transcript:
+    """
+    Transcript segments stored column-wise: start and end times in sorted
+    float arrays plus a list of texts. overlapping() finds the segments of a
+    time range with two binary searches, using a running maximum of the end
+    times so segments that overlap each other are still found.
+    Iterating yields the usual {"start", "end", "text"} dicts.
+    """
+
+    def __init__(self, starts=(), ends=(), texts=(), presorted=False):
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        texts = list(texts)
+        if not presorted and len(starts) > 1 and np.any(np.diff(starts) < 0):
+            order = np.argsort(starts, kind="stable")
+            starts, ends = starts[order], ends[order]
+            texts = [texts[k] for k in order]
+        self.starts = starts
+        self.ends = ends
+        self.texts = texts
+        self._max_end = np.maximum.accumulate(ends) if len(ends) else ends
+
+    @classmethod
+    def from_segments(cls, segments):
+        if isinstance(segments, cls):
+            return segments
+        segments = list(segments or [])
+        return cls(
+            [t["start"] for t in segments],
+            [t["end"] for t in segments],
+            [t["text"] for t in segments],
+        )
+
+    def to_segments(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        for start, end, text in self.rows():
+            yield {"start": start, "end": end, "text": text}
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return Transcript(self.starts[k], self.ends[k], self.texts[k], presorted=True)
+        return {"start": float(self.starts[k]), "end": float(self.ends[k]), "text": self.texts[k]}
+
+    def rows(self):
+        """Yields (start, end, text) tuples."""
+        return zip(self.starts.tolist(), self.ends.tolist(), self.texts)
+
+    def span(self, start, end):
+        """Index range [lo, hi) that contains every segment overlapping (start, end)."""
+        lo = int(np.searchsorted(self._max_end, start, side="right"))
+        hi = int(np.searchsorted(self.starts, end, side="left"))
+        return lo, max(lo, hi)
+
+    def overlapping(self, start, end):
+        """Segments with end > start and start < end, as a Transcript."""
+        lo, hi = self.span(start, end)
+        ends = self.ends[lo:hi]
+        keep = ends > start
+        if keep.all():
+            # Common case (segments don't overlap each other): plain views
+            return Transcript(self.starts[lo:hi], ends, self.texts[lo:hi], presorted=True)
+        idx = np.flatnonzero(keep)
+        return Transcript(self.starts[lo:hi][idx], ends[idx], [self.texts[lo + k] for k in idx], presorted=True)
+
+    def text(self, separator=" "):
+        return separator.join(self.texts)
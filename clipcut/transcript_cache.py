@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from clipcut.transcript import Transcript
+
+
+class TranscriptCache:
+    """
+    On-disk transcript cache keyed by the content of the source audio.
+    Entries are gzipped column-oriented JSON; writes are atomic (temp file +
+    rename) and the directory is kept under max_bytes by evicting the least
+    recently used entries (mtime is bumped on every hit).
+    """
+
+    def __init__(self, base_dir, max_bytes=None):
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes or int(os.environ.get("CLIPCUT_TRANSCRIPT_CACHE_MB", "256")) * 1024 * 1024
+        self._lock = threading.Lock()
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def key(self, src_path, model_size, params):
+        """Returns the cache key for a source, or None if it can't be hashed."""
+        audio_hash = self.audio_hash(src_path)
+        if not audio_hash:
+            return None
+        blob = json.dumps({"audio": audio_hash, "model": model_size, "params": params}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def audio_hash(self, src_path):
+        # Hash the compressed audio packets: no decoding, and the same upload
+        # or download hashes the same regardless of file name or container.
+        cmd = [
+            "ffmpeg", "-v", "error", "-i", src_path,
+            "-map", "0:a:0", "-c", "copy",
+            "-f", "hash", "-hash", "sha256", "-"
+        ]
+        try:
+            out = subprocess.check_output(cmd, stderr=subprocess.DEVNULL, timeout=600).decode().strip()
+            if out.upper().startswith("SHA256="):
+                return out.split("=", 1)[1]
+        except Exception as e:
+            print(f"Audio hash failed for {src_path}: {e}")
+        return None
+
+    def get(self, key):
+        if not key:
+            return None
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            return None
+        # Stored column-wise already, no per-segment objects needed
+        return Transcript(data["start"], data["end"], data["text"], presorted=True)
+
+    def put(self, key, transcript):
+        if not key:
+            return
+        transcript = Transcript.from_segments(transcript)
+        data = {
+            "start": transcript.starts.round(3).tolist(),
+            "end": transcript.ends.round(3).tolist(),
+            "text": transcript.texts,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Transcript cache write failed: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.base_dir, f"{key}.json.gz")
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.base_dir):
+                if not name.endswith(".json.gz"):
+                    continue
+                path = os.path.join(self.base_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,141 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from faster_whisper import WhisperModel
+
+# Approximate resident size of the int8 weights, used for the memory budget
+MODEL_SIZES_MB = {
+    "tiny": 75,
+    "tiny.en": 75,
+    "base": 145,
+    "base.en": 145,
+    "small": 480,
+    "small.en": 480,
+    "medium": 1500,
+    "medium.en": 1500,
+    "large-v1": 3000,
+    "large-v2": 3000,
+    "large-v3": 3000,
+    "distil-large-v3": 1500,
+}
+
+
+class WhisperModelPool:
+    """
+    Process-wide registry of loaded Whisper models.
+    Each model is loaded once and shared by every job. Models that are not
+    in use are evicted least-recently-used first once the loaded set exceeds
+    the memory budget. Concurrent transcriptions on one model are capped at
+    num_workers, which is what CTranslate2 can run in parallel.
+    """
+
+    def __init__(self, memory_budget_mb=None, cpu_threads=None, num_workers=None, device="cpu", compute_type="int8"):
+        self.memory_budget_mb = memory_budget_mb or int(os.environ.get("CLIPCUT_WHISPER_MEMORY_MB", "2048"))
+        self.cpu_threads = cpu_threads or int(os.environ.get("CLIPCUT_WHISPER_THREADS", "0")) or (os.cpu_count() or 1)
+        self.num_workers = num_workers or int(os.environ.get("CLIPCUT_WHISPER_WORKERS", "2"))
+        self.device = device
+        self.compute_type = compute_type
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, model_size):
+        """Yields a loaded model; it can't be evicted until the block exits."""
+        entry = self._acquire(model_size)
+        try:
+            with entry["slots"]:
+                yield entry["model"]
+        finally:
+            self._release(model_size)
+
+    def warmup(self, model_sizes):
+        """Loads the given models and runs one short decode so the first job doesn't pay for it."""
+        for size in model_sizes:
+            size = size.strip()
+            if not size:
+                continue
+            try:
+                with self.lease(size) as model:
+                    segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1)
+                    list(segments)
+                print(f"Whisper model '{size}' warmed up")
+            except Exception as e:
+                print(f"Whisper warm-up failed for '{size}': {e}")
+
+    def loaded(self):
+        with self._lock:
+            return {k: {"in_use": e["in_use"], "size_mb": e["size_mb"]} for k, e in self._models.items()}
+
+    def _acquire(self, model_size):
+        while True:
+            with self._lock:
+                entry = self._models.get(model_size)
+                if entry:
+                    self._models.move_to_end(model_size)
+                    entry["in_use"] += 1
+                    return entry
+                event = self._loading.get(model_size)
+                leader = event is None
+                if leader:
+                    event = threading.Event()
+                    self._loading[model_size] = event
+
+            if not leader:
+                # Another thread is loading this model, wait for it and retry
+                event.wait()
+                continue
+
+            try:
+                print(f"Loading Whisper model '{model_size}' ({self.cpu_threads} threads, {self.num_workers} workers)")
+                model = WhisperModel(
+                    model_size,
+                    device=self.device,
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads,
+                    num_workers=self.num_workers,
+                )
+            except Exception:
+                with self._lock:
+                    del self._loading[model_size]
+                event.set()
+                raise
+
+            with self._lock:
+                entry = {
+                    "model": model,
+                    "size_mb": MODEL_SIZES_MB.get(model_size, 1500),
+                    "in_use": 1,
+                    "slots": threading.BoundedSemaphore(self.num_workers),
+                }
+                self._models[model_size] = entry
+                del self._loading[model_size]
+                self._evict()
+            event.set()
+            return entry
+
+    def _release(self, model_size):
+        with self._lock:
+            entry = self._models.get(model_size)
+            if entry:
+                entry["in_use"] -= 1
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock. Oldest first, never a model that is in use
+        # and never the most recently used one, even if it alone is over budget.
+        total = sum(e["size_mb"] for e in self._models.values())
+        for key in list(self._models)[:-1]:
+            if total <= self.memory_budget_mb:
+                break
+            entry = self._models[key]
+            if entry["in_use"] > 0:
+                continue
+            del self._models[key]
+            total -= entry["size_mb"]
+            print(f"Evicted Whisper model '{key}'")
+
+
+WHISPER_POOL = WhisperModelPool()
@@ -1,30 +1,53 @@
+import io
 import os
 import threading
+import time
 import uuid
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for
 from werkzeug.utils import secure_filename
 from clipcut.storage import Storage
-from clipcut.progress import ProgressTracker
+from clipcut.progress import ProgressTracker, make_progress_backend
 from clipcut.downloader import YouTubeDownloader
 from clipcut.analysis import Analyzer
+from clipcut.audio_envelope import AudioEnvelope
 from clipcut.editor import Editor
 from clipcut.subtitles import SubtitleEngine
+from clipcut.transcript import Transcript
 from clipcut.scoring import Scoring
 from clipcut.presets import PlatformPresets
 from clipcut.dubbing import DubbingEngine
 from clipcut.filter_library import FILTER_LIBRARY
-from clipcut.filters import VideoFilters
+from clipcut.preview import PreviewRenderer
+from clipcut.lut import LutCompiler
+from clipcut.proxy import Proxy, ProxyBuilder
+from clipcut.whisper_pool import WHISPER_POOL
+from clipcut.transcript_cache import TranscriptCache
+from clipcut.media_cache import MediaCache
+from clipcut.dub_cache import DubCache
+from clipcut.scheduler import JobScheduler, QueueFull
 import json
-import tempfile
 import shutil
 
 app = Flask(__name__, template_folder="templates")
 app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024 * 1024
 app.config["UPLOAD_EXTENSIONS"] = {".mp4", ".mkv", ".mov"}
 storage = Storage(base_dir=os.path.join(os.getcwd(), "workspace"))
-progress = ProgressTracker()
+# Set CLIPCUT_PROGRESS_BACKEND=sqlite when running more than one server process
+progress = ProgressTracker(make_progress_backend(storage.base_dir))
 presets = PlatformPresets()
+transcript_cache = TranscriptCache(storage.cache_dir("transcripts"))
+media_cache = MediaCache(storage.cache_dir("media"))
+dub_cache = DubCache(storage.cache_dir("dubbing"))
+scheduler = JobScheduler(progress)
+preview_renderer = PreviewRenderer()
+# Color grading is compiled into 3D LUTs unless CLIPCUT_COMPILE_LUTS=0
+lut_compiler = LutCompiler(storage.cache_dir("luts")) if os.environ.get("CLIPCUT_COMPILE_LUTS", "1") != "0" else None
+
+# Optionally load Whisper models at startup, e.g. CLIPCUT_WHISPER_WARMUP=small,base
+_whisper_warmup = os.environ.get("CLIPCUT_WHISPER_WARMUP", "")
+if _whisper_warmup:
+    threading.Thread(target=WHISPER_POOL.warmup, args=(_whisper_warmup.split(","),), daemon=True).start()
 
 
 @app.route("/", methods=["GET"])
@@ -54,9 +77,33 @@ def _get_duration(path):
     except:
         return 0.0
 
+def _compute_envelope(src_path, envelope_path):
+    try:
+        AudioEnvelope().compute(src_path, envelope_path)
+    except Exception as e:
+        print(f"Audio envelope failed: {e}")
+
+
+def _build_proxy(job_id, src_path):
+    if os.environ.get("CLIPCUT_PROXY", "1") == "0":
+        return Proxy(src_path)
+    progress.update(job_id, "status", "proxying")
+    with scheduler.stage("proxy"):
+        proxy = ProxyBuilder(progress).build(src_path, storage.job_dir(job_id), job_id=job_id)
+    if proxy.video_path != src_path:
+        progress.update(job_id, "proxy_url", f"/proxy/{job_id}")
+    return proxy
+
+
 def _start_job(job_id, params, src_path):
     try:
         mode = params.get("mode", "clip")
+
+        if params.get("url"):
+            yd = YouTubeDownloader(progress, cache=media_cache)
+            progress.update(job_id, "status", "downloading")
+            with scheduler.stage("download"):
+                src_path = yd.download(params["url"], params["quality"], storage.job_dir(job_id))
         
         # Initialize common components
         progress.update(job_id, "status", "analyzing")
@@ -73,58 +120,88 @@ def _start_job(job_id, params, src_path):
             # So we can just pass a dummy segment covering everything.
             ranked = [{"start": 0, "end": duration, "text": ""}]
             
-            transcript = [] # No subtitles by default unless we run transcribe?
+            transcript = Transcript() # No subtitles by default unless we run transcribe?
             # If user wants subtitles in Edit mode, we need to run transcribe.
             if params["subtitles"] or params["dubbing_enabled"]:
                  progress.update(job_id, "status", "transcribing")
-                 subs = SubtitleEngine(progress)
-                 transcript = subs.transcribe(src_path)
+                 subs = SubtitleEngine(progress, cache=transcript_cache)
+                 # Only the trimmed window ends up in the output, so only transcribe that
+                 trim_start = params.get("trim_start", 0)
+                 trim_end = params.get("trim_end", 0)
+                 ranges = [(trim_start, trim_end)] if trim_end > trim_start else None
+                 with scheduler.stage("transcribe"):
+                     transcript = subs.transcribe(src_path, ranges=ranges)
             
             analysis = [] # No scene analysis needed
+            scorer = Scoring()
             
         else:
             # Clip Generator Mode
+            # Decode the source once into a small proxy and an audio
+            # extract; everything up to the render reads those instead
+            proxy = _build_proxy(job_id, src_path)
+            progress.update(job_id, "status", "analyzing")
             analyzer = Analyzer(progress)
-            analysis = analyzer.run(src_path)
+            # The audio envelope only needs the audio stream, compute it
+            # while the scene detection decodes the video
+            envelope_path = os.path.join(storage.job_dir(job_id), "audio_envelope.npz")
+            envelope_thread = threading.Thread(target=_compute_envelope, args=(proxy.audio_path, envelope_path), daemon=True)
+            envelope_thread.start()
+            # Sampled frames are memory-mapped from the job dir while scene
+            # detection runs (about 1 GB per hour of source), then removed
+            frames_dir = os.path.join(storage.job_dir(job_id), "frames")
+            try:
+                analysis = analyzer.run(src_path, decode_path=proxy.video_path, store_dir=frames_dir)
+            finally:
+                shutil.rmtree(frames_dir, ignore_errors=True)
+            envelope_thread.join()
+            analysis["audio_envelope"] = envelope_path if os.path.exists(envelope_path) else None
             progress.update(job_id, "status", "transcribing")
-            subs = SubtitleEngine(progress)
-            transcript = subs.transcribe(src_path)
+            subs = SubtitleEngine(progress, cache=transcript_cache)
+            with scheduler.stage("transcribe"):
+                transcript = subs.transcribe(src_path, proxy=proxy)
             progress.update(job_id, "status", "selecting")
             scorer = Scoring()
             ranked = scorer.rank_segments(analysis, transcript, params["clip_duration"], params["num_clips"])
 
         progress.update(job_id, "status", "editing")
-        ed = Editor(progress, presets)
+        ed = Editor(progress, presets, lut_compiler)
         
         # Dubbing Workflow
         dubbing_engine = None
+        # Hit/miss counts of this job only
+        job_dub_cache = dub_cache.session()
         if params.get("dubbing_enabled") and params.get("target_language"):
-             dubbing_engine = DubbingEngine(progress)
-
-        outputs = ed.render_clips(
-            src_path=src_path,
-            segments=ranked,
-            platform=params["platform"],
-            auto_edit=params["auto_edit"],
-            burn_subs=params["subtitles"],
-            transcript=transcript,
-            analysis=analysis,
-            job_id=job_id,
-            dubbing_engine=dubbing_engine,
-            target_language=params.get("target_language"),
-            voice_gender=params.get("voice_gender", "Male"),
-            subtitle_font=params.get("subtitle_font", "Arial"),
-            subtitle_words=params.get("subtitle_words", 5),
-            subtitle_animation=params.get("subtitle_animation", "None"),
-            filters=params.get("filters"),
-            trim_start=params.get("trim_start", 0),
-            trim_end=params.get("trim_end", 0),
-            transition_type=params.get("transition_type", "none"),
-            bg_music_path=params.get("bg_music_path"),
-            bg_volume=params.get("bg_volume", 0.2)
-        )
+             dubbing_engine = DubbingEngine(progress, cache=job_dub_cache)
+
+        with scheduler.stage("render"):
+            outputs = ed.render_clips(
+                src_path=src_path,
+                segments=ranked,
+                platform=params["platform"],
+                auto_edit=params["auto_edit"],
+                burn_subs=params["subtitles"],
+                transcript=transcript,
+                analysis=analysis,
+                job_id=job_id,
+                dubbing_engine=dubbing_engine,
+                target_language=params.get("target_language"),
+                voice_gender=params.get("voice_gender", "Male"),
+                subtitle_font=params.get("subtitle_font", "Arial"),
+                subtitle_words=params.get("subtitle_words", 5),
+                subtitle_animation=params.get("subtitle_animation", "None"),
+                filters=params.get("filters"),
+                trim_start=params.get("trim_start", 0),
+                trim_end=params.get("trim_end", 0),
+                transition_type=params.get("transition_type", "none"),
+                bg_music_path=params.get("bg_music_path"),
+                bg_volume=params.get("bg_volume", 0.2),
+                render_mode=params.get("render_mode", "per_clip")
+            )
+        if dubbing_engine:
+            progress.update(job_id, "dub_cache", job_dub_cache.stats)
         meta = []
-        for out in outputs:
+        for i, out in enumerate(outputs):
             score = scorer.clip_score(out, analysis, transcript)
             title, hashtags = scorer.generate_metadata(out, transcript)
             meta.append(
@@ -139,15 +216,21 @@ def _start_job(job_id, params, src_path):
                     "hashtags": hashtags,
                 }
             )
+            # Poster and scrubbing sprite, when the render produced them
+            for key in ("poster_path", "sprite_path", "sprite_vtt_path"):
+                if out.get(key):
+                    meta[-1][key.replace("_path", "_url")] = f"/thumbs/{job_id}/{i}/{os.path.basename(out[key])}"
+                    meta[-1][key] = out[key]
         if not meta:
-            progress.update(job_id, "status", "error")
+            # Message first: progress streams end once the status is final
             progress.update(job_id, "error", "No clips generated. FFmpeg might have failed.")
+            progress.update(job_id, "status", "error")
         else:
             progress.update(job_id, "results", meta)
             progress.update(job_id, "status", "completed")
     except Exception as e:
-        progress.update(job_id, "status", "error")
         progress.update(job_id, "error", str(e))
+        progress.update(job_id, "status", "error")
 
 
 @app.route("/preview_frame", methods=["POST"])
@@ -169,30 +252,67 @@ def preview_frame():
         except:
             filters = {}
 
-        # Save input image
-        ext = os.path.splitext(image_file.filename)[1] or ".jpg"
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp_in:
-            image_file.save(tmp_in.name)
-            input_path = tmp_in.name
-            
-        # Output path
-        output_path = input_path.replace(ext, "_processed.jpg") # Force jpg for preview
-        
-        # Apply filters
-        VideoFilters.apply_filters_to_image(input_path, filters, output_path)
-        
-        # Cleanup input
-        try:
-            os.remove(input_path)
-        except:
-            pass
-            
-        return send_file(output_path, mimetype="image/jpeg")
+        # Rendered in-process and in memory, no ffmpeg or temp files
+        jpeg = preview_renderer.render_bytes(image_file.read(), filters)
+        return send_file(io.BytesIO(jpeg), mimetype="image/jpeg")
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/proxy/<job_id>")
+def proxy_video(job_id):
+    # Low-resolution all-intra copy of the source, cheap to scrub through
+    path = os.path.join(storage.job_dir(job_id), "proxy.mp4")
+    if not os.path.exists(path):
+        return jsonify({"error": "No proxy for this job"}), 404
+    return send_file(path, mimetype="video/mp4", conditional=True)
+
+
+@app.route("/thumbs/<job_id>/<int:i>/<name>")
+def thumbs(job_id, i, name):
+    # Poster, sprite sheet and its WebVTT index of a finished clip. The VTT
+    # refers to the sprite by file name, which resolves to this route.
+    info = progress.get(job_id)
+    results = (info or {}).get("results") or []
+    if i < 0 or i >= len(results):
+        return jsonify({"error": "Invalid index"}), 404
+    for key, mimetype in (("poster_path", "image/jpeg"), ("sprite_path", "image/jpeg"), ("sprite_vtt_path", "text/vtt")):
+        path = results[i].get(key)
+        if path and os.path.basename(path) == name and os.path.exists(path):
+            response = send_file(path, mimetype=mimetype, conditional=True)
+            # Written once with the clip and never changed
+            response.headers["Cache-Control"] = "public, max-age=86400"
+            return response
+    return jsonify({"error": "File not found"}), 404
+
+
+@app.route("/lut", methods=["POST"])
+def lut():
+    # The compiled color grade as a .cube file, e.g. for a WebGL preview
+    try:
+        filters = json.loads(request.form.get("filters", "{}"))
+    except ValueError:
+        return jsonify({"error": "Invalid filters"}), 400
+    try:
+        path = (lut_compiler or LutCompiler(storage.cache_dir("luts"))).compile_filters(filters)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if not path:
+        return "", 204
+    response = send_file(path, mimetype="text/plain", download_name="grade.cube")
+    # Named by a hash of the filters, so the content never changes
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return response
+
+
+def _queue_full_response(retry_after):
+    resp = jsonify({"error": "Server is busy, please retry later", "retry_after": retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp
+
+
 @app.route("/process", methods=["POST"])
 def process():
     form = request.form
@@ -231,6 +351,12 @@ def process():
     trim_end = float(form.get("trim_end", "0"))
     transition_type = form.get("transition_type", "none")
     mode = form.get("mode", "clip")
+    # "single_pass" decodes the source once and writes every clip from one ffmpeg graph
+    render_mode = form.get("render_mode", os.environ.get("CLIPCUT_RENDER_MODE", "per_clip"))
+
+    # Refuse early instead of accepting work we can't start for a long time
+    if scheduler.is_full():
+        return _queue_full_response(scheduler.retry_after())
 
     job_id = uuid.uuid4().hex
     progress.init(job_id)
@@ -249,22 +375,19 @@ def process():
                 bg_f.save(bg_dst)
                 bg_music_path = bg_dst
         
+        # URL sources are downloaded by the job itself, under the download stage limit
         src_path = None
-        if url:
-            yd = YouTubeDownloader(progress)
-            progress.update(job_id, "status", "downloading")
-            src_path = yd.download(url, quality, storage.job_dir(job_id))
-        else:
+        if not url:
             f = request.files.get("video_file")
             if not f or f.filename == "":
-                progress.update(job_id, "status", "error")
                 progress.update(job_id, "error", "No input source")
+                progress.update(job_id, "status", "error")
                 return jsonify({"error": "No input source provided (URL or File)"}), 400
             filename = secure_filename(f.filename)
             ext = os.path.splitext(filename)[1].lower()
             if ext not in app.config["UPLOAD_EXTENSIONS"]:
-                progress.update(job_id, "status", "error")
                 progress.update(job_id, "error", "Unsupported file type")
+                progress.update(job_id, "status", "error")
                 return jsonify({"error": "Unsupported file type"}), 400
             dst = os.path.join(storage.job_dir(job_id), filename)
             f.save(dst)
@@ -286,15 +409,21 @@ def process():
             "trim_end": trim_end,
             "transition_type": transition_type,
             "mode": mode,
+            "render_mode": render_mode,
             "bg_music_path": bg_music_path,
-            "bg_volume": bg_volume
+            "bg_volume": bg_volume,
+            "url": url
         }
-        t = threading.Thread(target=_start_job, args=(job_id, params, src_path), daemon=True)
-        t.start()
+        scheduler.submit(job_id, _start_job, (job_id, params, src_path))
         return jsonify({"job_id": job_id})
-    except Exception as e:
+    except QueueFull as e:
+        progress.update(job_id, "error", str(e))
         progress.update(job_id, "status", "error")
+        shutil.rmtree(storage.job_dir(job_id), ignore_errors=True)
+        return _queue_full_response(e.retry_after)
+    except Exception as e:
         progress.update(job_id, "error", str(e))
+        progress.update(job_id, "status", "error")
         return jsonify({"error": str(e)}), 500
 
 
@@ -303,6 +432,54 @@ def job_progress(job_id):
     return jsonify(progress.get(job_id))
 
 
+@app.route("/progress/<job_id>/stream", methods=["GET"])
+def job_progress_stream(job_id):
+    """
+    Server-sent events: one event per batch of changed fields, with the
+    event id set so a reconnecting EventSource resumes via Last-Event-ID.
+    A comment line is sent as heartbeat when nothing changed for a while.
+    Once the job has finished and everything was sent, a "done" event tells
+    the client to close instead of reconnecting.
+    Each open stream occupies a worker thread (or greenlet), so deployments
+    with many viewers need a threaded or gevent worker. Streams end after
+    CLIPCUT_SSE_MAX_SECONDS and the EventSource reconnects and resumes.
+    """
+    if not progress.get(job_id):
+        return jsonify({"error": "Unknown job"}), 404
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    since = int(last_id) if last_id and last_id.isdigit() else None
+    heartbeat = float(os.environ.get("CLIPCUT_SSE_HEARTBEAT", "15"))
+    max_seconds = float(os.environ.get("CLIPCUT_SSE_MAX_SECONDS", "300"))
+
+    def generate():
+        seq = since
+        deadline = time.time() + max_seconds
+        yield "retry: 2000\n\n"
+        while True:
+            finished = (progress.get(job_id) or {}).get("status") in ("completed", "error")
+            if not finished and time.time() >= deadline:
+                return
+            # A finished job only needs the updates the client hasn't seen yet
+            wait = 0 if finished else min(heartbeat, deadline - time.time())
+            changed, seq = progress.changes(job_id, seq, timeout=wait)
+            if changed is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            if changed:
+                yield f"id: {seq}\ndata: {json.dumps(changed)}\n\n"
+            elif finished:
+                yield "event: done\ndata: {}\n\n"
+                return
+            else:
+                yield ": heartbeat\n\n"
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # Keep reverse proxies from buffering the stream
+        "X-Accel-Buffering": "no",
+    })
+
+
 @app.route("/download/<job_id>/<kind>", methods=["GET"])
 def download(job_id, kind):
     info = progress.get(job_id)
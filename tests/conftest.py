@@ -0,0 +1,58 @@
+import os
+import shutil
+import subprocess
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The translation and TTS clients are only reached over the network and the
+# tests pass their own stand-ins, so placeholders do when they aren't installed
+for _name, _attr in (("deep_translator", "GoogleTranslator"), ("edge_tts", "Communicate")):
+    try:
+        __import__(_name)
+    except ImportError:
+        _module = types.ModuleType(_name)
+        setattr(_module, _attr, None)
+        sys.modules[_name] = _module
+
+needs_ffmpeg = pytest.mark.skipif(
+    not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="ffmpeg is not installed")
+
+
+def synthesize(path, seconds=4, size="320x180", rate=30, audio=True, extra=()):
+    """testsrc2 (plus a sine track) encoded with libx264, extra are output options."""
+    cmd = ["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={rate}:duration={seconds}"]
+    if audio:
+        cmd.extend(["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}", "-c:a", "aac"])
+    cmd.extend(["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", *extra, "-shortest", path])
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def frame_count(path):
+    out = subprocess.check_output([
+        "ffprobe", "-v", "error", "-select_streams", "v:0", "-count_frames",
+        "-show_entries", "stream=nb_read_frames", "-of", "csv=p=0", path,
+    ])
+    return int(out.decode().strip())
+
+
+def psnr(path_a, path_b, filters_a="null", filters_b="null"):
+    """Average PSNR (dB) of two videos' frames after the given filters."""
+    result = subprocess.run([
+        "ffmpeg", "-v", "info", "-nostats", "-i", path_a, "-i", path_b,
+        "-lavfi", f"[0:v]{filters_a}[a];[1:v]{filters_b}[b];[a][b]psnr", "-f", "null", "-",
+    ], capture_output=True, check=True)
+    for line in result.stderr.decode().splitlines():
+        if "PSNR" in line and "average:" in line:
+            value = line.split("average:")[1].split()[0]
+            return float("inf") if value == "inf" else float(value)
+    raise AssertionError("no PSNR in ffmpeg output")
+
+
+@pytest.fixture(scope="session")
+def media_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("media")
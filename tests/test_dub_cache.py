@@ -0,0 +1,73 @@
+from clipcut.dub_cache import DubCache
+
+
+def test_memory_lru_by_items(tmp_path):
+    cache = DubCache(str(tmp_path), memory_items=2)
+    for text in ("a", "b", "c"):
+        cache.put_translation(text, "auto", "es", text.upper())
+    cache.get_translation("b", "auto", "es")
+    cache.get_translation("c", "auto", "es")
+    # "a" was pushed out of memory but is still on disk
+    assert cache.get_translation("a", "auto", "es") == "A"
+    assert cache.stats["translation"] == {"memory_hits": 2, "disk_hits": 1, "misses": 0}
+
+
+def test_memory_lru_by_bytes(tmp_path):
+    cache = DubCache(str(tmp_path), memory_bytes=100)
+    cache.put_audio("one", "v", b"1" * 60)
+    cache.put_audio("two", "v", b"2" * 30)
+    cache.get_audio("one", "v")
+    cache.put_audio("three", "v", b"3" * 30)
+    # "two" was the least recently used when the budget ran out
+    assert cache._memory_size == 90 and len(cache._memory) == 2
+    cache.put_audio("huge", "v", b"4" * 200)
+    assert cache._memory_size == 90 and len(cache._memory) == 2
+    assert cache.get_audio("two", "v") == b"2" * 30
+    assert cache.get_audio("huge", "v") == b"4" * 200
+    assert cache.stats["audio"] == {"memory_hits": 1, "disk_hits": 2, "misses": 0}
+    assert cache._memory_size <= 100
+
+
+def test_persists_across_instances(tmp_path):
+    cache = DubCache(str(tmp_path))
+    cache.put_translation("  Hello\nworld ", "auto", "fr", "Bonjour le monde")
+    cache.put_audio("Bonjour le monde", "fr-FR-HenriNeural", b"mp3 bytes")
+
+    reopened = DubCache(str(tmp_path))
+    # Keys are normalized, whitespace differences still hit
+    assert reopened.get_translation("Hello world", "auto", "fr") == "Bonjour le monde"
+    assert reopened.get_audio("Bonjour le monde", "fr-FR-HenriNeural") == b"mp3 bytes"
+    assert reopened.get_audio("Bonjour le monde", "fr-FR-DeniseNeural") is None
+    assert reopened.stats["translation"]["disk_hits"] == 1
+    assert reopened.stats["audio"] == {"memory_hits": 0, "disk_hits": 1, "misses": 1}
+
+
+def test_prunes_least_recently_used_audio(tmp_path):
+    cache = DubCache(str(tmp_path), memory_items=1, max_audio_bytes=250)
+    for k in range(99):
+        cache.put_audio(f"line {k}", "v", b"x" * 10)
+    # A disk hit marks line 0 as recently used
+    assert cache.get_audio("line 0", "v")
+    cache.put_audio("line 99", "v", b"x" * 10)
+
+    total = cache._db.execute("SELECT SUM(size) FROM audio").fetchone()[0]
+    assert total <= 250
+    assert cache.get_audio("line 0", "v")
+    assert cache.get_audio("line 99", "v")
+    assert cache.get_audio("line 1", "v") is None
+
+
+def test_sessions_count_their_own_hits(tmp_path):
+    cache = DubCache(str(tmp_path))
+    first, second = cache.session(), cache.session()
+    assert first.get_translation("a", "auto", "es") is None
+    first.put_translation("a", "auto", "es", "A")
+    assert second.get_translation("a", "auto", "es") == "A"
+    assert second.get_audio("A", "v") is None
+
+    assert first.stats["translation"] == {"memory_hits": 0, "disk_hits": 0, "misses": 1}
+    assert first.stats["audio"] == {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+    assert second.stats["translation"] == {"memory_hits": 1, "disk_hits": 0, "misses": 0}
+    assert second.stats["audio"]["misses"] == 1
+    # The cache itself keeps the process totals
+    assert cache.stats["translation"] == {"memory_hits": 1, "disk_hits": 0, "misses": 1}
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from clipcut import dubbing
+from clipcut.dubbing import DubbingEngine
+from clipcut.progress import ProgressTracker
+
+
+class StubGoogle:
+    """Stands in for GoogleTranslator: upper-cases, and records every request."""
+    requests = []
+    # Joined requests with this many lines come back with one line missing
+    drop_line_at = None
+    # Single lines that fail
+    fail = set()
+
+    def __init__(self, source, target):
+        self.target = target
+
+    def translate(self, text):
+        StubGoogle.requests.append(text)
+        lines = text.split("\n")
+        if len(lines) == 1 and text in StubGoogle.fail:
+            raise Exception("rate limited")
+        if StubGoogle.drop_line_at and len(lines) >= StubGoogle.drop_line_at:
+            lines = lines[:-1]
+        return "\n".join(line.upper() for line in lines)
+
+
+@pytest.fixture
+def google(monkeypatch):
+    StubGoogle.requests = []
+    StubGoogle.drop_line_at = None
+    StubGoogle.fail = set()
+    monkeypatch.setattr(dubbing, "GoogleTranslator", StubGoogle)
+    return StubGoogle
+
+
+class DictCache:
+    def __init__(self):
+        self.translations = {}
+
+    def get_translation(self, text, source, target):
+        return self.translations.get((text, target))
+
+    def put_translation(self, text, source, target, translated):
+        self.translations[(text, target)] = translated
+
+
+def test_one_request_per_batch(google):
+    engine = DubbingEngine(ProgressTracker())
+    texts = ["hello there", "how  are\nyou", "bye"]
+    assert engine.translate_batch(texts, "es") == ["HELLO THERE", "HOW ARE YOU", "BYE"]
+    assert google.requests == ["hello there\nhow are you\nbye"]
+
+
+def test_batches_split_at_the_size_limit(google, monkeypatch):
+    monkeypatch.setattr(dubbing, "MAX_BATCH_CHARS", 12)
+    engine = DubbingEngine(ProgressTracker())
+    assert engine.translate_batch(["aaaa", "bbbb", "cccc"], "es") == ["AAAA", "BBBB", "CCCC"]
+    assert google.requests == ["aaaa\nbbbb", "cccc"]
+
+
+def test_line_count_mismatch_retries_per_line(google):
+    google.drop_line_at = 2
+    google.fail = {"two"}
+    engine = DubbingEngine(ProgressTracker())
+    # The failed line keeps its original text
+    assert engine.translate_batch(["one", "two", "three"], "es") == ["ONE", "two", "THREE"]
+    assert google.requests == ["one\ntwo\nthree", "one", "two", "three"]
+
+
+def test_translator_count_mismatch_keeps_originals():
+    engine = DubbingEngine(ProgressTracker(), translator=lambda texts, lang: ["only one"])
+    assert engine.translate_batch(["a", "b"], "es") == ["a", "b"]
+
+
+def test_cache_hits_skip_the_translator():
+    cache = DictCache()
+    cache.put_translation("a", "auto", "es", "A (cached)")
+    asked = []
+
+    def translator(texts, lang):
+        asked.append(list(texts))
+        return ["" if t == "c" else t.upper() for t in texts]
+
+    engine = DubbingEngine(ProgressTracker(), translator=translator, cache=cache)
+    assert engine.translate_batch(["a", "b", "c"], "es") == ["A (cached)", "B", "c"]
+    assert asked == [["b", "c"]]
+    # Empty results are failures and aren't cached
+    assert ("b", "es") in cache.translations and ("c", "es") not in cache.translations
+
+
+class StandInTTS:
+    """Async tts that writes the text to the file, tracking requests in flight."""
+
+    def __init__(self, delay=0.01, failures=None, hang=()):
+        self.delay = delay
+        # text -> number of failing attempts before it succeeds (-1: never)
+        self.failures = dict(failures or {})
+        self.hang = set(hang)
+        self.attempts = {}
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, text, voice, output_path):
+        self.attempts[text] = self.attempts.get(text, 0) + 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(10 if text in self.hang else self.delay)
+            left = self.failures.get(text, 0)
+            if left:
+                self.failures[text] = left - 1
+                raise Exception("service unavailable")
+            with open(output_path, "w") as f:
+                f.write(text)
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(dubbing, "TTS_RETRY_DELAY", 0)
+    monkeypatch.setattr(dubbing, "TTS_TIMEOUT", 0.2)
+
+
+def _dub(tts, texts, tmp_path, concurrency=4):
+    engine = DubbingEngine(ProgressTracker(), translator=lambda texts, lang: list(texts), tts=tts, concurrency=concurrency)
+    paths = [str(tmp_path / f"{k}.mp3") for k in range(len(texts))]
+    return engine.generate_dub_segments(texts, "es", "voice", paths), paths
+
+
+def test_tts_concurrency_is_bounded(tmp_path, fast_retries):
+    tts = StandInTTS()
+    texts = [f"line {k}" for k in range(10)]
+    results, paths = _dub(tts, texts, tmp_path, concurrency=3)
+    assert tts.peak == 3
+    assert results == list(zip(paths, texts))
+
+
+def test_tts_retries_each_item(tmp_path, fast_retries):
+    tts = StandInTTS(failures={"flaky": dubbing.TTS_ATTEMPTS - 1})
+    results, paths = _dub(tts, ["flaky", "fine"], tmp_path)
+    assert tts.attempts == {"flaky": dubbing.TTS_ATTEMPTS, "fine": 1}
+    assert results == [(paths[0], "flaky"), (paths[1], "fine")]
+
+
+def test_failed_items_do_not_sink_the_batch(tmp_path, fast_retries):
+    tts = StandInTTS(failures={"broken": -1}, hang={"stuck"})
+    results, paths = _dub(tts, ["one", "broken", "stuck", "four"], tmp_path, concurrency=2)
+    # Both are given up on after the last attempt, the others are voiced
+    assert tts.attempts["broken"] == dubbing.TTS_ATTEMPTS
+    assert tts.attempts["stuck"] == dubbing.TTS_ATTEMPTS
+    assert results == [(paths[0], "one"), (None, "broken"), (None, "stuck"), (paths[3], "four")]
+    with open(paths[3]) as f:
+        assert f.read() == "four"
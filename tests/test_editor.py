@@ -0,0 +1,68 @@
+from clipcut.editor import Editor
+from clipcut.presets import PlatformPresets
+from clipcut.progress import ProgressTracker
+from clipcut.transcript import Transcript
+from conftest import frame_count, needs_ffmpeg, synthesize
+
+
+def _editor():
+    editor = Editor(ProgressTracker(), PlatformPresets())
+    editor.thumbnails = False
+    return editor
+
+
+@needs_ffmpeg
+def test_single_pass_keeps_source_frame_rate(tmp_path):
+    src = synthesize(str(tmp_path / "src.mp4"), seconds=12, rate=30)
+    segments = [{"start": 0.0, "end": 5.0}, {"start": 6.0, "end": 11.0}]
+    outputs = _editor().render_clips(src, segments, "landscape", False, False, [], {}, render_mode="single_pass")
+    assert len(outputs) == 2
+    for out in outputs:
+        assert frame_count(out["video_path"]) == 150
+
+
+class SilentDubber:
+    """Dubbing engine whose every request fails."""
+
+    def get_voice_for_lang(self, lang, gender="Male"):
+        return "voice"
+
+    def generate_dub_segments(self, texts, target_lang, voice, output_paths):
+        return [(None, None) for _ in texts]
+
+    def generate_dub(self, text, target_lang, voice, output_path):
+        return None, None
+
+
+def test_subtitles_fall_back_when_nothing_was_translated(tmp_path):
+    # Too short to be voiced, so the clip has no translated segments
+    transcript = Transcript.from_segments([{"start": 1.0, "end": 1.05, "text": "Hello there"}])
+    opts = {
+        "transcript": transcript, "job_id": None, "dubbing_engine": SilentDubber(), "target_language": "es",
+        "voice_gender": "Male", "subtitle_font": "Arial", "subtitle_words": 5, "subtitle_animation": "None",
+        "base_dir": str(tmp_path), "name": "src", "ext": ".mp4",
+    }
+    clip = _editor()._prepare_clip(0, {"start": 0.0, "end": 5.0}, opts)
+    assert clip["dub_audio_path"] is None
+    with open(clip["srt_path"]) as f:
+        assert "Hello there" in f.read()
+
+
+def test_single_pass_bounds_only_the_source(tmp_path):
+    clips = [
+        {"index": k, "start": start, "end": start + 5.0, "duration": 5.0, "dub_audio_path": dub,
+         "out_path": str(tmp_path / f"clip_{k}.mp4"), "thumbs": None, "ass_path": None}
+        for k, (start, dub) in enumerate([(2.0, None), (10.0, str(tmp_path / "dub_1.mp3"))])
+    ]
+    opts = {
+        "src_path": str(tmp_path / "missing.mp4"), "bg_music_path": str(tmp_path / "music.mp3"), "bg_volume": 0.1,
+        "filters": {}, "platform": "landscape", "burn_subs": False, "transition_type": "none", "threads": 2,
+    }
+    cmd = _editor()._single_pass_command(clips, opts)
+    # The span is an input option of the source, ahead of every other input
+    first_input = cmd.index("-i")
+    assert cmd[first_input + 1] == opts["src_path"]
+    assert cmd[first_input - 4:first_input] == ["-ss", "2.0", "-t", "13.0"]
+    inputs = [k for k, arg in enumerate(cmd) if arg == "-i"]
+    assert len(inputs) == 4
+    assert "-t" not in cmd[first_input:inputs[-1]]
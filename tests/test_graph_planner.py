@@ -0,0 +1,91 @@
+import subprocess
+
+import pytest
+
+from clipcut.editor import Editor
+from clipcut.graph_planner import FilterGraphPlanner
+from clipcut.presets import PlatformPresets
+from clipcut.progress import ProgressTracker
+from conftest import needs_ffmpeg, synthesize
+
+SOURCE_SIZE = (2560, 1440)
+
+
+@pytest.fixture(scope="module")
+def source(media_dir):
+    return synthesize(str(media_dir / "planner_src.mp4"), seconds=1, size="2560x1440", rate=10, extra=["-crf", "12"])
+
+
+def _psnr(src, chain_a, chain_b):
+    # Both chains on the same decoded frames; psnr also fails on a size mismatch
+    result = subprocess.run([
+        "ffmpeg", "-v", "info", "-nostats", "-i", src, "-filter_complex",
+        f"[0:v]split[x][y];[x]{','.join(chain_a)}[a];[y]{','.join(chain_b)}[b];[a][b]psnr", "-f", "null", "-",
+    ], capture_output=True, check=True)
+    for line in result.stderr.decode().splitlines():
+        if "average:" in line:
+            return float(line.split("average:")[1].split()[0])
+    raise AssertionError("no PSNR in ffmpeg output")
+
+
+def test_unparsable_options_keep_the_original_order():
+    planner = FilterGraphPlanner(PlatformPresets())
+    chain = ["eq=contrast=1.2", "vignette=().__class__.__base__.__subclasses__()"]
+    geometry, _, _ = planner.geometry("shorts", SOURCE_SIZE)
+    assert planner.plan(chain, "shorts", SOURCE_SIZE) == chain + geometry
+
+
+def test_neighbourhood_filters_stay_on_the_full_frame():
+    planner = FilterGraphPlanner(PlatformPresets())
+    geometry, _, _ = planner.geometry("landscape", SOURCE_SIZE)
+    # Gaussian blur and Canny work on pixel neighbourhoods, the scale would change what they see
+    chain = ["eq=contrast=1.2", "edgedetect=low=0.1:high=0.4", "hflip"]
+    assert planner.classify(chain[1]) == "fixed"
+    assert planner.plan(chain, "landscape", SOURCE_SIZE) == chain[:2] + geometry + chain[2:]
+
+
+def test_empty_chain_keeps_the_geometry():
+    planner = FilterGraphPlanner(PlatformPresets())
+    assert planner.plan([], "landscape", SOURCE_SIZE) == planner.geometry("landscape", SOURCE_SIZE)[0]
+    assert planner.plan([], "landscape", SOURCE_SIZE)[0].startswith("scale=")
+    # Already fits: nothing to do, so the editor can stream-copy
+    assert planner.plan([], "landscape", (1920, 1080)) == []
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize("entry,platform,min_gain", [
+    # The crop shortens the diagonal the vignette falloff is relative to
+    ("vignette=PI/5", "shorts", 20),
+    # The rest are sizes in pixels, scaled with the frame
+    ("unsharp=5:5:1.0:5:5:0.0", "landscape", 3),
+    ("boxblur=10:1", "landscape", 5),
+    ("chromashift=cbh=-5:cbv=-5:crh=5:crv=5", "landscape", 5),
+])
+def test_rewritten_filters_match_full_frame_order(source, entry, platform, min_gain):
+    planner = FilterGraphPlanner(PlatformPresets())
+    geometry, _, _ = planner.geometry(platform, SOURCE_SIZE)
+    planned = planner.plan([entry], platform, SOURCE_SIZE)
+    assert planned[:len(geometry)] == geometry and planned[-1] != entry
+
+    # Against the filter on the full frame before the geometry
+    full_frame = [entry] + geometry
+    rewritten = _psnr(source, full_frame, planned)
+    moved_as_is = _psnr(source, full_frame, geometry + [entry])
+    assert rewritten >= 40
+    assert rewritten >= moved_as_is + min_gain
+
+
+@needs_ffmpeg
+def test_output_size_does_not_depend_on_filters(source, tmp_path):
+    sizes = []
+    for name, filters in (("plain", None), ("graded", {"sharpness": 0.5})):
+        src = str(tmp_path / f"{name}.mp4")
+        subprocess.run(["cp", source, src], check=True)
+        editor = Editor(ProgressTracker(), PlatformPresets())
+        editor.thumbnails = False
+        outputs = editor.render_clips(src, [{"start": 0.0, "end": 1.0}], "landscape", False, False, [], {}, filters=filters)
+        sizes.append(subprocess.check_output([
+            "ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+            "-of", "csv=p=0", outputs[0]["video_path"],
+        ]).decode().strip())
+    assert sizes == ["1920,1080", "1920,1080"]
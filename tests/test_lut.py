@@ -0,0 +1,96 @@
+import os
+import subprocess
+
+import numpy as np
+import pytest
+
+from clipcut.editor import Editor
+from clipcut.filters import VideoFilters
+from clipcut.lut import LutCompiler
+from clipcut.presets import PlatformPresets
+from clipcut.progress import ProgressTracker
+from conftest import needs_ffmpeg, synthesize
+
+# Filter settings whose chains have two or more RGB filters, so part of them is compiled
+COMPILED = {
+    "sliders": {"brightness": 0.1, "contrast": 1.2, "saturation": 0.8, "warmth": 0.5, "tint": -0.3, "highlights": 0.4},
+    "vintage_warm": {"preset": "vintage_3", "warmth": 0.4, "contrast": 1.2},
+    "sepia_full": {"preset": "sepia", "warmth": 0.3, "highlights": 0.5, "brightness": 0.05},
+    "cine_curves": {"preset": "cine_3", "tint": 0.4, "shadows": -0.6, "saturation": 1.3},
+}
+
+
+@pytest.fixture(scope="module")
+def source(media_dir):
+    return synthesize(str(media_dir / "lut_src.mp4"), seconds=1, size="640x360", audio=False)
+
+
+def _frames(src, chain):
+    # What the encoder gets: 4:2:0, compared in RGB like it is displayed
+    vf = ",".join(chain + ["format=yuv420p", "format=rgb24"])
+    out = subprocess.run(["ffmpeg", "-v", "error", "-i", src, "-vf", vf, "-frames:v", "10", "-f", "rawvideo", "-"],
+                         capture_output=True, check=True).stdout
+    return np.frombuffer(out, dtype=np.uint8).astype(int)
+
+
+def test_only_rgb_spans_are_compiled(tmp_path):
+    compiler = LutCompiler(str(tmp_path))
+    # YUV filters only, or a single RGB filter: nothing to gain
+    for filters in ({"preset": "noir", "brightness": 0.1}, {"preset": "golden"}, {"preset": "sepia", "contrast": 1.3}):
+        chain = VideoFilters.get_filter_chain(filters)
+        assert compiler.compile_chain(chain) == chain
+
+    chain = VideoFilters.get_filter_chain(COMPILED["sliders"])
+    compiled = compiler.compile_chain(chain)
+    # The leading eq stays on YUV, colorbalance and curves become one lut3d
+    assert compiled[0] == chain[0] and len(compiled) == 2 and compiled[1].startswith("lut3d=")
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize("name", sorted(COMPILED))
+def test_lut_tracks_the_plain_chain(source, tmp_path, name):
+    chain = VideoFilters.get_filter_chain(COMPILED[name])
+    compiled = LutCompiler(str(tmp_path)).compile_chain(chain)
+    assert any(entry.startswith("lut3d=") for entry in compiled)
+
+    diff = np.abs(_frames(source, chain) - _frames(source, compiled))
+    assert diff.mean() < 1.5
+    assert np.percentile(diff, 99) <= 5
+    assert diff.max() <= 10
+
+
+@needs_ffmpeg
+def test_graded_clips_are_420(tmp_path):
+    src = synthesize(str(tmp_path / "src.mp4"), seconds=3)
+    editor = Editor(ProgressTracker(), PlatformPresets(), LutCompiler(str(tmp_path / "luts")))
+    editor.thumbnails = False
+    outputs = editor.render_clips(src, [{"start": 0.0, "end": 2.0}], "landscape", False, False, [], {},
+                                  filters=COMPILED["sepia_full"])
+    stream = subprocess.check_output([
+        "ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=profile,pix_fmt",
+        "-of", "csv=p=0", outputs[0]["video_path"],
+    ]).decode().strip()
+    assert stream == "High,yuv420p"
+
+
+def test_slider_values_share_a_lut(tmp_path):
+    compiler = LutCompiler(str(tmp_path))
+    first = compiler.compile_filters({"warmth": 0.5, "highlights": 0.4})
+    assert compiler.compile_filters({"warmth": 0.5000001, "highlights": 0.41}) == first
+    assert compiler.compile_filters({"warmth": 0.55, "highlights": 0.4}) != first
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    compiler = LutCompiler(str(tmp_path), size=17)
+    grades = [{"warmth": 0.5, "highlights": k / 10} for k in range(1, 5)]
+    paths = [compiler.compile_filters(grade) for grade in grades[:3]]
+    for k, path in enumerate(paths):
+        os.utime(path, (1000 + k, 1000 + k))
+    # A hit makes the oldest one the most recently used
+    assert compiler.compile_filters(grades[0]) == paths[0]
+
+    kept = [paths[0], paths[2]]
+    # Room for three LUTs, not four
+    compiler.max_bytes = sum(os.path.getsize(p) for p in paths) + os.path.getsize(paths[1]) // 2
+    newest = compiler.compile_filters(grades[3])
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in kept + [newest])
@@ -0,0 +1,54 @@
+import os
+import threading
+import time
+
+import pytest
+
+from clipcut.media_cache import MediaCache
+
+
+def _fetcher(calls, delay=0.0):
+    def fetch(target_dir):
+        calls.append(target_dir)
+        time.sleep(delay)
+        path = os.path.join(target_dir, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 1024)
+        return path
+    return fetch
+
+
+def test_lock_file_is_removed(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"))
+    calls = []
+    path = cache.get_or_fetch("abc:720p", _fetcher(calls), str(tmp_path))
+    assert os.path.exists(path)
+    assert not [f for f in os.listdir(cache.base_dir) if f.endswith(".lock")]
+
+    def fail(target_dir):
+        raise Exception("offline")
+    with pytest.raises(Exception):
+        cache.get_or_fetch("other", fail, str(tmp_path))
+    assert not [f for f in os.listdir(cache.base_dir) if f.endswith(".lock")]
+
+
+def test_concurrent_fetches_download_once(tmp_path):
+    # Separate instances stand in for worker processes, only the lock file is shared
+    base_dir = str(tmp_path / "cache")
+    calls = []
+    fetch = _fetcher(calls, delay=0.2)
+    results = []
+
+    def worker(k):
+        dest = tmp_path / f"job{k}"
+        dest.mkdir()
+        results.append(MediaCache(base_dir).get_or_fetch("abc", fetch, str(dest)))
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert len(results) == 4 and all(os.path.exists(r) for r in results)
+    assert not [f for f in os.listdir(base_dir) if f.endswith(".lock")]
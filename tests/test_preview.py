@@ -0,0 +1,78 @@
+import math
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+from clipcut.filters import VideoFilters
+from clipcut.preview import PreviewRenderer
+from conftest import needs_ffmpeg
+
+# Filter settings from the UI, each rendered by ffmpeg and by the preview
+CASES = {
+    "golden": {"preset": "golden"},
+    "cine_5": {"preset": "cine_5"},
+    "noir": {"preset": "noir"},
+    "sepia": {"preset": "sepia"},
+    "vintage": {"preset": "vintage"},
+    "sliders": {"brightness": 0.1, "contrast": 1.2, "saturation": 0.8, "warmth": 0.5, "tint": -0.3},
+    "vignette": {"vignette": 0.8},
+    "sharpness": {"sharpness": 0.6},
+    "curves": {"highlights": 0.5, "shadows": -0.5},
+    "glitch": {"effect": "glitch"},
+    "pixelate": {"effect": "pixelate"},
+    "blur": {"effect": "blur"},
+    "negate": {"effect": "negate"},
+}
+
+
+@pytest.fixture(scope="module")
+def frame(media_dir):
+    path = str(media_dir / "frame.png")
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=320x180:rate=1", "-frames:v", "1", path], check=True)
+    return path
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_preview_tracks_ffmpeg(frame, tmp_path, name):
+    # Noise is random, only the deterministic part of the glitch is compared
+    chain = [f for f in VideoFilters.get_filter_chain(CASES[name]) if not f.startswith("noise=")]
+    out = str(tmp_path / "ffmpeg.png")
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", frame, "-vf", ",".join(chain), "-frames:v", "1", out], check=True)
+
+    diff = np.abs(cv2.imread(out).astype(int) - PreviewRenderer().apply_chain(cv2.imread(frame), chain).astype(int))
+    assert diff.mean() < 0.5
+    assert np.percentile(diff, 99) <= 2
+    assert diff.max() <= 6
+
+
+def test_expressions():
+    assert VideoFilters.number("PI/4") == pytest.approx(math.pi / 4)
+    assert VideoFilters.number("-0.5") == -0.5
+    assert VideoFilters.number(None, 2.0) == 2.0
+    image = np.zeros((180, 320, 3), dtype=np.uint8)
+    assert PreviewRenderer()._scale(image, {"w": "iw/10", "h": "trunc(ih*0.5/2)*2"}, False).shape == (90, 32, 3)
+
+
+@pytest.mark.parametrize("expr", [
+    "().__class__.__base__.__subclasses__()",
+    "__import__('os').system('true')",
+    "open('/etc/passwd').read()",
+    "[x for x in ()]",
+    "'a' * 10",
+    "9^9^9^9^9",
+    "1/0",
+    "iw",
+    "1+" * 60 + "1",
+])
+def test_expressions_reject_anything_else(expr):
+    with pytest.raises(ValueError):
+        VideoFilters.number(expr)
+
+
+def test_filter_values_from_the_request_are_not_evaluated():
+    payload = {"brightness": "().__class__.__base__.__subclasses__()"}
+    with pytest.raises(ValueError):
+        PreviewRenderer().render(np.zeros((8, 8, 3), dtype=np.uint8), payload)
@@ -0,0 +1,22 @@
+import time
+
+from clipcut.progress import SQLiteProgressBackend
+
+
+def test_evict_drops_stale_local_jobs(tmp_path):
+    backend = SQLiteProgressBackend(str(tmp_path / "progress.sqlite3"), flush_interval=3600)
+    now = time.time()
+    backend.init("crashed", {"status": "rendering", "updated_at": now - 100})
+    backend.init("running", {"status": "rendering", "updated_at": now})
+    # The worker of "crashed" died right after an update that was never flushed
+    backend._local["crashed"]["progress"] = 40
+    backend._dirty.add("crashed")
+    backend.update("running", "progress", 10)
+
+    backend.evict(now - 50)
+    assert set(backend._local) == {"running"}
+    assert backend._dirty == {"running"}
+    backend.flush()
+    # The stale local state wasn't written back over the stored one
+    assert "progress" not in backend.get("crashed")
+    assert backend.get("running")["progress"] == 10
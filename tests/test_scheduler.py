@@ -0,0 +1,34 @@
+import threading
+
+from clipcut.progress import ProgressTracker
+from clipcut.scheduler import JobScheduler
+
+
+class RecordingTracker(ProgressTracker):
+    """Keeps the job state each client could have seen when the status changed."""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+        self.finished = threading.Event()
+
+    def update(self, job_id, key, value):
+        super().update(job_id, key, value)
+        if key == "status":
+            self.seen.append(self.get(job_id))
+            if value == "error":
+                self.finished.set()
+
+
+def test_failed_job_has_its_message_when_it_turns_to_error():
+    progress = RecordingTracker()
+    progress.init("job")
+
+    def fail():
+        raise RuntimeError("disk full")
+
+    JobScheduler(progress, workers=1).submit("job", fail)
+    assert progress.finished.wait(5)
+    # Clients stop listening on the error status, the message must already be there
+    assert progress.seen[-1]["status"] == "error"
+    assert progress.seen[-1]["error"] == "disk full"
@@ -0,0 +1,60 @@
+import subprocess
+
+import pytest
+
+from clipcut.editor import Editor
+from clipcut.presets import PlatformPresets
+from clipcut.progress import ProgressTracker
+from clipcut.smartcut import SmartCutter
+from conftest import frame_count, needs_ffmpeg, psnr, synthesize
+
+START, END = 1.5, 7.5
+
+
+def _reencode(src, out):
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error", "-ss", str(START), "-i", src, "-t", str(END - START),
+        "-c:v", "libx264", "-crf", "10", "-c:a", "aac", out,
+    ], check=True)
+    return out
+
+
+@pytest.fixture(scope="module")
+def sources(media_dir):
+    return {
+        "closed": synthesize(str(media_dir / "closed.mp4"), seconds=10, extra=["-bf", "0", "-g", "30"]),
+        "bframes": synthesize(str(media_dir / "bframes.mp4"), seconds=10, extra=["-g", "30"]),
+        "open_gop": synthesize(str(media_dir / "open_gop.mp4"), seconds=10, extra=["-x264-params", "keyint=30:open-gop=1"]),
+    }
+
+
+@needs_ffmpeg
+def test_keyframe_kind(sources):
+    cutter = SmartCutter()
+    assert cutter._is_idr(sources["closed"], 2.0, "h264")
+    assert not cutter._is_idr(sources["open_gop"], 2.0, "h264")
+
+
+@needs_ffmpeg
+def test_cut_matches_reencode(sources, tmp_path):
+    out = str(tmp_path / "cut.mp4")
+    assert SmartCutter().cut(sources["closed"], START, END, out)
+    ref = _reencode(sources["closed"], str(tmp_path / "ref.mp4"))
+    assert frame_count(out) == frame_count(ref) == 180
+    assert psnr(out, ref) > 35
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize("kind", ["bframes", "open_gop"])
+def test_reordered_sources_fall_back(sources, tmp_path, kind):
+    assert not SmartCutter().cut(sources[kind], START, END, str(tmp_path / "cut.mp4"))
+
+    # The editor then encodes the clip in full
+    editor = Editor(ProgressTracker(), PlatformPresets())
+    editor.thumbnails = False
+    src = str(tmp_path / "src.mp4")
+    subprocess.run(["cp", sources[kind], src], check=True)
+    outputs = editor.render_clips(src, [{"start": START, "end": END}], "landscape", False, False, [], {})
+    ref = _reencode(sources[kind], str(tmp_path / "ref.mp4"))
+    assert frame_count(outputs[0]["video_path"]) == frame_count(ref) == 180
+    assert psnr(outputs[0]["video_path"], ref) > 35